@@ -1,8 +1,28 @@
 # agents/llm.py
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+from functools import lru_cache
+from itertools import count
+from types import SimpleNamespace
+from typing import Annotated, Awaitable, Callable, Optional, TypeVar
+
+import anyio
+import httpx
 from huggingface_hub import InferenceClient
 from dotenv import load_dotenv
-from groq import Groq
+from groq import APIConnectionError, AsyncGroq, DefaultAsyncHttpxClient, DefaultHttpxClient, Groq
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from agents.usage import TokenBucket, UsageAccountant, usage_accountant
+from agents.utils.json_parser import IncrementalJSONParser
+from core.cache import TieredCache
+from core.metrics import metrics
+from rag.services.embedding_cache import CACHE_DIR
+from rag.services.embedding_engine import estimate_tokens, is_retryable
 
 load_dotenv()
 
@@ -12,13 +32,366 @@ MODEL_ID = "Qwen/Qwen3-32B"
 # MODEL_ID = "bastienp/Gemma-2-2B-Instruct-structured-output"
 MODEL_ID = "bastienp/Gemma-2-2B-it-JSON-data-extration"
 
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-120b")
+# Whole-call budget, retries included; each attempt gets what is left
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Connection pool shared by every request in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+# Consecutive failures that open the circuit, and how long it stays open
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# Response cache for near-deterministic calls (opt-in)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm.sqlite3"))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "2000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(6 * 3600)))
+# Rows kept in the SQLite tier; expired and then the oldest rows are
+# deleted every LLM_CACHE_MAINTAIN_EVERY writes
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))
+LLM_CACHE_MAINTAIN_EVERY = int(os.getenv("LLM_CACHE_MAINTAIN_EVERY", "1000"))
+# Calls sampled above this temperature are never cached
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))
+
+# Structured output: extra attempts after a schema violation, and how the
+# schema reaches the model: "prompt" (system prompt only; the answer is
+# streamed and validated as it arrives) or "json_schema" (response_format
+# plus the system prompt; Groq cannot stream these, so one full completion)
+LLM_STRUCTURED_RETRIES = int(os.getenv("LLM_STRUCTURED_RETRIES", "2"))
+LLM_STRUCTURED_FORMAT = os.getenv("LLM_STRUCTURED_FORMAT", "prompt")
+
+
+def _http_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+    }
+
 
 # client = InferenceClient(api_key=HF_TOKEN)
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Created on first use, so importing the agents needs no API key (tests,
+# offline benchmarks). Retries are ours (ChatProvider), so the SDK's own
+# are switched off.
+@lru_cache(maxsize=1)
+def groq_client() -> Groq:
+    return Groq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        http_client=DefaultHttpxClient(**_http_options()),
+        max_retries=0,
+    )
+
+
+# Same account, for async request handlers (one pooled connection set per process)
+@lru_cache(maxsize=1)
+def async_groq_client() -> AsyncGroq:
+    return AsyncGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        http_client=DefaultAsyncHttpxClient(**_http_options()),
+        max_retries=0,
+    )
 # llm = client.chat.completions.create(
-#     model="openai/gpt-oss-120b",    
+#     model="openai/gpt-oss-120b",
 # )
 
+
+class LLMUnavailableError(Exception):
+    """
+    The provider could not answer: its circuit is open, or the call ran
+    out of retries or time on errors that are worth retrying. Requests the
+    provider rejected outright (bad request, auth) raise the SDK's error.
+    """
+
+    def __init__(self, provider: str, model: str, reason: str):
+        super().__init__(f"{provider} ({model}) unavailable: {reason}")
+        self.provider = provider
+        self.model = model
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    # APITimeoutError is an APIConnectionError
+    return isinstance(exc, (APIConnectionError, httpx.TransportError)) or is_retryable(exc)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a provider that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are refused without touching the network. Once `reset_seconds`
+    have passed a single probe is let through (half-open): success closes
+    the circuit, failure opens it again. A probe that never reports back
+    (e.g. a cancelled request) is replaced after another `reset_seconds`.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURES,
+                 reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.clock() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self.opened_at = self.clock()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    metrics.incr("llm.circuit_opened")
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class ChatProvider:
+    """
+    One OpenAI-compatible chat completions API (sync and async SDK
+    clients on pooled, keep-alive HTTP connections).
+
+    Every call gets a time budget; failures worth retrying (timeouts,
+    dropped connections, 429, 5xx) are retried with full-jitter backoff
+    while the budget lasts, honouring Retry-After. A circuit breaker per
+    provider turns a provider outage into immediate LLMUnavailableError
+    instead of every request waiting out its timeout.
+
+    The sync and async paths differ only in how they send and sleep; the
+    retry, breaker and metrics decisions live in the shared helpers.
+    Metrics go under `llm.<provider>.<model>.*`.
+    """
+
+    def __init__(self, name: str, client, async_client, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, base_delay: float = 0.5, max_delay: float = 8.0,
+                 breaker: CircuitBreaker = None, retryable: Callable[[Exception], bool] = is_retryable_error):
+        self.name = name
+        self._client = client
+        self._async_client = async_client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+
+    # Clients may be given as zero-argument factories, called on first use
+    @property
+    def client(self):
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    @property
+    def async_client(self):
+        if callable(self._async_client):
+            self._async_client = self._async_client()
+        return self._async_client
+
+    # -------------------------
+    # Shared decisions
+    # -------------------------
+    def _metric(self, model: str, name: str) -> str:
+        return f"llm.{self.name}.{model}.{name}"
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        return time.monotonic() + (self.timeout if timeout is None else min(timeout, self.timeout))
+
+    def _admit(self, model: str, deadline: float) -> float:
+        """
+        Seconds the next attempt may take; raises when the circuit is open
+        or the budget is spent.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailableError(self.name, model, "timed out")
+        if not self.breaker.allow():
+            metrics.incr(self._metric(model, "rejected"))
+            raise LLMUnavailableError(self.name, model, "circuit open")
+        return remaining
+
+    def _request(self, model: str, messages: list[dict], remaining: float, params: dict) -> dict:
+        return {
+            "model": model,
+            "messages": messages,
+            "timeout": httpx.Timeout(remaining, connect=min(remaining, LLM_CONNECT_TIMEOUT_SECONDS)),
+            **params,
+        }
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        response = getattr(exc, "response", None)
+        retry_after = getattr(exc, "retry_after", None) or (
+            response is not None and response.headers.get("retry-after")
+        )
+        try:
+            if retry_after:
+                return min(self.max_delay, float(retry_after))
+        except ValueError:
+            pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _failed(self, model: str, attempt: int, exc: Exception, deadline: float) -> float:
+        """
+        Records a failed attempt. Returns the delay before the next one,
+        or raises when the call should give up.
+        """
+        metrics.incr(self._metric(model, "errors"))
+        if not self.retryable(exc):
+            # The provider answered; the request itself is at fault
+            self.breaker.record_success()
+            raise exc
+
+        self.breaker.record_failure()
+        delay = self._backoff(attempt, exc)
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+            raise LLMUnavailableError(self.name, model, f"{type(exc).__name__}: {exc}") from exc
+        metrics.incr(self._metric(model, "retries"))
+        return delay
+
+    def _succeeded(self, model: str, started: float, usage=None):
+        """
+        For streams this runs when the response starts, so latency is
+        time to first byte; tokens are counted when the stream ends.
+        """
+        self.breaker.record_success()
+        metrics.observe(self._metric(model, "latency"), time.perf_counter() - started)
+        self._count_tokens(model, usage)
+
+    def _count_tokens(self, model: str, usage):
+        if usage is None:
+            return
+        metrics.incr(self._metric(model, "prompt_tokens"), getattr(usage, "prompt_tokens", 0) or 0)
+        metrics.incr(self._metric(model, "completion_tokens"), getattr(usage, "completion_tokens", 0) or 0)
+
+    def _stream_failed(self, model: str, exc: Exception):
+        metrics.incr(self._metric(model, "errors"))
+        if self.retryable(exc):
+            self.breaker.record_failure()
+
+    @staticmethod
+    def _chunk_text(chunk) -> Optional[str]:
+        if chunk.choices and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+        return None
+
+    def _chunk_usage(self, model: str, chunk, on_usage: Callable = None):
+        # Groq reports usage on the last chunk under x_groq
+        usage = getattr(chunk, "usage", None)
+        if usage is None:
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            self._count_tokens(model, usage)
+            if on_usage is not None:
+                on_usage(usage)
+
+    # -------------------------
+    # Sync
+    # -------------------------
+    def complete(self, model: str, messages: list[dict], timeout: float = None, **params):
+        deadline = self._deadline(timeout)
+        for attempt in count():
+            remaining = self._admit(model, deadline)
+            started = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(**self._request(model, messages, remaining, params))
+            except Exception as e:
+                time.sleep(self._failed(model, attempt, e, deadline))
+                continue
+            self._succeeded(model, started, None if params.get("stream") else response.usage)
+            return response
+
+    def stream(self, model: str, messages: list[dict], timeout: float = None,
+               on_usage: Callable = None, **params):
+        """
+        Yields text chunks. Only opening the stream is retried; text
+        already handed out cannot be taken back. `on_usage` receives the
+        token usage when the provider reports it (at the end).
+        """
+        response = self.complete(model, messages, timeout, stream=True, **params)
+        try:
+            for chunk in response:
+                self._chunk_usage(model, chunk, on_usage)
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            self._stream_failed(model, e)
+            raise
+        finally:
+            response.close()
+
+    # -------------------------
+    # Async
+    # -------------------------
+    async def acomplete(self, model: str, messages: list[dict], timeout: float = None, **params):
+        deadline = self._deadline(timeout)
+        for attempt in count():
+            remaining = self._admit(model, deadline)
+            started = time.perf_counter()
+            try:
+                response = await self.async_client.chat.completions.create(
+                    **self._request(model, messages, remaining, params)
+                )
+            except Exception as e:
+                await anyio.sleep(self._failed(model, attempt, e, deadline))
+                continue
+            self._succeeded(model, started, None if params.get("stream") else response.usage)
+            return response
+
+    async def astream(self, model: str, messages: list[dict], timeout: float = None,
+                      on_usage: Callable = None, **params):
+        """
+        Async stream(). Cancelling the consumer closes the HTTP stream.
+        """
+        response = await self.acomplete(model, messages, timeout, stream=True, **params)
+        try:
+            async for chunk in response:
+                self._chunk_usage(model, chunk, on_usage)
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            self._stream_failed(model, e)
+            raise
+        finally:
+            # Shielded: runs inside a cancelled request task
+            with anyio.CancelScope(shield=True):
+                await response.close()
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.snapshot()}
+
+
+groq_provider = ChatProvider("groq", groq_client, async_groq_client)
+
+
 class HuggingFaceChatLLM:
     """
     Unified LLM wrapper for EasyServe agents.
@@ -26,7 +399,7 @@ class HuggingFaceChatLLM:
     """
 
     def invoke(self, prompt: str):
-        response = client.chat.completions.create(
+        response = groq_client().chat.completions.create(
             model=MODEL_ID,
             messages=[
                 {
@@ -54,45 +427,431 @@ class HuggingFaceChatLLM:
 
 
 
+JSON_SYSTEM_PROMPT = (
+    "You are a backend API service.\n"
+    "You must return ONLY valid JSON.\n"
+    "No explanations.\n"
+    "No reasoning.\n"
+    "No markdown.\n"
+    "If unsure, still output valid JSON."
+)
+
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class StructuredOutputError(ValueError):
+    """
+    The model kept answering outside the schema.
+    """
+
+    def __init__(self, schema: str, attempts: int, error: Exception):
+        super().__init__(f"No valid {schema} after {attempts} attempts: {error}")
+        self.error = error
+
+
+def _messages(system_prompt: str, prompt: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    ]
+
+
+class LLMCache:
+    """
+    Cache of chat completions keyed by (provider, model, messages,
+    sampling params), on a TieredCache: an LRU per process in front of a
+    SQLite file shared by every worker on the host, with a TTL. The file
+    stays bounded: expired rows, then the oldest above `max_rows`, are
+    deleted as completions are written.
+
+    Only calls at or below `max_temperature` are cached; above that the
+    caller asked for variety, so a repeat answer would be wrong.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS, max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+                 max_rows: int = LLM_CACHE_MAX_ROWS, maintain_every: int = LLM_CACHE_MAINTAIN_EVERY):
+        self.store = TieredCache(path, "completions", max_memory_items=max_memory_items, ttl_seconds=ttl_seconds,
+                                 max_disk_items=max_rows, maintain_every=maintain_every)
+        self.max_temperature = max_temperature
+        self.bypassed = 0
+
+    def cacheable(self, params: dict) -> bool:
+        if params.get("temperature", 1.0) <= self.max_temperature:
+            return True
+        self.bypassed += 1
+        metrics.incr("llm_cache.bypassed")
+        return False
+
+    @staticmethod
+    def key(provider: str, model: str, messages: list[dict], params: dict) -> str:
+        payload = json.dumps({"messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{provider}:{model}:{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(key)
+        metrics.incr("llm_cache.hit" if value is not None else "llm_cache.miss")
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, content: str):
+        self.store.set(key, content.encode("utf-8"))
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "bypassed": self.bypassed}
+
+
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
+
+
+def _response(content: str):
+    return type(
+        "LLMResponse",
+        (),
+        {"content": content},
+    )
+
+
 class GroqChatLLM:
     """
     Unified LLM wrapper for EasyServe agents.
     Compatible with LangGraph.
+
+    Calls go through a ChatProvider (timeouts, retries, circuit breaker,
+    metrics); `timeout` overrides the provider's budget for one call.
+    With a `cache`, invoke/ainvoke answers are reused for identical
+    calls. Streams are not cached here (RAG answers have AnswerCache).
+
+    Calls made for a tenant (`client_profile_id`) are metered by the
+    `accountant`: they wait for, or are shed by, the tenant's token
+    bucket (TokenBudgetExceeded) and their usage is recorded under
+    `node`. Cache hits cost the tenant nothing.
     """
 
-    def invoke(self, prompt: str, system_prompt: str = None):
-        if system_prompt is None:
-            system_prompt = (
-                "You are a backend API service.\n"
-                "You must return ONLY valid JSON.\n"
-                "No explanations.\n"
-                "No reasoning.\n"
-                "No markdown.\n"
-                "If unsure, still output valid JSON."
-            )
+    def __init__(self, provider: ChatProvider = None, model: str = LLM_MODEL, temperature: float = 0.1,
+                 cache: Optional[LLMCache] = None, accountant: Optional[UsageAccountant] = None):
+        self.provider = provider or groq_provider
+        self.model = model
+        self.temperature = temperature
+        self.cache = cache
+        self.accountant = accountant
+        self.structured_format = LLM_STRUCTURED_FORMAT
 
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-            temperature=0.1,
-            max_tokens=300,
+    def _cache_key(self, messages: list[dict], params: dict) -> Optional[str]:
+        if self.cache is None or not self.cache.cacheable(params):
+            return None
+        return self.cache.key(self.provider.name, self.model, messages, params)
+
+    # -------------------------
+    # Token accounting
+    # -------------------------
+    def _metered(self, client_profile_id: Optional[int]) -> bool:
+        return self.accountant is not None and client_profile_id is not None
+
+    @staticmethod
+    def _estimate(messages: list[dict], params: dict) -> int:
+        return sum(estimate_tokens(m["content"]) for m in messages) + params["max_tokens"]
+
+    def _settle(self, client_profile_id: int, node: Optional[str], reserved: int, bucket: TokenBucket, usage):
+        self.accountant.settle(
+            client_profile_id, self.model, node, reserved,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            bucket=bucket,
         )
 
-        return type(
-            "LLMResponse",
-            (),
-            {"content": response.choices[0].message.content},
+    @staticmethod
+    def _stream_usage(reported: list, messages: list[dict], parts: list[str]):
+        # A stream cut short never gets its usage chunk: estimate instead
+        if reported:
+            return reported[-1]
+        return SimpleNamespace(
+            prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages),
+            completion_tokens=estimate_tokens("".join(parts)) if parts else 0,
         )
 
+    # -------------------------
+    # Calls
+    # -------------------------
+    def invoke(self, prompt: str, system_prompt: str = None, timeout: float = None, temperature: float = None,
+               client_profile_id: int = None, node: str = None):
+        messages = _messages(system_prompt or JSON_SYSTEM_PROMPT, prompt)
+        params = {"temperature": self.temperature if temperature is None else temperature, "max_tokens": 300}
+
+        key = self._cache_key(messages, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return _response(cached)
+
+        content = self._complete(messages, timeout, params, client_profile_id, node)
+        if key is not None and content:
+            self.cache.set(key, content)
+        return _response(content)
+
+    def _complete(self, messages: list[dict], timeout: Optional[float], params: dict,
+                  client_profile_id: Optional[int], node: Optional[str]) -> str:
+        metered = self._metered(client_profile_id)
+        if metered:
+            reserved = self._estimate(messages, params)
+            bucket = self.accountant.acquire(client_profile_id, reserved)
+        response = None
+        try:
+            response = self.provider.complete(self.model, messages, timeout, **params)
+        finally:
+            if metered:
+                self._settle(client_profile_id, node, reserved, bucket, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    def stream(self, prompt: str, system_prompt: str = None, max_tokens: int = 300, timeout: float = None,
+               client_profile_id: int = None, node: str = None):
+        """
+        Yields answer text as it is generated. Closing the generator closes
+        the HTTP stream, which stops generation (and billing) upstream.
+        """
+        messages = _messages(system_prompt or "You are a helpful assistant.", prompt)
+        params = {"temperature": self.temperature, "max_tokens": max_tokens}
+        return self._token_stream(messages, timeout, params, client_profile_id, node)
+
+    def _token_stream(self, messages: list[dict], timeout: Optional[float], params: dict,
+                      client_profile_id: Optional[int], node: Optional[str]):
+        if not self._metered(client_profile_id):
+            return self.provider.stream(self.model, messages, timeout, **params)
+        return self._metered_stream(client_profile_id, node, messages, timeout, params)
+
+    def _metered_stream(self, client_profile_id: int, node: Optional[str], messages: list[dict],
+                        timeout: Optional[float], params: dict):
+        reserved = self._estimate(messages, params)
+        bucket = self.accountant.acquire(client_profile_id, reserved)
+        reported, parts = [], []
+        tokens = self.provider.stream(self.model, messages, timeout, on_usage=reported.append, **params)
+        try:
+            for text in tokens:
+                parts.append(text)
+                yield text
+        finally:
+            tokens.close()
+            self._settle(client_profile_id, node, reserved, bucket, self._stream_usage(reported, messages, parts))
+
+    async def ainvoke(self, prompt: str, system_prompt: str = None, timeout: float = None, temperature: float = None,
+                      client_profile_id: int = None, node: str = None):
+        messages = _messages(system_prompt or JSON_SYSTEM_PROMPT, prompt)
+        params = {"temperature": self.temperature if temperature is None else temperature, "max_tokens": 300}
+
+        key = self._cache_key(messages, params)
+        if key is not None:
+            # SQLite tier: keep it off the event loop
+            cached = await anyio.to_thread.run_sync(self.cache.get, key)
+            if cached is not None:
+                return _response(cached)
+
+        content = await self._acomplete(messages, timeout, params, client_profile_id, node)
+        if key is not None and content:
+            await anyio.to_thread.run_sync(self.cache.set, key, content)
+        return _response(content)
+
+    async def _acomplete(self, messages: list[dict], timeout: Optional[float], params: dict,
+                         client_profile_id: Optional[int], node: Optional[str]) -> str:
+        metered = self._metered(client_profile_id)
+        if metered:
+            reserved = self._estimate(messages, params)
+            bucket = await self.accountant.aacquire(client_profile_id, reserved)
+        response = None
+        try:
+            response = await self.provider.acomplete(self.model, messages, timeout, **params)
+        finally:
+            if metered:
+                self._settle(client_profile_id, node, reserved, bucket, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    def astream(self, prompt: str, system_prompt: str = None, max_tokens: int = 300, timeout: float = None,
+                client_profile_id: int = None, node: str = None):
+        """
+        Async stream(). Cancelling the consumer closes the HTTP stream.
+        """
+        messages = _messages(system_prompt or "You are a helpful assistant.", prompt)
+        params = {"temperature": self.temperature, "max_tokens": max_tokens}
+        return self._atoken_stream(messages, timeout, params, client_profile_id, node)
+
+    def _atoken_stream(self, messages: list[dict], timeout: Optional[float], params: dict,
+                       client_profile_id: Optional[int], node: Optional[str]):
+        if not self._metered(client_profile_id):
+            return self.provider.astream(self.model, messages, timeout, **params)
+        return self._ametered_stream(client_profile_id, node, messages, timeout, params)
+
+    async def _ametered_stream(self, client_profile_id: int, node: Optional[str], messages: list[dict],
+                               timeout: Optional[float], params: dict):
+        reserved = self._estimate(messages, params)
+        bucket = await self.accountant.aacquire(client_profile_id, reserved)
+        reported, parts = [], []
+        tokens = self.provider.astream(self.model, messages, timeout, on_usage=reported.append, **params)
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield text
+        finally:
+            with anyio.CancelScope(shield=True):
+                await tokens.aclose()
+            self._settle(client_profile_id, node, reserved, bucket, self._stream_usage(reported, messages, parts))
+
+    # -------------------------
+    # Structured output
+    # -------------------------
+    def _structured_request(self, schema: type[BaseModel], prompt: str, system_prompt: Optional[str],
+                            max_tokens: int) -> tuple[list[dict], dict]:
+        json_schema = schema.model_json_schema()
+        system = (
+            f"{system_prompt or JSON_SYSTEM_PROMPT}\n"
+            f"The JSON object must match this JSON schema:\n{json.dumps(json_schema)}"
+        )
+        params = {"temperature": self.temperature, "max_tokens": max_tokens}
+        if self.structured_format == "json_schema":
+            params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": json_schema},
+            }
+        return _messages(system, prompt), params
+
+    def _structured_tokens(self, messages: list[dict], timeout: Optional[float], params: dict,
+                           client_profile_id: Optional[int], node: Optional[str]):
+        if "response_format" not in params:
+            return self._token_stream(messages, timeout, params, client_profile_id, node)
+        # Groq does not stream response_format calls: one completion, parsed whole
+        return _once(lambda: self._complete(messages, timeout, params, client_profile_id, node))
+
+    def _astructured_tokens(self, messages: list[dict], timeout: Optional[float], params: dict,
+                            client_profile_id: Optional[int], node: Optional[str]):
+        if "response_format" not in params:
+            return self._atoken_stream(messages, timeout, params, client_profile_id, node)
+        return _aonce(lambda: self._acomplete(messages, timeout, params, client_profile_id, node))
+
+    def invoke_structured(self, prompt: str, schema: type[Model], system_prompt: str = None, max_tokens: int = 300,
+                          timeout: float = None, retries: int = LLM_STRUCTURED_RETRIES,
+                          client_profile_id: int = None, node: str = None) -> Model:
+        """
+        Asks for a JSON object matching `schema` and returns it validated.
+        In "prompt" format the answer is streamed and parsed as it arrives:
+        a member that breaks the schema (or text that is not JSON) stops
+        the stream at once. In "json_schema" format the provider enforces
+        the schema on a single non-streamed completion. Either way an
+        invalid answer is retried with the error shown to the model.
+        Raises StructuredOutputError after `retries` extra attempts.
+        """
+        messages, params = self._structured_request(schema, prompt, system_prompt, max_tokens)
+        for attempt in range(retries + 1):
+            parser, parts = IncrementalJSONParser(), []
+            tokens = self._structured_tokens(messages, timeout, params, client_profile_id, node)
+            try:
+                for text in tokens:
+                    parts.append(text)
+                    for key, value in parser.feed(text):
+                        _check_member(schema, key, value)
+                return _validated(schema, parser, attempt)
+            except ValueError as e:
+                # JSONStreamError, json.JSONDecodeError and pydantic's ValidationError
+                error = e
+            finally:
+                tokens.close()
+            messages = _retry_messages(messages, "".join(parts), schema, error)
+        metrics.incr(f"llm.structured.{schema.__name__}.failed")
+        raise StructuredOutputError(schema.__name__, retries + 1, error)
+
+    async def ainvoke_structured(self, prompt: str, schema: type[Model], system_prompt: str = None,
+                                 max_tokens: int = 300, timeout: float = None,
+                                 retries: int = LLM_STRUCTURED_RETRIES,
+                                 client_profile_id: int = None, node: str = None) -> Model:
+        """
+        Async invoke_structured().
+        """
+        messages, params = self._structured_request(schema, prompt, system_prompt, max_tokens)
+        for attempt in range(retries + 1):
+            parser, parts = IncrementalJSONParser(), []
+            tokens = self._astructured_tokens(messages, timeout, params, client_profile_id, node)
+            try:
+                async for text in tokens:
+                    parts.append(text)
+                    for key, value in parser.feed(text):
+                        _check_member(schema, key, value)
+                return _validated(schema, parser, attempt)
+            except ValueError as e:
+                error = e
+            finally:
+                with anyio.CancelScope(shield=True):
+                    await tokens.aclose()
+            messages = _retry_messages(messages, "".join(parts), schema, error)
+        metrics.incr(f"llm.structured.{schema.__name__}.failed")
+        raise StructuredOutputError(schema.__name__, retries + 1, error)
+
+
+def _once(complete: Callable[[], str]):
+    yield complete() or ""
+
+
+async def _aonce(complete: Callable[[], Awaitable[str]]):
+    yield await complete() or ""
+
+
+@lru_cache(maxsize=None)
+def _field_adapters(schema: type[BaseModel]) -> dict[str, TypeAdapter]:
+    adapters = {}
+    for name, field in schema.model_fields.items():
+        # Constraints (ge, max_length, ...) live in the field's metadata
+        annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        adapters[field.alias or name] = TypeAdapter(annotation)
+    return adapters
+
+
+def _check_member(schema: type[BaseModel], key: str, value):
+    """
+    Validates one member as soon as it is complete. Unknown keys are left
+    to the model's own `extra` setting at the end.
+    """
+    adapter = _field_adapters(schema).get(key)
+    if adapter is None:
+        return
+    try:
+        adapter.validate_python(value)
+    except ValidationError as e:
+        raise ValueError(f"Field {key!r}: {e.errors()[0]['msg']} (got {value!r})") from e
+
+
+def _validated(schema: type[Model], parser: IncrementalJSONParser, attempt: int) -> Model:
+    result = schema.model_validate(parser.result())
+    if attempt:
+        metrics.incr(f"llm.structured.{schema.__name__}.recovered")
+    return result
+
+
+def _retry_messages(messages: list[dict], output: str, schema: type[BaseModel], error: Exception) -> list[dict]:
+    metrics.incr(f"llm.structured.{schema.__name__}.invalid")
+    # Only the latest failed answer is kept, so retries do not grow the prompt
+    return messages[:2] + [
+        {"role": "assistant", "content": output},
+        {
+            "role": "user",
+            "content": (
+                f"That answer was rejected: {str(error)[:500]}\n"
+                "Answer again with only a JSON object that matches the schema."
+            ),
+        },
+    ]
+
+
+def llm_stats() -> dict:
+    return {
+        groq_provider.name: groq_provider.stats(),
+        "cache": llm_cache.stats() if llm_cache else None,
+        "usage": usage_accountant.stats() if usage_accountant else None,
+    }
+
+
 # single shared instance
 # llm = HuggingFaceChatLLM()
-llm = GroqChatLLM()
\ No newline at end of file
+llm = GroqChatLLM(cache=llm_cache, accountant=usage_accountant)
@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from auth.database import Base
+
+
+class LLMUsage(Base):
+    """
+    LLM tokens used per tenant, model and agent node, summed per hour.
+    Written in batches by agents.usage.UsageAccountant.flush().
+    """
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    client_profile_id = Column(Integer, ForeignKey("client_profiles.id", ondelete="CASCADE"), nullable=False, index=True)
+    model = Column(String(100), nullable=False)
+    node = Column(String(100), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+
+    requests = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(BigInteger, default=0, nullable=False)
+    completion_tokens = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("client_profile_id", "model", "node", "period_start", name="uq_llm_usage_bucket"),
+    )
@@ -0,0 +1,140 @@
+# agents/registry.py
+import asyncio
+import threading
+import time
+from typing import Callable
+
+import anyio
+from sqlalchemy.orm import Session
+
+from core.metrics import metrics
+
+
+_END_OF_STREAM = object()
+
+
+class GraphRegistry:
+    """
+    Agent graphs compiled once per process.
+
+    Builders take no arguments; request-scoped dependencies (DB session,
+    tenant, deadline) travel in config["configurable"], so one compiled
+    graph serves every request. Compile and invoke times are recorded in
+    `metrics` as graph.<name>.compile / graph.<name>.invoke.
+    """
+
+    def __init__(self):
+        self._builders: dict[str, Callable] = {}
+        self._graphs: dict = {}
+        self._compile_seconds: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, builder: Callable):
+        self._builders[name] = builder
+
+    def get(self, name: str):
+        graph = self._graphs.get(name)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(name)
+                if graph is None:
+                    start = time.perf_counter()
+                    graph = self._graphs[name] = self._builders[name]()
+                    self._compile_seconds[name] = time.perf_counter() - start
+                    metrics.observe(f"graph.{name}.compile", self._compile_seconds[name])
+        return graph
+
+    def compile_all(self):
+        for name in self._builders:
+            self.get(name)
+
+    @staticmethod
+    def run_config(db: Session = None, client_profile_id: int = None, timeout: float = None, **extra) -> dict:
+        return {
+            "configurable": {
+                "db": db,
+                "client_profile_id": client_profile_id,
+                "deadline": time.monotonic() + timeout if timeout else None,
+                **extra,
+            }
+        }
+
+    def invoke(self, name: str, state: dict, db: Session = None, timeout: float = None, **extra):
+        graph = self.get(name)
+        config = self.run_config(db, state.get("client_profile_id"), timeout, **extra)
+        with metrics.timer(f"graph.{name}.invoke"):
+            return graph.invoke(state, config=config)
+
+    async def ainvoke(self, name: str, state: dict, db: Session = None, timeout: float = None, **extra):
+        graph = self.get(name)
+        config = self.run_config(db, state.get("client_profile_id"), timeout, **extra)
+        with metrics.timer(f"graph.{name}.invoke"):
+            return await graph.ainvoke(state, config=config)
+
+    def stream(self, name: str, state: dict, db: Session = None, timeout: float = None,
+               stream_mode=("updates", "custom"), **extra):
+        """
+        Yields (mode, chunk) pairs from graph.stream; node updates arrive as
+        "updates" and anything nodes write with get_stream_writer() as
+        "custom".
+        """
+        graph = self.get(name)
+        config = self.run_config(db, state.get("client_profile_id"), timeout, **extra)
+        with metrics.timer(f"graph.{name}.stream"):
+            yield from graph.stream(state, config=config, stream_mode=list(stream_mode))
+
+    async def astream(self, name: str, state: dict, db: Session = None, timeout: float = None,
+                      stream_mode=("updates", "custom"), **extra):
+        """
+        Async stream(). The graph runs in its own task, so closing this
+        generator (or cancelling the caller, as Starlette does on client
+        disconnect) cancels the graph run cleanly, including any LLM stream
+        a node is reading.
+        """
+        graph = self.get(name)
+        config = self.run_config(db, state.get("client_profile_id"), timeout, **extra)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for item in graph.astream(state, config=config, stream_mode=list(stream_mode)):
+                    queue.put_nowait(item)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(_END_OF_STREAM)
+
+        task = asyncio.create_task(pump())
+        try:
+            with metrics.timer(f"graph.{name}.stream"):
+                while True:
+                    item = await queue.get()
+                    if item is _END_OF_STREAM:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            task.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            name: {"compiled": name in self._graphs, "compile_ms": round(self._compile_seconds.get(name, 0) * 1000, 3)}
+            for name in self._builders
+        }
+
+
+graph_registry = GraphRegistry()
+
+
+def _register_builtin_graphs():
+    from agents.retrieval.graph import build_retrieval_agent
+    from agents.ticket.graph import build_ticket_agent
+
+    graph_registry.register("retrieval", build_retrieval_agent)
+    graph_registry.register("ticket", build_ticket_agent)
+
+
+_register_builtin_graphs()
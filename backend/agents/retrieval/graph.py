@@ -1,23 +1,37 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from agents.retrieval.state import RetrievalAgentState
-from agents.retrieval.nodes.retrieve import retrieve_documents
-from agents.retrieval.nodes.generate_answer import generate_answer
+from agents.retrieval.nodes.retrieve import aretrieve_documents, retrieve_documents
+from agents.retrieval.nodes.rerank import arerank_documents, rerank_documents
+from agents.retrieval.nodes.build_context import build_answer_context
+from agents.retrieval.nodes.generate_answer import agenerate_answer, generate_answer
+from rag.services.reranker import reranker_available
 
-def build_retrieval_agent(db):
+def build_retrieval_agent():
+    """
+    Compiled once by agents.registry; the request's DB session arrives in
+    config["configurable"] (see agents.run_config). Nodes have a sync
+    and an async implementation: invoke/stream use the former,
+    ainvoke/astream the latter.
+    """
     graph = StateGraph(RetrievalAgentState)
     
     # Add nodes
-    # We pass the db session to the retrieve node using a lambda or partial if needed, 
-    # but langgraph nodes usually take state. 
-    # The `retrieve_documents` signature I wrote is `(state, db)`. 
-    # I should wrap it.
-    
-    graph.add_node("retrieve", lambda state: retrieve_documents(state, db))
-    graph.add_node("generate", generate_answer)
+    graph.add_node("retrieve", RunnableLambda(retrieve_documents, afunc=aretrieve_documents, name="retrieve"))
+    if reranker_available():
+        graph.add_node("rerank", RunnableLambda(rerank_documents, afunc=arerank_documents, name="rerank"))
+    graph.add_node("build_context", build_answer_context)
+    graph.add_node("generate", RunnableLambda(generate_answer, afunc=agenerate_answer, name="generate"))
     
     # Add edges
     graph.set_entry_point("retrieve")
-    graph.add_edge("retrieve", "generate")
+    if reranker_available():
+        # Optional cross-encoder stage (RERANK_ENABLED + a model on disk)
+        graph.add_edge("retrieve", "rerank")
+        graph.add_edge("rerank", "build_context")
+    else:
+        graph.add_edge("retrieve", "build_context")
+    graph.add_edge("build_context", "generate")
     graph.add_edge("generate", END)
     
     return graph.compile()
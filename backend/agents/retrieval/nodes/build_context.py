@@ -0,0 +1,14 @@
+from agents.retrieval.state import RetrievalAgentState
+from core.metrics import metrics
+from rag.services.context_builder import build_context
+
+def build_answer_context(state: RetrievalAgentState):
+    """
+    Merges, de-duplicates, MMR-orders and token-packs the retrieved chunks;
+    what is left is both the LLM context and the sources shown to the user.
+    """
+    passages, tokens = build_context(state.get("retrieved_docs") or [])
+    metrics.incr("context.passages", len(passages))
+    metrics.incr("context.tokens", tokens)
+
+    return {"retrieved_docs": passages, "context_tokens": tokens}
@@ -1,16 +1,16 @@
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from agents.retrieval.state import RetrievalAgentState
 from agents.llm import llm
 
-def generate_answer(state: RetrievalAgentState):
-    query = state["query"]
-    docs = state.get("retrieved_docs", [])
-    
-    if not docs:
-        return {"answer": "I could not find any relevant information in the knowledge base."}
-        
+NO_ANSWER = "I could not find any relevant information in the knowledge base."
+SYSTEM_PROMPT = "You are a helpful assistant. Use the provided context to answer the user's question accurately."
+
+
+def build_prompt(query: str, docs: list[dict]) -> str:
     context_text = "\n\n".join([f"- {d['chunk_text']}" for d in docs])
     
-    prompt = f"""
+    return f"""
     Context information is below.
     ---------------------
     {context_text}
@@ -18,9 +18,93 @@ def generate_answer(state: RetrievalAgentState):
     Given the context information and not prior knowledge, answer the query.
     Query: {query}
     """
+
+
+def generate_answer(state: RetrievalAgentState, config: RunnableConfig):
+    query = state["query"]
+    docs = state.get("retrieved_docs", [])
+    configurable = config.get("configurable", {})
+
+    if configurable.get("stream_tokens"):
+        return stream_answer(query, docs, state.get("client_profile_id"))
     
-    system_prompt = "You are a helpful assistant. Use the provided context to answer the user's question accurately."
+    if not docs:
+        return {"answer": NO_ANSWER}
     
-    response = llm.invoke(prompt, system_prompt=system_prompt)
+    response = llm.invoke(
+        build_prompt(query, docs), system_prompt=SYSTEM_PROMPT,
+        client_profile_id=state.get("client_profile_id"), node="generate",
+    )
     
     return {"answer": response.content}
+
+
+def stream_answer(query: str, docs: list[dict], client_profile_id: int = None):
+    """
+    Streaming variant: every token is sent to the graph's "custom" stream
+    as {"token": ...}. The HTTP routes stream through the async path
+    (astream_answer), where a client disconnect cancels the run.
+    """
+    write = get_stream_writer()
+
+    if not docs:
+        write({"token": NO_ANSWER})
+        return {"answer": NO_ANSWER}
+
+    parts = []
+    tokens = llm.stream(
+        build_prompt(query, docs), system_prompt=SYSTEM_PROMPT,
+        client_profile_id=client_profile_id, node="generate",
+    )
+    try:
+        for token in tokens:
+            parts.append(token)
+            write({"token": token})
+    finally:
+        tokens.close()
+
+    return {"answer": "".join(parts)}
+
+
+async def agenerate_answer(state: RetrievalAgentState, config: RunnableConfig):
+    query = state["query"]
+    docs = state.get("retrieved_docs", [])
+
+    if config.get("configurable", {}).get("stream_tokens"):
+        return await astream_answer(query, docs, state.get("client_profile_id"))
+
+    if not docs:
+        return {"answer": NO_ANSWER}
+
+    response = await llm.ainvoke(
+        build_prompt(query, docs), system_prompt=SYSTEM_PROMPT,
+        client_profile_id=state.get("client_profile_id"), node="generate",
+    )
+
+    return {"answer": response.content}
+
+
+async def astream_answer(query: str, docs: list[dict], client_profile_id: int = None):
+    """
+    Async stream_answer. When the client goes away the task is cancelled,
+    and that closes the upstream stream.
+    """
+    write = get_stream_writer()
+
+    if not docs:
+        write({"token": NO_ANSWER})
+        return {"answer": NO_ANSWER}
+
+    parts = []
+    tokens = llm.astream(
+        build_prompt(query, docs), system_prompt=SYSTEM_PROMPT,
+        client_profile_id=client_profile_id, node="generate",
+    )
+    try:
+        async for token in tokens:
+            parts.append(token)
+            write({"token": token})
+    finally:
+        await tokens.aclose()
+
+    return {"answer": "".join(parts)}
@@ -0,0 +1,22 @@
+import anyio
+from langchain_core.runnables import RunnableConfig
+from agents.retrieval.state import RetrievalAgentState
+from agents.run_config import time_left
+from rag.services.context_builder import CONTEXT_CANDIDATES
+from rag.services.reranker import get_reranker
+
+def rerank_documents(state: RetrievalAgentState, config: RunnableConfig):
+    """
+    Cross-encoder re-ranking of the over-fetched hits. Skipped (retrieval
+    order kept) when the request deadline leaves no room for it.
+    """
+    hits = state.get("retrieved_docs") or []
+    reranked = get_reranker().rerank(state["query"], hits, time_left=time_left(config))
+    if reranked is None:
+        return {"retrieved_docs": hits[:CONTEXT_CANDIDATES], "reranked": False}
+    return {"retrieved_docs": reranked, "reranked": True}
+
+
+async def arerank_documents(state: RetrievalAgentState, config: RunnableConfig):
+    # CPU-bound inference: keep it off the event loop
+    return await anyio.to_thread.run_sync(rerank_documents, state, config)
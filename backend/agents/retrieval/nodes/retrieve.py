@@ -1,18 +1,36 @@
+from langchain_core.runnables import RunnableConfig
 from agents.retrieval.state import RetrievalAgentState
-from rag.services.embedder import embed_text
-from rag.services.vector_store import search_embeddings
-from sqlalchemy.orm import Session
+from agents.run_config import get_db
+from rag.services.context_builder import CONTEXT_CANDIDATES
+from rag.services.hybrid_search import ahybrid_search, hybrid_search
+from rag.services.reranker import RERANK_CANDIDATES, reranker_available
 
-def retrieve_documents(state: RetrievalAgentState, db: Session):
+def candidate_count() -> int:
+    return RERANK_CANDIDATES if reranker_available() else CONTEXT_CANDIDATES
+
+
+def retrieve_documents(state: RetrievalAgentState, config: RunnableConfig):
     query = state["query"]
     client_profile_id = state.get("client_profile_id")
+    embedding_model = state.get("embedding_model")
     
-    # 1. Embed query
-    # embed_text expects list
-    embeddings = embed_text([query])
-    query_embedding = embeddings[0]
-
-    # 2. Search
-    results = search_embeddings(db, query_embedding, limit=5, client_profile_id=client_profile_id)
+    # BM25 + vector search fused with RRF; identifier-only queries
+    # (order IDs, SKUs) are answered from the lexical index alone.
+    # Over-fetches: rerank and build_context pick what goes into the prompt.
+    results, mode = hybrid_search(
+        get_db(config), query, client_profile_id, limit=candidate_count(), embedding_model=embedding_model
+    )
     
-    return {"retrieved_docs": results}
+    return {"retrieved_docs": results, "retrieval_mode": mode}
+
+
+async def aretrieve_documents(state: RetrievalAgentState, config: RunnableConfig):
+    results, mode = await ahybrid_search(
+        get_db(config),
+        state["query"],
+        state.get("client_profile_id"),
+        limit=candidate_count(),
+        embedding_model=state.get("embedding_model"),
+    )
+
+    return {"retrieved_docs": results, "retrieval_mode": mode}
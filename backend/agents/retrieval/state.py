@@ -4,9 +4,13 @@ class RetrievalAgentState(TypedDict):
     # Input
     query: str
     client_profile_id: int
+    embedding_model: Optional[str] # tenant's model; None = default
 
     # Internal
     retrieved_docs: Optional[List[Dict]] # [{"chunk_text":..., "similarity":...}]
+    retrieval_mode: Optional[str] # "lexical" | "hybrid" | "vector"
+    reranked: Optional[bool] # cross-encoder ran (False when skipped for time)
+    context_tokens: Optional[int] # estimated prompt tokens of retrieved_docs after build_context
 
     # Output
     answer: Optional[str]
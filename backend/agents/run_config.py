@@ -0,0 +1,23 @@
+# agents/run_config.py
+import time
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from sqlalchemy.orm import Session
+
+
+def get_db(config: RunnableConfig) -> Session:
+    """
+    Request DB session passed in through the run config.
+    """
+    return config["configurable"]["db"]
+
+
+def time_left(config: RunnableConfig) -> Optional[float]:
+    """
+    Seconds until the request's deadline, or None without one.
+    """
+    deadline = config.get("configurable", {}).get("deadline")
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
@@ -8,12 +8,13 @@ from agents.ticket.nodes.respond import generate_customer_response
 
 from agents.ticket.state import TicketAgentState
 
-def build_ticket_agent(db):
+def build_ticket_agent():
+    # Compiled once by agents.registry; the DB session comes from the run config
     graph = StateGraph(TicketAgentState)
 
     graph.add_node("analyze", analyze_customer_message)
-    graph.add_node("create_ticket", lambda s: create_ticket(s, db))
-    graph.add_node("escalate", lambda s: escalate_ticket(s, db))
+    graph.add_node("create_ticket", create_ticket)
+    graph.add_node("escalate", escalate_ticket)
     graph.add_node("respond", generate_customer_response)
 
     graph.set_entry_point("analyze")
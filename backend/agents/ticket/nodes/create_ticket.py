@@ -1,8 +1,11 @@
 # agents/ticket/nodes/create_ticket.py
 from tms.models import Ticket, TicketStatus, TicketPriority
+from langchain_core.runnables import RunnableConfig
 from agents.ticket.state import TicketAgentState
+from agents.run_config import get_db
 
-def create_ticket(state: TicketAgentState, db):
+def create_ticket(state: TicketAgentState, config: RunnableConfig):
+    db = get_db(config)
     ticket = Ticket(
         client_profile_id=state["client_profile_id"],
         created_by_user_id=None,  # AI-created
@@ -1,39 +1,58 @@
 # agents/ticket/nodes/decision.py
-from agents.llm import llm
-from agents.ticket.state import TicketAgentState
-from agents.utils.json_parser import extract_json
+import logging
+
+from agents.llm import LLMUnavailableError, StructuredOutputError, llm
+from agents.usage import TokenBudgetExceeded
+from agents.ticket.state import TicketAgentState, TicketAnalysis
+from core.metrics import metrics
+
+logger = logging.getLogger("agents.ticket.decision")
+
+
+def fallback_analysis(notes: str, confidence: int) -> dict:
+    """
+    The analysis used when the LLM gives none: a generic high-priority
+    ticket escalated to a human.
+    """
+    return {
+        "subject": "Customer Support Request",
+        "category": "general",
+        "priority": "high",
+        "needs_escalation": True,
+        "ai_confidence": confidence,
+        "agent_notes": notes,
+    }
 
 
 def analyze_customer_message(state: TicketAgentState):
     prompt = f"""
-Analyze the customer message and return ONLY valid JSON.
-
-Required fields:
-- subject
-- category (refund, billing, technical, delivery, general)
-- priority (low, medium, high, urgent)
-- needs_escalation (true or false)
-- ai_confidence (0-100)
-- agent_notes
+Analyze the customer message and classify the support ticket.
 
 Customer message:
 {state["customer_message"]}
 """
 
-    result = llm.invoke(prompt)
-
     try:
-        data = extract_json(result.content)
-    except Exception as e:
+        # Schema-constrained; violations are retried inside the LLM layer
+        analysis = llm.invoke_structured(
+            prompt, TicketAnalysis, client_profile_id=state["client_profile_id"], node="analyze"
+        )
+        data = analysis.model_dump()
+    except (LLMUnavailableError, TokenBudgetExceeded) as e:
+        # Provider down or tenant over budget: the ticket is still
+        # created, for a human to triage
+        data = fallback_analysis(f"LLM unavailable: {str(e)}", 0)
+    except StructuredOutputError as e:
         # Safe fallback → escalate to human
-        data = {
-            "subject": "Customer Support Request",
-            "category": "general",
-            "priority": "high",
-            "needs_escalation": True,
-            "ai_confidence": 30,
-            "agent_notes": f"LLM JSON parsing failed: {str(e)}",
-        }
+        metrics.incr("ticket.analysis.schema_fallback")
+        logger.warning("Ticket analysis for tenant %s escalated: %s", state["client_profile_id"], e)
+        data = fallback_analysis(f"LLM output did not match the ticket schema: {str(e.error)[:300]}", 30)
+    except Exception as e:
+        # Anything else (bad request, auth, unexpected response):
+        # safe fallback → escalate to human
+        metrics.incr("ticket.analysis.error_fallback")
+        logger.exception("Ticket analysis for tenant %s failed", state["client_profile_id"])
+        data = fallback_analysis(f"LLM call failed: {str(e)[:300]}", 30)
 
     state.update(data)
     return state
@@ -1,8 +1,11 @@
 # agents/ticket/nodes/escalate.py
 from tms.models import Ticket, TicketStatus
+from langchain_core.runnables import RunnableConfig
 from agents.ticket.state import TicketAgentState
+from agents.run_config import get_db
 
-def escalate_ticket(state: TicketAgentState, db):
+def escalate_ticket(state: TicketAgentState, config: RunnableConfig):
+    db = get_db(config)
     ticket = db.query(Ticket).get(state["ticket_id"])
     ticket.status = TicketStatus.in_progress
     ticket.agent_notes = state["agent_notes"]
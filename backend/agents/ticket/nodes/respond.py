@@ -1,7 +1,13 @@
 # agents/ticket/nodes/respond.py
-from agents.llm import llm
+from agents.llm import LLMUnavailableError, llm
+from agents.usage import TokenBudgetExceeded
 from agents.ticket.state import TicketAgentState
 
+FALLBACK_RESPONSE = (
+    "Thanks for reaching out. We have created a ticket for your request "
+    "and our support team will get back to you shortly."
+)
+
 def generate_customer_response(state: TicketAgentState):
     prompt = f"""
 You are a polite e-commerce support assistant.
@@ -12,6 +18,9 @@ Customer message:
 Write a short reassuring response confirming ticket creation.
 """
 
-    result = llm.invoke(prompt)
-    state["response"] = result.content
+    try:
+        result = llm.invoke(prompt, client_profile_id=state["client_profile_id"], node="respond")
+        state["response"] = result.content
+    except (LLMUnavailableError, TokenBudgetExceeded):
+        state["response"] = FALLBACK_RESPONSE
     return state
@@ -1,5 +1,7 @@
 # agents/ticket/state.py
-from typing import TypedDict, Optional
+from typing import Literal, TypedDict, Optional
+
+from pydantic import BaseModel, Field
 
 class TicketAgentState(TypedDict):
     # Input
@@ -22,3 +24,18 @@ class TicketAgentState(TypedDict):
 
     # Output
     response: Optional[str]
+
+
+class TicketAnalysis(BaseModel):
+    """
+    The "AI decisions" part of TicketAgentState, as the schema the LLM
+    must answer in (see GroqChatLLM.invoke_structured).
+    """
+
+    subject: str = Field(max_length=255, description="Short ticket subject")
+    category: Literal["refund", "billing", "technical", "delivery", "general"]
+    # tms.models.TicketPriority values
+    priority: Literal["low", "medium", "high", "urgent"]
+    needs_escalation: bool
+    ai_confidence: int = Field(ge=0, le=100, description="Confidence in this analysis, 0-100")
+    agent_notes: str = Field(description="Notes for the support agent")
@@ -0,0 +1,329 @@
+# agents/usage.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import anyio
+from sqlalchemy.orm import Session
+
+from agents.models import LLMUsage
+from core.metrics import metrics
+
+logger = logging.getLogger("agents.usage")
+
+LLM_USAGE_ENABLED = os.getenv("LLM_USAGE_ENABLED", "true").lower() == "true"
+# Tokens (prompt + completion) per minute each tenant may use; also the burst size
+PLAN_TOKENS_PER_MINUTE = {
+    "basic": int(os.getenv("LLM_TOKENS_PER_MINUTE_BASIC", "20000")),
+    "pro": int(os.getenv("LLM_TOKENS_PER_MINUTE_PRO", "100000")),
+}
+# Longest a call waits for its tenant's bucket before it is shed
+LLM_TOKEN_QUEUE_SECONDS = float(os.getenv("LLM_TOKEN_QUEUE_SECONDS", "5"))
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv("LLM_USAGE_FLUSH_SECONDS", "15"))
+# How long a tenant's plan is trusted before it is read again
+LLM_PLAN_CACHE_SECONDS = float(os.getenv("LLM_PLAN_CACHE_SECONDS", "300"))
+
+
+class TokenBudgetExceeded(Exception):
+    """
+    The tenant is over its plan's token rate; `retry_after` is when the
+    call would fit.
+    """
+
+    def __init__(self, client_profile_id: int, retry_after: float):
+        super().__init__(f"Token budget exceeded for tenant {client_profile_id}; retry in {retry_after:.0f}s")
+        self.client_profile_id = client_profile_id
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills at `rate` tokens per second up to `capacity`. A reservation
+    may take the balance negative: the debt is the queue, and the next
+    caller waits until it is paid off, so callers are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float) -> float:
+        with self._lock:
+            self._refill()
+            return max(0.0, (min(tokens, self.capacity) - self.tokens) / self.rate)
+
+    def reserve(self, tokens: float, max_wait: float) -> Optional[float]:
+        """
+        Seconds to wait before using `tokens`, or None (nothing taken) when
+        that would be longer than `max_wait`.
+        """
+        # One oversized call must not block the tenant for good
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= tokens
+            return wait
+
+    def refund(self, tokens: float):
+        """
+        Returns unused tokens (negative: charges an overrun).
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+def _load_plan(client_profile_id: int) -> Optional[str]:
+    from auth.database import SessionLocal
+    from user.models import ClientProfile
+
+    db = SessionLocal()
+    try:
+        return db.query(ClientProfile.subscription_plan).filter(ClientProfile.id == client_profile_id).scalar()
+    finally:
+        db.close()
+
+
+class UsageAccountant:
+    """
+    Per-tenant LLM token accounting.
+
+    Limits: one token bucket per tenant, sized by its subscription plan
+    (PLAN_TOKENS_PER_MINUTE). A call reserves its estimated tokens before
+    it is sent; when the bucket is short the call waits up to
+    `queue_seconds`, beyond that it is shed with TokenBudgetExceeded. The
+    estimate is settled against the reported usage afterwards. Buckets are
+    per process, so with N workers a tenant can use up to N times its rate.
+
+    Usage: summed in memory per (tenant, model, node, hour) and written
+    to `llm_usage` every `flush_seconds` by a background thread, one
+    upsert per batch.
+    """
+
+    def __init__(self, limits: dict[str, int] = None, queue_seconds: float = LLM_TOKEN_QUEUE_SECONDS,
+                 flush_seconds: float = LLM_USAGE_FLUSH_SECONDS, plan_seconds: float = LLM_PLAN_CACHE_SECONDS,
+                 plan_lookup: Callable[[int], Optional[str]] = _load_plan,
+                 session_factory: Callable[[], Session] = None, clock: Callable[[], float] = time.monotonic):
+        self.limits = limits or PLAN_TOKENS_PER_MINUTE
+        self.queue_seconds = queue_seconds
+        self.flush_seconds = flush_seconds
+        self.plan_seconds = plan_seconds
+        self.plan_lookup = plan_lookup
+        self.session_factory = session_factory
+        self.clock = clock
+
+        self._plans: dict[int, tuple[str, float]] = {}
+        self._buckets: dict[int, tuple[str, TokenBucket]] = {}
+        # (client_profile_id, model, node, hour) -> [requests, prompt, completion]
+        self._pending: dict[tuple, list[int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Limits
+    # -------------------------
+    def _cached_plan(self, client_profile_id: int) -> Optional[str]:
+        entry = self._plans.get(client_profile_id)
+        if entry and self.clock() - entry[1] < self.plan_seconds:
+            return entry[0]
+        return None
+
+    def plan(self, client_profile_id: int) -> str:
+        plan = self._cached_plan(client_profile_id)
+        if plan is None:
+            try:
+                plan = self.plan_lookup(client_profile_id) or "basic"
+            except Exception:
+                logger.exception("Could not load the plan of tenant %s", client_profile_id)
+                plan = "basic"
+            self._plans[client_profile_id] = (plan, self.clock())
+        return plan
+
+    def _bucket(self, client_profile_id: int) -> TokenBucket:
+        plan = self.plan(client_profile_id)
+        with self._lock:
+            entry = self._buckets.get(client_profile_id)
+            if entry is None or entry[0] != plan:
+                per_minute = self.limits.get(plan, self.limits["basic"])
+                entry = self._buckets[client_profile_id] = (plan, TokenBucket(per_minute / 60, per_minute, self.clock))
+        return entry[1]
+
+    def _take(self, client_profile_id: int, tokens: int) -> tuple[float, TokenBucket]:
+        bucket = self._bucket(client_profile_id)
+        wait = bucket.reserve(tokens, self.queue_seconds)
+        if wait is None:
+            metrics.incr("llm.usage.shed")
+            raise TokenBudgetExceeded(client_profile_id, bucket.wait_time(tokens))
+        if wait:
+            metrics.incr("llm.usage.queued")
+            metrics.observe("llm.usage.queue_wait", wait)
+        return wait, bucket
+
+    def reserve(self, client_profile_id: int, tokens: int) -> float:
+        """
+        Takes `tokens` from the tenant's bucket; returns how long to wait
+        before sending, or raises TokenBudgetExceeded.
+        """
+        return self._take(client_profile_id, tokens)[0]
+
+    def acquire(self, client_profile_id: int, tokens: int) -> TokenBucket:
+        """
+        reserve() and wait; returns the bucket to hand back to settle().
+        """
+        wait, bucket = self._take(client_profile_id, tokens)
+        time.sleep(wait)
+        return bucket
+
+    async def aacquire(self, client_profile_id: int, tokens: int) -> TokenBucket:
+        if self._cached_plan(client_profile_id) is None:
+            # Plan lookup hits the database; keep it off the event loop
+            await anyio.to_thread.run_sync(self.plan, client_profile_id)
+        wait, bucket = self._take(client_profile_id, tokens)
+        await anyio.sleep(wait)
+        return bucket
+
+    def settle(self, client_profile_id: int, model: str, node: str, reserved: int,
+               prompt_tokens: int = 0, completion_tokens: int = 0, bucket: TokenBucket = None):
+        """
+        Corrects the bucket the tokens were reserved from (`bucket`, as
+        returned by acquire; otherwise the tenant's current one) by the
+        difference between the reservation and what was used, and records
+        the usage. Never looks the plan up, so it is safe on the event loop.
+        """
+        used = prompt_tokens + completion_tokens
+        if bucket is None:
+            with self._lock:
+                entry = self._buckets.get(client_profile_id)
+            bucket = entry[1] if entry else None
+        if bucket is not None:
+            bucket.refund(min(reserved, bucket.capacity) - used)
+        if used:
+            self.record(client_profile_id, model, node, prompt_tokens, completion_tokens)
+
+    # -------------------------
+    # Usage
+    # -------------------------
+    def record(self, client_profile_id: int, model: str, node: str, prompt_tokens: int, completion_tokens: int):
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        key = (client_profile_id, model, node or "unknown", hour)
+        with self._lock:
+            row = self._pending.setdefault(key, [0, 0, 0])
+            row[0] += 1
+            row[1] += prompt_tokens
+            row[2] += completion_tokens
+
+    def flush(self, db: Session = None) -> int:
+        """
+        Writes pending usage in one upsert; returns the number of rows.
+        On failure the batch is put back for the next flush.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        own_session = db is None
+        if own_session:
+            if self.session_factory is None:
+                from auth.database import SessionLocal
+                self.session_factory = SessionLocal
+            db = self.session_factory()
+        try:
+            _upsert_usage(db, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for key, (requests, prompt, completion) in batch.items():
+                    row = self._pending.setdefault(key, [0, 0, 0])
+                    row[0] += requests
+                    row[1] += prompt
+                    row[2] += completion
+            metrics.incr("llm.usage.flush_errors")
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+        metrics.incr("llm.usage.flushed_rows", len(batch))
+        return len(batch)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("LLM usage flush failed")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="llm-usage-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Final LLM usage flush failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending_rows": len(self._pending),
+                "tenants_tracked": len(self._buckets),
+            }
+
+
+def _upsert_usage(db: Session, batch: dict[tuple, list[int]]):
+    if db.bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    now = datetime.utcnow()
+    statement = insert(LLMUsage).values([
+        {
+            "client_profile_id": client_profile_id,
+            "model": model,
+            "node": node,
+            "period_start": hour,
+            "requests": requests,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "updated_at": now,
+        }
+        for (client_profile_id, model, node, hour), (requests, prompt, completion) in batch.items()
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["client_profile_id", "model", "node", "period_start"],
+        set_={
+            "requests": LLMUsage.requests + statement.excluded.requests,
+            "prompt_tokens": LLMUsage.prompt_tokens + statement.excluded.prompt_tokens,
+            "completion_tokens": LLMUsage.completion_tokens + statement.excluded.completion_tokens,
+            "updated_at": statement.excluded.updated_at,
+        },
+    ))
+
+
+usage_accountant = UsageAccountant() if LLM_USAGE_ENABLED else None
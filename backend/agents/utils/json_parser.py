@@ -18,3 +18,83 @@ def extract_json(text: str) -> dict:
         raise ValueError("No JSON object found")
 
     return json.loads(match.group())
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object as it streams in. `feed()` returns each
+    top-level member as soon as its value is complete, so a caller can
+    check it and stop the stream early; `result()` parses the whole text
+    once the object is closed. Anything before the opening brace (prose,
+    a ```json fence) or after the closing one is an error.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._member: list[str] = []
+        self.depth = 0
+        self.started = False
+        self.done = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self._chunks.append(chunk)
+        members = []
+        for ch in chunk:
+            if self.done:
+                if not ch.isspace():
+                    raise JSONStreamError("Text after the JSON object")
+                continue
+            if not self.started:
+                if ch.isspace():
+                    continue
+                if ch != "{":
+                    raise JSONStreamError("Expected a JSON object")
+                self.started, self.depth = True, 1
+                continue
+
+            if self._in_string:
+                self._member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if not self.depth:
+                    members += self._finish_member()
+                    self.done = True
+                    continue
+            elif ch == "," and self.depth == 1:
+                members += self._finish_member()
+                continue
+            self._member.append(ch)
+        return members
+
+    def _finish_member(self) -> list[tuple[str, object]]:
+        raw = "".join(self._member).strip()
+        self._member = []
+        if not raw:
+            return []
+        try:
+            return list(json.loads("{" + raw + "}").items())
+        except json.JSONDecodeError as e:
+            raise JSONStreamError(f"Invalid member: {raw[:80]}") from e
+
+    def result(self) -> dict:
+        if not self.done:
+            raise JSONStreamError("Incomplete JSON object")
+        return json.loads("".join(self._chunks))
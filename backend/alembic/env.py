@@ -10,6 +10,8 @@ load_dotenv()
 from auth.database import Base  # SQLAlchemy Base
 from user.models import ClientProfile, KnowledgeDocument, User
 from tms.models import Ticket, TicketPriority, TicketStatus
+from rag.models import IngestionJob
+from agents.models import LLMUsage
 
 DB_USER = os.getenv("DB_USER", "ashim")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "2024")
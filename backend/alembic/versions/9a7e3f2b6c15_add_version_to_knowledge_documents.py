@@ -0,0 +1,30 @@
+"""Add version to knowledge_documents
+
+Revision ID: 9a7e3f2b6c15
+Revises: 5c2d8e1a9f40
+Create Date: 2026-10-18 11:40:03.118504
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a7e3f2b6c15'
+down_revision: Union[str, Sequence[str], None] = '5c2d8e1a9f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('knowledge_documents', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.create_index('ix_knowledge_documents_client_profile_id_file_name', 'knowledge_documents', ['client_profile_id', 'file_name'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_knowledge_documents_client_profile_id_file_name', table_name='knowledge_documents')
+    op.drop_column('knowledge_documents', 'version')
@@ -0,0 +1,45 @@
+"""add llm_usage table
+
+Revision ID: b3c9d1e4f7a2
+Revises: e2f4a7c19b38
+Create Date: 2026-10-18 18:02:51.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c9d1e4f7a2'
+down_revision: Union[str, Sequence[str], None] = 'e2f4a7c19b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('llm_usage',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('client_profile_id', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('node', sa.String(length=100), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('completion_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['client_profile_id'], ['client_profiles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('client_profile_id', 'model', 'node', 'period_start', name='uq_llm_usage_bucket')
+    )
+    op.create_index(op.f('ix_llm_usage_id'), 'llm_usage', ['id'], unique=False)
+    op.create_index(op.f('ix_llm_usage_client_profile_id'), 'llm_usage', ['client_profile_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_llm_usage_client_profile_id'), table_name='llm_usage')
+    op.drop_index(op.f('ix_llm_usage_id'), table_name='llm_usage')
+    op.drop_table('llm_usage')
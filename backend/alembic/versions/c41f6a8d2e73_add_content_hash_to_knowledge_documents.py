@@ -0,0 +1,30 @@
+"""Add content_hash to knowledge_documents
+
+Revision ID: c41f6a8d2e73
+Revises: 9a7e3f2b6c15
+Create Date: 2026-10-18 13:05:27.940216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f6a8d2e73'
+down_revision: Union[str, Sequence[str], None] = '9a7e3f2b6c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('knowledge_documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_knowledge_documents_content_hash'), 'knowledge_documents', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_knowledge_documents_content_hash'), table_name='knowledge_documents')
+    op.drop_column('knowledge_documents', 'content_hash')
@@ -0,0 +1,53 @@
+"""pgvector store columns and indexes on document_embeddings
+
+Revision ID: d8b05e37a1c9
+Revises: c41f6a8d2e73
+Create Date: 2026-10-18 15:22:09.671843
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b05e37a1c9'
+down_revision: Union[str, Sequence[str], None] = 'c41f6a8d2e73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS chunk_id VARCHAR(100)")
+    op.execute("ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS client_profile_id INT REFERENCES client_profiles(id) ON DELETE CASCADE")
+    op.execute("ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS chunk_hash VARCHAR(64)")
+
+    # Backfill rows written before chunk ids / tenants were stored
+    op.execute("UPDATE document_embeddings SET chunk_id = document_id || '_' || chunk_index WHERE chunk_id IS NULL")
+    op.execute("""
+        UPDATE document_embeddings e SET client_profile_id = d.client_profile_id
+        FROM knowledge_documents d
+        WHERE e.document_id = d.id AND e.client_profile_id IS NULL
+    """)
+    op.execute("ALTER TABLE document_embeddings ALTER COLUMN chunk_id SET NOT NULL")
+
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_document_embeddings_chunk_id ON document_embeddings (chunk_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_document_embeddings_client_profile_id ON document_embeddings (client_profile_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_document_embeddings_document_id ON document_embeddings (document_id)")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_document_embeddings_embedding_hnsw
+        ON document_embeddings USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_document_embeddings_embedding_hnsw")
+    op.execute("DROP INDEX IF EXISTS ix_document_embeddings_document_id")
+    op.execute("DROP INDEX IF EXISTS ix_document_embeddings_client_profile_id")
+    op.execute("DROP INDEX IF EXISTS ix_document_embeddings_chunk_id")
+    op.execute("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS chunk_hash")
+    op.execute("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS client_profile_id")
+    op.execute("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS chunk_id")
@@ -0,0 +1,35 @@
+"""add embedding_model to client_profiles
+
+Revision ID: e2f4a7c19b38
+Revises: d8b05e37a1c9
+Create Date: 2026-10-18 16:41:27.218405
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f4a7c19b38'
+down_revision: Union[str, Sequence[str], None] = 'd8b05e37a1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('client_profiles', sa.Column('embedding_model', sa.String(length=100), nullable=True))
+
+    # The old "minilm" default was never honoured: every stored vector so far
+    # came from Gemini, and the pipeline now trusts this column.
+    op.execute("UPDATE knowledge_documents SET embedding_model = 'gemini-embedding-001' WHERE embedding_model = 'minilm'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Back to the old column default; before this revision every row held
+    # "minilm" whatever model actually produced its vectors
+    op.execute("UPDATE knowledge_documents SET embedding_model = 'minilm' WHERE embedding_model = 'gemini-embedding-001'")
+    op.drop_column('client_profiles', 'embedding_model')
@@ -0,0 +1,99 @@
+"""
+Memory and recall@k of the quantized vector store against exact float32
+search.
+
+    python -m benchmarks.quantization [--collection document_embeddings] \
+        [--sample 20000] [--queries 200] [--k 10] [--rescore 1,4,8]
+    python -m benchmarks.quantization --synthetic 50000x768
+
+Vectors are read from a Chroma collection (or generated). A held-out
+sample serves as queries; ground truth is the exact cosine top k over the
+rest. Each mode is built in a temporary QuantizedSegment, so nothing in
+storage/ is touched. Rescore factor 1 shows the codes alone.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from rag.services.quantized_store import QuantizedSegment, normalize
+
+
+def load_chroma(collection: str, sample: int) -> np.ndarray:
+    from rag.services.vector_store import chroma_store
+
+    result = chroma_store.get(where=None, include=["embeddings"], collection=collection, limit=sample)
+    if not len(result["ids"]):
+        raise SystemExit(f"Collection {collection} is empty or missing")
+    return normalize(result["embeddings"])
+
+
+def synthetic(spec: str, seed: int = 0) -> np.ndarray:
+    """
+    Clustered vectors, closer to real embeddings than isotropic noise.
+    """
+    count, dim = (int(x) for x in spec.lower().split("x"))
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 50), dim))
+    return normalize(centers[rng.integers(0, len(centers), count)] + 0.6 * rng.normal(size=(count, dim)))
+
+
+def evaluate(base: np.ndarray, queries: np.ndarray, k: int, quantization: str, rescore: int) -> dict:
+    truth = [set(np.argsort(-(base @ q))[:k].tolist()) for q in queries]
+
+    with tempfile.TemporaryDirectory() as path:
+        segment = QuantizedSegment(path, quantization, rescore_factor=rescore)
+        ids = [str(i) for i in range(len(base))]
+        for start in range(0, len(base), 5000):
+            part = slice(start, start + 5000)
+            segment.add(ids[part], base[part], ids[part], [{"document_id": 0}] * len(ids[part]))
+        segment.search(queries[0], k)  # load
+
+        recalls, latencies = [], []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = segment.search(q, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & {int(h["chunk_id"]) for h in hits}) / k)
+        stats = segment.stats()
+
+    return {
+        "quantization": quantization,
+        "rescore": rescore,
+        "recall": statistics.mean(recalls),
+        "p50_ms": statistics.median(latencies),
+        "ram_mb": stats["ram_bytes"] / 2**20,
+        "float32_mb": stats["float32_bytes"] / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized vector storage")
+    parser.add_argument("--collection", default="document_embeddings")
+    parser.add_argument("--synthetic", help="COUNTxDIM generated vectors instead of a collection")
+    parser.add_argument("--sample", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", default="1,4,8")
+    args = parser.parse_args()
+
+    vectors = synthetic(args.synthetic) if args.synthetic else load_chroma(args.collection, args.sample)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    queries, base = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    print(f"{len(base)} vectors x {base.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'mode':>8} {'rescore':>8} {'recall':>8} {'p50 ms':>8} {'RAM MB':>8} {'float MB':>9} {'saved':>7}")
+    for quantization in ("int8", "binary"):
+        for rescore in (int(r) for r in args.rescore.split(",")):
+            row = evaluate(base, queries, args.k, quantization, rescore)
+            print(
+                f"{row['quantization']:>8} {row['rescore']:>8} {row['recall']:>8.3f} {row['p50_ms']:>8.2f} "
+                f"{row['ram_mb']:>8.1f} {row['float32_mb']:>9.1f} {1 - row['ram_mb'] / row['float32_mb']:>7.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Latency / precision trade-off of the cross-encoder re-ranking stage.
+
+    python -m benchmarks.rerank --queries queries.jsonl [--tenant 3] \
+        [--candidates 10,20,50] [--top-k 3] [--model-dir storage/models/ms-marco-MiniLM-L-6-v2]
+
+Each line of the queries file is {"query": ..., "relevant": [chunk_id, ...]},
+optionally with "candidates": [{"chunk_id": ..., "chunk_text": ...}, ...] in
+retrieval order. Without candidates they are fetched for --tenant with
+hybrid_search, so the vector store and database must be reachable.
+
+For every candidate count N the report shows precision@k of the retrieval
+order and of the re-ranked top k, plus the p50/p95 time spent scoring N
+pairs. No deadline is applied here.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from rag.services.reranker import RERANK_MODEL_DIR, RERANK_TOP_K, OnnxCrossEncoder, Reranker
+
+
+def load_queries(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fetch_candidates(queries: list[dict], tenant: int, limit: int):
+    """
+    Fills in "candidates" for queries that have none.
+    """
+    if all("candidates" in q for q in queries):
+        return
+
+    from auth.database import SessionLocal
+    from rag.services.hybrid_search import hybrid_search
+    from user.models import ClientProfile
+
+    db = SessionLocal()
+    try:
+        embedding_model = db.get(ClientProfile, tenant).embedding_model
+        for q in queries:
+            if "candidates" not in q:
+                q["candidates"], _ = hybrid_search(db, q["query"], tenant, limit=limit, embedding_model=embedding_model)
+    finally:
+        db.close()
+
+
+def precision_at_k(hits: list[dict], relevant: set, k: int) -> float:
+    return sum(1 for hit in hits[:k] if hit["chunk_id"] in relevant) / k
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(queries: list[dict], reranker: Reranker, candidate_counts: list[int], top_k: int) -> list[dict]:
+    # Warm-up, so session initialisation is not billed to the first query
+    reranker.rerank(queries[0]["query"], queries[0]["candidates"][:top_k], top_k)
+
+    rows = []
+    for n in candidate_counts:
+        baseline, reranked, latencies = [], [], []
+        for q in queries:
+            candidates = q["candidates"][:n]
+            relevant = set(q["relevant"])
+
+            start = time.perf_counter()
+            top = reranker.rerank(q["query"], candidates, top_k) or []
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            baseline.append(precision_at_k(candidates, relevant, top_k))
+            reranked.append(precision_at_k(top, relevant, top_k))
+
+        rows.append({
+            "candidates": n,
+            "precision_retrieval": statistics.mean(baseline),
+            "precision_reranked": statistics.mean(reranked),
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder re-ranking")
+    parser.add_argument("--queries", required=True)
+    parser.add_argument("--tenant", type=int)
+    parser.add_argument("--candidates", default="10,20,50")
+    parser.add_argument("--top-k", type=int, default=RERANK_TOP_K)
+    parser.add_argument("--model-dir", default=RERANK_MODEL_DIR)
+    args = parser.parse_args()
+
+    candidate_counts = [int(n) for n in args.candidates.split(",")]
+    queries = load_queries(args.queries)
+    if not all("candidates" in q for q in queries) and args.tenant is None:
+        raise SystemExit("Queries without candidates need --tenant")
+    fetch_candidates(queries, args.tenant, max(candidate_counts))
+
+    # No latency budget: every candidate is scored
+    reranker = Reranker(OnnxCrossEncoder(args.model_dir), budget_ms=1e9)
+    rows = run(queries, reranker, candidate_counts, args.top_k)
+
+    print(f"{len(queries)} queries, precision@{args.top_k}")
+    print(f"{'candidates':>10} {'retrieval':>10} {'reranked':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(
+            f"{row['candidates']:>10} {row['precision_retrieval']:>10.3f} {row['precision_reranked']:>10.3f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Offline retrieval benchmark: ingest throughput, query latency, memory and
+recall for every vector store backend and retrieval mode.
+
+    python -m benchmarks.retrieval [--sizes 1000,10000,100000] [--tenants 20] \
+        [--backends chroma,quantized-int8,quantized-binary,exact] \
+        [--modes vector,lexical,hybrid,graph] [--queries 200] [--k 10] [--dim 256] \
+        [--output results.json] [--compare previous.json]
+
+Corpora are synthetic and deterministic (--seed): chunks of generated
+words drawn from per-tenant topics, split over tenants with a skewed size
+distribution, embedded by a bag-of-words fake embedder (no network, no
+model files). Queries are a handful of words from a random chunk of a tenant.
+
+Queries go through the application's own code: "vector" and "hybrid" time
+rag.services.hybrid_search (lexical index off and on), "lexical" the
+tenant's LexicalIndex.search, and "graph" a full
+graph_registry.invoke("retrieval") run. In the benchmark process the
+store under test replaces the shared vector store, lexical indexes live
+in the temporary directory, embed_text/aembed_text are the fake embedder
+and the LLM answers instantly, so only retrieval and graph overhead are
+measured.
+
+Per (size, backend, mode) the JSON output has ingest chunks/s, query
+p50/p95/p99, recall@k against exact cosine search (vector and hybrid),
+hit@k (the query's source chunk was returned; for "graph", among the
+chunks merged into the context), the process RSS growth and the bytes on
+disk. Each backend runs in a fresh process against a temporary
+directory, so RSS numbers are comparable and storage/ is never touched.
+--compare prints the change against an earlier results file.
+
+pgvector is not included: it needs a Postgres server.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+import numpy as np
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "su", "ta", "ri", "po", "de", "va", "zu", "fe", "go", "hi", "ju", "be", "xa", "yo", "we", "qu"]
+CHUNK_WORDS = 24
+QUERY_WORDS = 6
+BATCH_SIZE = 1000
+DEFAULT_BACKENDS = "chroma,quantized-int8,quantized-binary,exact"
+
+
+# -------------------------
+# Synthetic corpus
+# -------------------------
+def vocabulary() -> list[str]:
+    """
+    8000 pronounceable words; no digits, so they tokenize as plain words.
+    """
+    return [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+class FakeEmbedder:
+    """
+    Deterministic bag-of-words embedder: each word id owns a fixed random
+    vector and a text is the normalized sum of its words. Texts sharing
+    words end up close, which is all a retrieval benchmark needs.
+    """
+
+    def __init__(self, vocab_size: int, dim: int, seed: int = 0):
+        self.table = np.random.default_rng(seed).standard_normal((vocab_size, dim)).astype(np.float32)
+
+    def embed_ids(self, word_ids: np.ndarray) -> np.ndarray:
+        vectors = self.table[word_ids].sum(axis=1)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def tenant_sizes(total: int, tenants: int) -> list[int]:
+    """
+    Zipf-like split: a few large tenants and a long tail of small ones.
+    """
+    weights = 1 / np.arange(1, tenants + 1)
+    sizes = np.maximum(1, np.floor(weights / weights.sum() * total)).astype(int)
+    sizes[0] += total - sizes.sum()
+    return sizes.tolist()
+
+
+def generate_corpus(path: str, total: int, tenants: int, dim: int, seed: int) -> dict:
+    """
+    Writes word ids, tenant ids and embeddings to .npy files under `path`
+    (memory-mapped by the benchmark processes).
+    """
+    rng = np.random.default_rng(seed)
+    vocab_size = len(vocabulary())
+    embedder = FakeEmbedder(vocab_size, dim, seed)
+    sizes = tenant_sizes(total, tenants)
+
+    words = np.lib.format.open_memmap(os.path.join(path, "words.npy"), "w+", np.int32, (total, CHUNK_WORDS))
+    tenant_ids = np.repeat(np.arange(1, tenants + 1, dtype=np.int32), sizes)
+    embeddings = np.lib.format.open_memmap(os.path.join(path, "embeddings.npy"), "w+", np.float32, (total, dim))
+
+    # Zipf background words shared by everyone, topic words per tenant
+    background = rng.zipf(1.3, size=(total, CHUNK_WORDS // 3)) % vocab_size
+    for start in range(0, total, 10000):
+        end = min(total, start + 10000)
+        topic_base = (tenant_ids[start:end, None] * 7919 + rng.integers(0, 8, (end - start, 1)) * 211) % vocab_size
+        topic = (topic_base + rng.integers(0, 200, (end - start, CHUNK_WORDS - CHUNK_WORDS // 3))) % vocab_size
+        words[start:end] = np.concatenate([topic, background[start:end]], axis=1)
+        embeddings[start:end] = embedder.embed_ids(words[start:end])
+
+    np.save(os.path.join(path, "tenants.npy"), tenant_ids)
+    words.flush()
+    embeddings.flush()
+    return {"sizes": sizes, "vocab_size": vocab_size}
+
+
+def generate_queries(path: str, count: int, k: int, dim: int, seed: int) -> list[dict]:
+    """
+    Queries with their source chunk and exact top-k ground truth.
+    """
+    rng = np.random.default_rng(seed + 1)
+    words = np.load(os.path.join(path, "words.npy"), mmap_mode="r")
+    embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    tenants = np.load(os.path.join(path, "tenants.npy"))
+    embedder = FakeEmbedder(len(vocabulary()), dim, seed)
+
+    queries = []
+    tenant_list = np.unique(tenants)
+    for _ in range(count):
+        tenant = int(rng.choice(tenant_list))
+        rows = np.flatnonzero(tenants == tenant)
+        source = int(rng.choice(rows))
+        query_ids = rng.choice(words[source], size=QUERY_WORDS, replace=False)
+        vector = embedder.embed_ids(query_ids[None, :])[0]
+        scores = np.asarray(embeddings[rows]) @ vector
+        top = rows[np.argsort(-scores)[:k]]
+        queries.append({
+            "tenant": tenant,
+            "source": chunk_id(source),
+            "word_ids": query_ids.tolist(),
+            "vector": vector.tolist(),
+            "exact": [chunk_id(row) for row in top],
+        })
+    return queries
+
+
+def chunk_id(row: int) -> str:
+    # document_id = row // 50, as if every document had 50 chunks
+    return f"{row // 50}_{row % 50}"
+
+
+def chunk_text(word_ids, words: list[str]) -> str:
+    return " ".join(words[i] for i in word_ids)
+
+
+# -------------------------
+# One backend, one process
+# -------------------------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        # Peak, not current, where /proc is not available (macOS: bytes)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2**20
+
+
+def make_store(backend: str, path: str):
+    from rag.services.vector_store import ChromaVectorStore
+
+    if backend == "chroma":
+        return ChromaVectorStore(os.path.join(path, "chroma")).open()
+    if backend.startswith("quantized-"):
+        from rag.services.quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore(os.path.join(path, "quantized"), backend.split("-", 1)[1])
+    if backend == "exact":
+        from rag.services.exact_store import ExactVectorStore
+        return ExactVectorStore(os.path.join(path, "exact"), ann=ChromaVectorStore(os.path.join(path, "chroma"))).open()
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def percentiles(latencies: list[float]) -> dict:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def install_offline_services(store, lexical_path: str, embedder: FakeEmbedder, words: list[str]):
+    """
+    Points the application's retrieval code at the benchmark: `store` as
+    the shared vector store, lexical indexes under `lexical_path`, the fake
+    embedder for query embeddings and an instant LLM. Only ever called in
+    the benchmark's own process (or a test that restores the modules).
+    """
+    from agents.retrieval.nodes import generate_answer
+    from rag.services import hybrid_search, lexical_index, vector_store
+
+    word_ids = {word: i for i, word in enumerate(words)}
+
+    def embed_text(texts: list[str], model: str = None):
+        return [embedder.embed_ids(np.array([[word_ids[w] for w in text.split()]]))[0].tolist() for text in texts]
+
+    async def aembed_text(texts: list[str], model: str = None):
+        return embed_text(texts, model)
+
+    vector_store.vector_store = store
+    lexical_index.LEXICAL_INDEX_DIR = lexical_path
+    lexical_index._indexes.clear()
+    hybrid_search.embed_text = embed_text
+    hybrid_search.aembed_text = aembed_text
+    generate_answer.llm = SimpleNamespace(invoke=lambda prompt, **kwargs: SimpleNamespace(content="ok"))
+
+
+def run_backend(corpus_path: str, backend: str, modes: list[str], queries: list[dict], k: int, dim: int = 256,
+                seed: int = 0) -> list[dict]:
+    """
+    Ingests the corpus into a fresh `backend` and runs every query in
+    every mode. Returns one result row per mode.
+    """
+    from rag.services import hybrid_search
+    from rag.services.lexical_index import get_lexical_index
+
+    words = vocabulary()
+    rss_start = rss_mb()
+    with tempfile.TemporaryDirectory(prefix=f"bench-{backend}-") as path:
+        store = make_store(backend, path)
+        install_offline_services(store, os.path.join(path, "lexical"), FakeEmbedder(len(words), dim, seed), words)
+        use_lexical = any(mode != "vector" for mode in modes)
+
+        word_ids = np.load(os.path.join(corpus_path, "words.npy"), mmap_mode="r")
+        embeddings = np.load(os.path.join(corpus_path, "embeddings.npy"), mmap_mode="r")
+        tenants = np.load(os.path.join(corpus_path, "tenants.npy"))
+
+        vector_seconds = lexical_seconds = 0.0
+        for tenant in np.unique(tenants):
+            rows = np.flatnonzero(tenants == tenant)
+            for start in range(0, len(rows), BATCH_SIZE):
+                part = rows[start:start + BATCH_SIZE].tolist()
+                ids = [chunk_id(row) for row in part]
+                texts = [chunk_text(word_ids[row], words) for row in part]
+                metadatas = [
+                    {"document_id": row // 50, "chunk_index": row % 50, "client_profile_id": int(tenant)} for row in part
+                ]
+                vectors = np.asarray(embeddings[part]).tolist()
+
+                started = time.perf_counter()
+                store.add_chunks(None, int(tenant), ids, vectors, texts, metadatas)
+                vector_seconds += time.perf_counter() - started
+
+                if use_lexical:
+                    started = time.perf_counter()
+                    for document_id in sorted({m["document_id"] for m in metadatas}):
+                        doc = [i for i, m in enumerate(metadatas) if m["document_id"] == document_id]
+                        get_lexical_index(int(tenant)).add_chunks(
+                            [ids[i] for i in doc], document_id, [texts[i] for i in doc]
+                        )
+                    lexical_seconds += time.perf_counter() - started
+        del word_ids, embeddings
+
+        results = []
+        for mode in modes:
+            hybrid_search.LEXICAL_INDEX_ENABLED = mode != "vector"
+            # Warm-up: first-query costs (segment loads, HNSW loads, graph
+            # compilation) are not what the percentiles are about
+            for query in queries[:5]:
+                search(mode, query, k, words)
+
+            latencies, recall, hits_at_k = [], [], []
+            for query in queries:
+                started = time.perf_counter()
+                returned = search(mode, query, k, words)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+                recall.append(len(set(returned) & set(query["exact"])) / k)
+                hits_at_k.append(query["source"] in returned)
+
+            total = len(tenants)
+            results.append({
+                "backend": backend,
+                "mode": mode,
+                "chunks": total,
+                "ingest_chunks_per_s": round(total / vector_seconds, 1) if vector_seconds else None,
+                "lexical_ingest_chunks_per_s": round(total / lexical_seconds, 1) if lexical_seconds else None,
+                **percentiles(latencies),
+                f"recall@{k}": round(float(np.mean(recall)), 4) if mode in ("vector", "hybrid") else None,
+                f"hit@{k}": round(float(np.mean(hits_at_k)), 4),
+                "rss_growth_mb": round(rss_mb() - rss_start, 1),
+                "disk_mb": round(disk_mb(path), 1),
+                "store_stats": store.stats(),
+            })
+        store.close()
+    return results
+
+
+def search(mode: str, query: dict, k: int, words: list[str]) -> list[str]:
+    """
+    Runs one query through the application code for `mode`; returns the
+    chunk ids it came back with.
+    """
+    from agents.registry import graph_registry
+    from rag.services.hybrid_search import hybrid_search
+    from rag.services.lexical_index import get_lexical_index
+
+    tenant = query["tenant"]
+    text = chunk_text(query["word_ids"], words)
+    if mode in ("vector", "hybrid"):
+        hits, _ = hybrid_search(None, text, tenant, limit=k)
+        return [hit["chunk_id"] for hit in hits]
+    if mode == "lexical":
+        return [hit["chunk_id"] for hit in get_lexical_index(tenant).search(text, k)]
+    if mode == "graph":
+        state = graph_registry.invoke("retrieval", {"query": text, "client_profile_id": tenant, "embedding_model": None})
+        return [chunk for passage in state["retrieved_docs"] for chunk in passage["merged_chunk_ids"]]
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+# -------------------------
+# Driver
+# -------------------------
+def run_benchmark(sizes: list[int], backends: list[str], modes: list[str], tenants: int = 20, queries: int = 200,
+                  k: int = 10, dim: int = 256, seed: int = 0, isolate: bool = True) -> dict:
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="bench-corpus-") as corpus_path:
+            started = time.perf_counter()
+            corpus = generate_corpus(corpus_path, size, min(tenants, size), dim, seed)
+            query_set = generate_queries(corpus_path, queries, k, dim, seed)
+            print(f"{size} chunks over {len(corpus['sizes'])} tenants generated in {time.perf_counter() - started:.1f}s")
+
+            for backend in backends:
+                if isolate:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                        rows = pool.submit(run_backend, corpus_path, backend, modes, query_set, k, dim, seed).result()
+                else:
+                    rows = run_backend(corpus_path, backend, modes, query_set, k, dim, seed)
+                for row in rows:
+                    row["size"] = size
+                    print(format_row(row, k))
+                results.extend(rows)
+
+    return {
+        "benchmark": "retrieval",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": {"sizes": sizes, "backends": backends, "modes": modes, "tenants": tenants, "queries": queries,
+                   "k": k, "dim": dim, "seed": seed, "sharding": os.getenv("VECTOR_SHARDING", "global")},
+        "results": results,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def format_row(row: dict, k: int) -> str:
+    recall = row[f"recall@{k}"]
+    return (
+        f"  {row['size']:>8} {row['backend']:>17} {row['mode']:>8}  ingest {row['ingest_chunks_per_s'] or 0:>9.0f}/s  "
+        f"p50 {row['p50_ms']:>7.2f}  p95 {row['p95_ms']:>7.2f}  p99 {row['p99_ms']:>7.2f} ms  "
+        f"recall {'-' if recall is None else f'{recall:.3f}':>5}  hit {row[f'hit@{k}']:.3f}  "
+        f"rss +{row['rss_growth_mb']:.0f} MB  disk {row['disk_mb']:.0f} MB"
+    )
+
+
+def compare(current: dict, previous: dict):
+    """
+    Prints the change per (size, backend, mode) against an earlier run.
+    """
+    k = current["params"]["k"]
+    key = lambda row: (row["size"], row["backend"], row["mode"])
+    before = {key(row): row for row in previous["results"]}
+    print(f"\nAgainst {previous.get('git_commit') or '?'} ({previous['created_at']}):")
+    for row in current["results"]:
+        old = before.get(key(row))
+        if old is None:
+            continue
+        changes = []
+        for field in ("ingest_chunks_per_s", "p50_ms", "p95_ms", "p99_ms", f"recall@{k}", f"hit@{k}", "rss_growth_mb"):
+            if row.get(field) is None or not old.get(field):
+                continue
+            changes.append(f"{field} {(row[field] - old[field]) / old[field]:+.1%}")
+        print(f"  {row['size']:>8} {row['backend']:>17} {row['mode']:>8}  " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval backends and modes on synthetic corpora")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS)
+    parser.add_argument("--modes", default="vector,lexical,hybrid,graph")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results file (default benchmarks/results/retrieval-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        backends=args.backends.split(","),
+        modes=args.modes.split(","),
+        tenants=args.tenants,
+        queries=args.queries,
+        k=args.k,
+        dim=args.dim,
+        seed=args.seed,
+    )
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"retrieval-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
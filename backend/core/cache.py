@@ -0,0 +1,217 @@
+# core/cache.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class TieredCache:
+    """
+    Small key/value cache: an in-process LRU in front of a SQLite table.
+
+    The SQLite file runs in WAL mode, so every uvicorn worker on the host can
+    read and write the same file concurrently. Keys are strings, values bytes.
+
+    The disk tier is bounded: every `maintain_every` writes, the writing
+    process deletes expired rows and, above `max_disk_items`, the oldest
+    ones (see maintain()).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        max_memory_items: int = 10_000,
+        ttl_seconds: Optional[float] = None,
+        max_disk_items: Optional[int] = None,
+        maintain_every: int = 1000,
+    ):
+        self.path = path
+        self.table = table
+        self.max_memory_items = max_memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_items = max_disk_items
+        self.maintain_every = maintain_every
+        self._writes = 0
+
+        self._memory: "OrderedDict[str, tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        # Expiry and trimming go oldest-first
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_created_at ON {table} (created_at)")
+
+    # -------------------------
+    # SQLite (one connection per thread)
+    # -------------------------
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: bytes, created_at: float):
+        # Caller holds self._lock
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, bytes]:
+        now = time.time()
+        found: dict[str, bytes] = {}
+        missing: list[str] = []
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._memory.get(key)
+                if entry and not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+        if missing:
+            conn = self._connection()
+            # SQLite caps bound parameters, so look keys up in slices
+            for i in range(0, len(missing), 500):
+                part = missing[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+                with self._lock:
+                    for key, value, created_at in rows:
+                        if self._expired(created_at, now):
+                            continue
+                        found[key] = value
+                        self.disk_hits += 1
+                        self._remember(key, value, created_at)
+
+        with self._lock:
+            self.misses += sum(1 for key in missing if key not in found)
+
+        return found
+
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value, now)
+            before = self._writes
+            self._writes += len(items)
+            due = self._writes // self.maintain_every > before // self.maintain_every
+
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()],
+            )
+        if due:
+            self.maintain()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str, keep: str = None) -> int:
+        """
+        Deletes every key starting with `prefix`, except those starting
+        with `keep`. Returns the number of rows deleted on disk.
+        """
+        def doomed(key: str) -> bool:
+            return key.startswith(prefix) and not (keep and key.startswith(keep))
+
+        with self._lock:
+            for key in [key for key in self._memory if doomed(key)]:
+                del self._memory[key]
+
+        sql = f"DELETE FROM {self.table} WHERE substr(key, 1, ?) = ?"
+        params = [len(prefix), prefix]
+        if keep:
+            sql += " AND substr(key, 1, ?) != ?"
+            params += [len(keep), keep]
+        return self._connection().execute(sql, params).rowcount
+
+    def purge_expired(self) -> int:
+        if self.ttl_seconds is None:
+            return 0
+        cur = self._connection().execute(
+            f"DELETE FROM {self.table} WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        return cur.rowcount
+
+    def trim(self) -> int:
+        """
+        Deletes the oldest rows above `max_disk_items`.
+        """
+        if self.max_disk_items is None:
+            return 0
+        cur = self._connection().execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f" SELECT key FROM {self.table} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_items,),
+        )
+        return cur.rowcount
+
+    def maintain(self) -> int:
+        """
+        Bounds the disk tier: expired rows, then the oldest rows over the
+        cap. Runs every `maintain_every` writes; safe to call from any
+        process at any time. Returns the number of rows deleted.
+        """
+        deleted = self.purge_expired() + self.trim()
+        with self._lock:
+            self.evicted += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
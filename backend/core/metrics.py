@@ -0,0 +1,82 @@
+# core/metrics.py
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Process-local counters and latency summaries.
+
+    Latencies keep the most recent `window` samples per name for
+    percentiles, plus all-time count and total. Served at GET /metrics.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: dict[str, int] = defaultdict(int)
+        self._samples: dict[str, deque] = {}
+        self._totals: dict[str, list] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            self._totals[name][0] += 1
+            self._totals[name][1] += seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @staticmethod
+    def _percentile(ordered: list, pct: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def latency(self, name: str) -> dict:
+        with self._lock:
+            ordered = sorted(self._samples.get(name, ()))
+            count, total = self._totals.get(name, (0, 0.0))
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": count,
+            "avg_ms": round(total / count * 1000, 3),
+            "p50_ms": round(self._percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(self._percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(self._percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+        return {
+            "counters": counters,
+            "latency": {name: self.latency(name) for name in names},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+
+# single shared instance
+metrics = Metrics()
@@ -4,6 +4,8 @@ from auth.dependencies import get_current_user, get_db
 from user.models import User as UserModel
 from user.models import ClientProfile
 from user.schemas import ClientProfileResponse, ClientProfileUpdate
+from rag.services.job_queue import requeue_documents
+from rag.services.vector_store import check_embedding_model
 from datetime import datetime
 
 router = APIRouter(tags=["Client Profile"])
@@ -36,6 +38,12 @@ def update_client_profile(
 
     # Update only provided fields
     update_dict = update_data.model_dump(exclude_unset=True)
+    model_changed = "embedding_model" in update_dict and update_dict["embedding_model"] != profile.embedding_model
+    if model_changed:
+        try:
+            check_embedding_model(update_dict["embedding_model"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     for key, value in update_dict.items():
         if key == "website_url" and value is not None:
             setattr(profile, key, str(value))  # Convert HttpUrl  to -> str
@@ -47,4 +55,9 @@ def update_client_profile(
 
     db.commit()
     db.refresh(profile)
+
+    if model_changed:
+        # Vectors from the old model can't answer queries embedded with the
+        # new one: re-embed the whole knowledge base
+        requeue_documents(db, profile.id)
     return profile
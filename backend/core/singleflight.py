@@ -0,0 +1,105 @@
+# core/singleflight.py
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from core.metrics import metrics
+
+
+class FlightAborted(Exception):
+    """
+    The request leading a flight went away before it had a result;
+    whoever was waiting on it should do the work themselves.
+    """
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async work within one process (one
+    event loop): the first caller for a key runs it, callers arriving
+    while it is in flight wait for the same result (or exception).
+
+    `do()` runs a coroutine as a shared task. It is cancelled only once
+    every caller waiting on it has been cancelled, so one client hanging
+    up does not fail the others. `lead()` is for callers that produce the
+    result themselves (e.g. while streaming it) and publish it at the end.
+
+    Counters: `<name>.leader` and `<name>.coalesced`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _register(self, key: Hashable, flight: asyncio.Future):
+        self._flights[key] = flight
+        metrics.incr(f"{self.name}.leader")
+
+        def forget(_):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight.add_done_callback(forget)
+
+    def join(self, key: Hashable) -> Optional[asyncio.Future]:
+        """
+        The flight in progress for `key`, counted as coalesced, or None.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            metrics.incr(f"{self.name}.coalesced")
+        return flight
+
+    async def wait(self, flight: asyncio.Future) -> Any:
+        self._waiters[flight] = self._waiters.get(flight, 0) + 1
+        try:
+            return await asyncio.shield(flight)
+        finally:
+            self._waiters[flight] -= 1
+            if not self._waiters[flight]:
+                del self._waiters[flight]
+                # Last waiter gone: nobody wants a shared task's result
+                if isinstance(flight, asyncio.Task) and not flight.done():
+                    flight.cancel()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Returns (result, whether it came from another caller's flight).
+        """
+        flight = self.join(key)
+        while flight is not None:
+            try:
+                return await self.wait(flight), True
+            except FlightAborted:
+                # The leader gave up; the next caller in takes over
+                flight = self.join(key)
+
+        flight = asyncio.ensure_future(fn())
+        self._register(key, flight)
+        return await self.wait(flight), False
+
+    @contextmanager
+    def lead(self, key: Hashable):
+        """
+        Registers the caller as the flight for `key` and yields a Future
+        to resolve with `set_result()` (or `set_exception()`). Left
+        unresolved, it fails with FlightAborted on exit.
+        """
+        flight = asyncio.get_running_loop().create_future()
+        self._register(key, flight)
+        try:
+            yield flight
+        except BaseException as e:
+            if not flight.done():
+                flight.set_exception(e if isinstance(e, Exception) else FlightAborted())
+            raise
+        finally:
+            if not flight.done():
+                flight.set_exception(FlightAborted())
+            # Retrieved here, so a flight nobody joined does not log
+            # "exception was never retrieved"
+            flight.exception()
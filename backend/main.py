@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware   
@@ -10,8 +11,29 @@ from tms.routes import router as ticket_router
 from agents.routes.ai_test import router as ai_test_router
 from rag.routes import router as rag_router
 from fastapi.staticfiles import  StaticFiles
+from core.metrics import metrics
+from rag.services.vector_store import vector_store
+from rag.services.embedding_cache import embedding_cache
+from rag.services.answer_cache import answer_cache
+from agents.registry import graph_registry
+from agents.llm import llm_stats
+from agents.usage import usage_accountant
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-lived handles: opened once per worker process, not per request
+    vector_store.open()
+    graph_registry.compile_all()
+    if usage_accountant:
+        usage_accountant.start()
+    yield
+    if usage_accountant:
+        usage_accountant.stop()
+    vector_store.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 #  Add SessionMiddleware BEFORE routers
 app.add_middleware(
@@ -48,3 +70,14 @@ def read_root():
 @app.get("/healthz")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "graphs": graph_registry.stats(),
+        "vector_store": vector_store.stats(),
+        "llm": llm_stats(),
+    }
@@ -0,0 +1,119 @@
+"""
+Splits the global `document_embeddings` collections into shards.
+
+    VECTOR_SHARDING=tenant python -m rag.migrate_shards [--dry-run] [--delete-source]
+
+Every global collection in the database is split: the default model's
+`document_embeddings` and one `document_embeddings_<model>` per local
+embedding model. Chunks are copied (ids, vectors, text and metadata
+unchanged) into the collection that `collection_for_tenant` routes their
+client_profile_id to, under the sharding mode from VECTOR_SHARDING. A
+source is only cleared with --delete-source, after every shard count has
+been verified. Safe to re-run: copies are upserts.
+"""
+import argparse
+from collections import defaultdict
+
+from rag.services import vector_store as vector_store_module
+from rag.services.embedder import EMBEDDING_MODEL, LOCAL_EMBEDDING_MODELS
+from rag.services.vector_store import collection_for_tenant, chroma_store as vector_store
+
+
+def global_collections() -> dict[str, str]:
+    """
+    {collection name: embedding model} for the global collections that
+    exist in the database.
+    """
+    existing = set(vector_store.list_collections())
+    candidates = {
+        collection_for_tenant(sharding="global", embedding_model=model): model
+        for model in [EMBEDDING_MODEL, *sorted(LOCAL_EMBEDDING_MODELS)]
+    }
+    return {name: model for name, model in candidates.items() if name in existing}
+
+
+def split_global_collection(batch_size: int = 500, dry_run: bool = False, delete_source: bool = False) -> dict:
+    if vector_store_module.VECTOR_SHARDING == "global":
+        raise SystemExit("Set VECTOR_SHARDING=tenant or VECTOR_SHARDING=bucket first")
+
+    copied, skipped = 0, 0
+    per_shard = defaultdict(int)
+    for name, model in global_collections().items():
+        result = _split_collection(name, model, batch_size, dry_run, delete_source)
+        copied += result["copied"]
+        skipped += result["skipped"]
+        for shard, count in result["shards"].items():
+            per_shard[shard] += count
+    return {"copied": copied, "skipped": skipped, "shards": dict(per_shard)}
+
+
+def _split_collection(source_name: str, embedding_model: str, batch_size: int, dry_run: bool,
+                      delete_source: bool) -> dict:
+    source = vector_store.collection(source_name, create=False)
+    copied, skipped = 0, 0
+    per_shard = defaultdict(int)
+    offset = 0
+
+    while True:
+        page = source.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset,
+        )
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+
+        grouped = defaultdict(lambda: {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+        for i, chunk_id in enumerate(page["ids"]):
+            meta = page["metadatas"][i] or {}
+            if meta.get("client_profile_id") is None:
+                skipped += 1
+                continue
+            target = grouped[collection_for_tenant(meta["client_profile_id"], embedding_model=embedding_model)]
+            target["ids"].append(chunk_id)
+            target["embeddings"].append(page["embeddings"][i])
+            target["documents"].append(page["documents"][i])
+            target["metadatas"].append(meta)
+
+        for name, batch in grouped.items():
+            per_shard[name] += len(batch["ids"])
+            copied += len(batch["ids"])
+            if not dry_run:
+                vector_store.upsert(collection=name, **batch)
+
+        print(f"{source_name}: processed {offset} chunks ({copied} copied, {skipped} without tenant)")
+
+    if not dry_run:
+        for name in per_shard:
+            count = vector_store.collection(name).count()
+            if count < per_shard[name]:
+                raise SystemExit(f"Shard {name} has {count} chunks, expected at least {per_shard[name]}; source kept")
+
+        if delete_source and not skipped:
+            vector_store.drop_collection(source_name)
+            print(f"Deleted source collection {source_name}")
+        elif delete_source:
+            print(f"Kept {source_name}: {skipped} chunks have no client_profile_id")
+
+    return {"copied": copied, "skipped": skipped, "shards": dict(per_shard)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the global vector collection into per-tenant shards")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--delete-source", action="store_true")
+    args = parser.parse_args()
+
+    vector_store.open()
+    try:
+        result = split_global_collection(args.batch_size, args.dry_run, args.delete_source)
+    finally:
+        vector_store.close()
+
+    print(f"Copied {result['copied']} chunks into {len(result['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,288 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, Depends, HTTPException
+import asyncio
+import json
+import math
+import time
+from typing import AsyncIterator, Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from auth.dependencies import get_db, get_current_user
-from user.models import User, KnowledgeDocument
-from rag.services.document_pipeline import process_document_pipeline
-import shutil
+from user.models import User, ClientProfile
+from core.metrics import metrics
+from core.singleflight import FlightAborted, SingleFlight
+from rag.services.answer_cache import answer_cache, kb_version, normalize_query
+from rag.services.embedder import aembed_text
+from rag.services.upload_stream import UploadError, register_upload, remove_upload, stream_upload, upload_limit_for_plan
 import os
-import uuid
 
 router = APIRouter(tags=["rag"])
 
 UPLOAD_DIR = "storage/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/upload")
-def upload_knowledge_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+# Request body is parsed by stream_upload, so describe it for the docs by hand
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+def get_client_profile(current_user: User = Depends(get_current_user)) -> ClientProfile:
+    """
+    The caller's profile. A sync dependency, so FastAPI resolves it in the
+    threadpool and the lazy relationship load never blocks the event loop
+    of the async routes below.
+    """
     if not current_user.client_profile:
         raise HTTPException(status_code=400, detail="User has no profile")
+    return current_user.client_profile
 
-    # Generate unique filename
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_name = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_name)
 
-    # Save file
+@router.post("/upload", openapi_extra=UPLOAD_OPENAPI)
+async def upload_knowledge_file(
+    request: Request,
+    db: Session = Depends(get_db),
+    profile: ClientProfile = Depends(get_client_profile)
+):
+    # Stream to disk, hashing and size-checking as we go
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        file_size = os.path.getsize(file_path)
-
-        # Create DB entry
-        kb_doc = KnowledgeDocument(
-            client_profile_id=current_user.client_profile.id,
-            file_name=file.filename,
-            file_type=file.content_type,
-            file_size=file_size,
-        )
-        db.add(kb_doc)
-        db.commit()
-        db.refresh(kb_doc)
-
-        # Trigger background task
-        background_tasks.add_task(process_document_pipeline, kb_doc.id, file_path)
-
-        return {"message": "File uploaded successfully", "document_id": kb_doc.id}
+        upload = await stream_upload(request, UPLOAD_DIR, upload_limit_for_plan(profile.subscription_plan))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
+    try:
+        # DB work is sync; keep it off the event loop
+        return await run_in_threadpool(register_upload, db, profile.id, upload)
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        await run_in_threadpool(remove_upload, upload.file_path)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-from agents.retrieval.graph import build_retrieval_agent
+from agents.llm import LLMUnavailableError
+from agents.usage import TokenBudgetExceeded
+from agents.registry import graph_registry
+
+# Deadline handed to the retrieval graph; optional stages (re-ranking) are
+# skipped when they would not leave enough of it for the answer
+RAG_QUERY_TIMEOUT_SECONDS = float(os.getenv("RAG_QUERY_TIMEOUT_SECONDS", "30"))
+
+# Identical questions in flight at the same time share one graph run
+answer_flights = SingleFlight("rag.coalesce")
+
+
+def flight_key(profile: ClientProfile, query: str) -> tuple:
+    return profile.id, kb_version(profile.last_kb_update), normalize_query(query)
+
+
+async def lookup_cached_answer(profile: ClientProfile, query: str) -> tuple[Optional[dict], str, Optional[list[float]]]:
+    """
+    Returns (cached response or None, "exact" | "semantic" | "miss", the
+    query embedding if the semantic lookup had to compute it).
+    """
+    if not answer_cache:
+        return None, "miss", None
+
+    version = kb_version(profile.last_kb_update)
+    query_embedding = None
+
+    cached = await anyio.to_thread.run_sync(answer_cache.get, profile.id, version, query)
+    cache_type = "exact"
+    if cached is None and answer_cache.semantic_enabled:
+        # Served from the embedding cache when the retriever needs it again
+        query_embedding = (await aembed_text([query], model=profile.embedding_model))[0]
+        cached = await anyio.to_thread.run_sync(answer_cache.get_similar, profile.id, version, query_embedding)
+        cache_type = "semantic"
+    if cached is not None:
+        metrics.incr(f"answer_cache.hit.{cache_type}")
+        return cached, cache_type, query_embedding
+
+    metrics.incr("answer_cache.miss")
+    return None, "miss", query_embedding
+
+
+async def store_answer(profile: ClientProfile, query: str, response: dict, query_embedding: list[float] = None):
+    if answer_cache:
+        version = kb_version(profile.last_kb_update)
+        await anyio.to_thread.run_sync(answer_cache.set, profile.id, version, query, response, query_embedding)
+
+
+def retrieval_state(profile: ClientProfile, query: str) -> dict:
+    return {
+        "query": query,
+        "client_profile_id": profile.id,
+        "embedding_model": profile.embedding_model,
+    }
+
+
+async def answer_query(db: Session, profile: ClientProfile, query: str) -> dict:
+    """
+    Runs the retrieval agent, going through the tenant's answer cache.
+    Concurrent identical questions share one run (see answer_flights).
+    `cache` in the response is "exact", "semantic", "coalesced" or "miss".
+
+    Async end to end: embedding and LLM calls are awaited, blocking
+    vector/BM25/SQLite lookups run in worker threads, so a waiting
+    question holds no thread.
+    """
+    cached, cache_type, query_embedding = await lookup_cached_answer(profile, query)
+    if cached is not None:
+        return {**cached, "cache": cache_type}
+
+    async def run() -> dict:
+        # A follower may outlive the leader's request; a closed Session
+        # simply reconnects on next use
+        result = await graph_registry.ainvoke("retrieval", retrieval_state(profile, query), db=db, timeout=RAG_QUERY_TIMEOUT_SECONDS)
+        response = {
+            "answer": result["answer"],
+            "retrieved_docs": result.get("retrieved_docs", [])
+        }
+        await store_answer(profile, query, response, query_embedding)
+        return response
+
+    try:
+        response, shared = await answer_flights.do(flight_key(profile, query), run)
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {**response, "cache": "coalesced" if shared else "miss"}
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always closes its body generator. When the
+    client disconnects Starlette just stops iterating, which would leave
+    the generator (and the LLM stream under it) running until it is
+    garbage collected.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_answer_events(db: Session, profile: ClientProfile, query: str) -> AsyncIterator[str]:
+    """
+    SSE frames for one question: `sources` (retrieved chunks) first, then
+    `token` events as the LLM produces them, then `done` with the full
+    answer. When the client goes away the generator is closed (see
+    ClosingStreamingResponse); that cancels the graph run, which closes
+    the LLM stream upstream.
+    """
+    cached, cache_type, query_embedding = await lookup_cached_answer(profile, query)
+    if cached is not None:
+        yield sse_event("sources", {"retrieved_docs": cached["retrieved_docs"]})
+        yield sse_event("token", {"text": cached["answer"]})
+        yield sse_event("done", {"answer": cached["answer"], "cache": cache_type})
+        return
+
+    key = flight_key(profile, query)
+    flight = answer_flights.join(key)
+    if flight is not None:
+        # Someone is already answering this: wait and replay, like a cache hit
+        try:
+            shared = await answer_flights.wait(flight)
+        except FlightAborted:
+            pass
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        else:
+            yield sse_event("sources", {"retrieved_docs": shared["retrieved_docs"]})
+            yield sse_event("token", {"text": shared["answer"]})
+            yield sse_event("done", {"answer": shared["answer"], "cache": "coalesced"})
+            return
+
+    with answer_flights.lead(key) as flight:
+        async for event in stream_graph_events(db, profile, query, query_embedding, flight):
+            yield event
+
+
+async def stream_graph_events(db: Session, profile: ClientProfile, query: str, query_embedding: Optional[list[float]],
+                              flight: "asyncio.Future") -> AsyncIterator[str]:
+    """
+    The uncached part of stream_answer_events. The answer is published
+    to `flight` for identical questions that arrived meanwhile.
+    """
+    start = time.perf_counter()
+    first_token = True
+    docs, answer, retrieval_mode = [], "", None
+    events = graph_registry.astream(
+        "retrieval", retrieval_state(profile, query), db=db, timeout=RAG_QUERY_TIMEOUT_SECONDS, stream_tokens=True
+    )
+    try:
+        async for mode, chunk in events:
+            if mode == "custom":
+                if first_token:
+                    metrics.observe("rag.stream.first_token", time.perf_counter() - start)
+                    first_token = False
+                yield sse_event("token", {"text": chunk["token"]})
+            elif "retrieve" in chunk:
+                retrieval_mode = chunk["retrieve"].get("retrieval_mode")
+            elif "build_context" in chunk:
+                # Sources = exactly the passages the LLM is about to see
+                docs = chunk["build_context"].get("retrieved_docs", [])
+                yield sse_event("sources", {"retrieved_docs": docs, "retrieval_mode": retrieval_mode})
+            elif "generate" in chunk:
+                answer = chunk["generate"]["answer"]
+    except (asyncio.CancelledError, GeneratorExit):
+        metrics.incr("rag.stream.cancelled")
+        raise
+    except Exception as e:
+        flight.set_exception(e)
+        yield sse_event("error", {"detail": str(e)})
+        return
+    finally:
+        with anyio.CancelScope(shield=True):
+            await events.aclose()
+
+    response = {"answer": answer, "retrieved_docs": docs}
+    flight.set_result(response)
+    await store_answer(profile, query, response, query_embedding)
+    yield sse_event("done", {"answer": answer, "cache": "miss"})
+
 
 @router.post("/query")
-def query_knowledge_base(
+async def query_knowledge_base(
     payload: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    profile: ClientProfile = Depends(get_client_profile)
 ):
-    if not current_user.client_profile:
-        raise HTTPException(status_code=400, detail="User has no profile")
-        
-    client_profile_id = current_user.client_profile.id
-
-    agent = build_retrieval_agent(db)
-    result = agent.invoke({
-        "query": payload["query"],
-        "client_profile_id": client_profile_id
-    })
-    
-    return {
-        "answer": result["answer"],
-        "retrieved_docs": result.get("retrieved_docs", [])
-    }
+    return await answer_query(db, profile, payload["query"])
+
+
+@router.post("/query/stream")
+async def stream_knowledge_base_query(
+    payload: dict,
+    db: Session = Depends(get_db),
+    profile: ClientProfile = Depends(get_client_profile)
+):
+    """
+    Same as /query, as server-sent events (see stream_answer_events).
+    """
+    return ClosingStreamingResponse(
+        stream_answer_events(db, profile, payload["query"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
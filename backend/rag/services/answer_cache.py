@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from core.cache import TieredCache
+from core.metrics import metrics
+from .embedding_cache import CACHE_DIR
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join(CACHE_DIR, "answers.sqlite3"))
+ANSWER_CACHE_MEMORY_ITEMS = int(os.getenv("ANSWER_CACHE_MEMORY_ITEMS", "5000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Rows kept in the SQLite tier; the oldest go first
+ANSWER_CACHE_MAX_ROWS = int(os.getenv("ANSWER_CACHE_MAX_ROWS", "200000"))
+# Cosine similarity for the semantic lookup; 0 disables it
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+# Query embeddings kept per tenant for the semantic lookup (in-process only)
+ANSWER_CACHE_SEMANTIC_ITEMS = int(os.getenv("ANSWER_CACHE_SEMANTIC_ITEMS", "500"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_query(query: str) -> str:
+    """
+    "What's your refund policy?" and "what's your  refund policy" are the
+    same question: NFKC, case-folded, whitespace collapsed, trailing
+    punctuation dropped.
+    """
+    text = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().casefold()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def kb_version(last_kb_update: Optional[datetime]) -> str:
+    """
+    Tenant knowledge-base version. ClientProfile.last_kb_update is bumped by
+    the ingestion pipeline, so answers cached against an older knowledge
+    base become unreachable without any explicit purge.
+    """
+    return last_kb_update.isoformat() if last_kb_update else "0"
+
+
+class AnswerCache:
+    """
+    Per-tenant cache of /api/rag/query responses.
+
+    Exact tier: TieredCache keyed by (tenant, KB version, normalized query),
+    shared by every worker on the host, with LRU + TTL eviction and a row
+    cap on disk. When a tenant's KB version moves forward, its answers for
+    older versions are deleted right away.
+    Semantic tier (optional): per-tenant query embeddings in memory; a new
+    query whose embedding is within `similarity` of a cached one reuses its
+    answer.
+    """
+
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        max_memory_items: int = ANSWER_CACHE_MEMORY_ITEMS,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        semantic_items: int = ANSWER_CACHE_SEMANTIC_ITEMS,
+        max_rows: int = ANSWER_CACHE_MAX_ROWS,
+    ):
+        self.store = TieredCache(path, "answers", max_memory_items=max_memory_items, ttl_seconds=ttl_seconds,
+                                 max_disk_items=max_rows)
+        self.similarity = similarity
+        self.semantic_items = semantic_items
+        # client_profile_id -> (kb version, OrderedDict{cache key: unit vector})
+        self._semantic: dict[int, tuple[str, "OrderedDict[str, np.ndarray]"]] = {}
+        # client_profile_id -> newest KB version this process has written
+        self._versions: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity > 0
+
+    @staticmethod
+    def key(client_profile_id: int, version: str, query: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"{client_profile_id}:{version}:{digest}"
+
+    def _load(self, key: str) -> Optional[dict]:
+        value = self.store.get(key)
+        return json.loads(value) if value is not None else None
+
+    def get(self, client_profile_id: int, version: str, query: str) -> Optional[dict]:
+        with metrics.timer("answer_cache.lookup"):
+            return self._load(self.key(client_profile_id, version, query))
+
+    def get_similar(self, client_profile_id: int, version: str, query_embedding: list[float]) -> Optional[dict]:
+        if not self.semantic_enabled:
+            return None
+
+        with metrics.timer("answer_cache.semantic_lookup"):
+            with self._lock:
+                entry = self._semantic.get(client_profile_id)
+                if not entry or entry[0] != version or not entry[1]:
+                    return None
+                keys = list(entry[1].keys())
+                matrix = np.stack(list(entry[1].values()))
+
+            scores = matrix @ _unit(query_embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                return None
+            return self._load(keys[best])
+
+    def set(self, client_profile_id: int, version: str, query: str, response: dict,
+            query_embedding: list[float] = None):
+        key = self.key(client_profile_id, version, query)
+        self.store.set(key, json.dumps(response).encode("utf-8"))
+        self._drop_old_versions(client_profile_id, version)
+
+        if self.semantic_enabled and query_embedding is not None:
+            with self._lock:
+                entry = self._semantic.get(client_profile_id)
+                if not entry or entry[0] != version:
+                    # The knowledge base changed: drop the tenant's old entries
+                    entry = self._semantic[client_profile_id] = (version, OrderedDict())
+                vectors = entry[1]
+                vectors[key] = _unit(query_embedding)
+                vectors.move_to_end(key)
+                while len(vectors) > self.semantic_items:
+                    vectors.popitem(last=False)
+
+    def _drop_old_versions(self, client_profile_id: int, version: str):
+        """
+        Deletes the tenant's rows for other KB versions once a newer one is
+        written. Versions are ISO timestamps, so they order as strings; a
+        slow request still answering from an older version never deletes
+        newer rows. The first version a process sees is only remembered,
+        since its request may have read a stale profile.
+        """
+        with self._lock:
+            previous = self._versions.get(client_profile_id)
+            if previous is not None and version <= previous:
+                return
+            self._versions[client_profile_id] = version
+        if previous is not None:
+            self.store.delete_prefix(f"{client_profile_id}:", keep=f"{client_profile_id}:{version}:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            semantic = sum(len(vectors) for _, vectors in self._semantic.values())
+        return {**self.store.stats(), "semantic_items": semantic}
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
@@ -1,9 +1,38 @@
+from typing import Iterable
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def chunk_text(text: str, chunk_size=800, overlap=100):
-    splitter = RecursiveCharacterTextSplitter(
+
+def _splitter(chunk_size: int, overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=overlap,
         separators=["\n\n", "\n", ".", " "]
     )
-    return splitter.split_text(text)
+
+
+def chunk_text(text: str, chunk_size=800, overlap=100):
+    return _splitter(chunk_size, overlap).split_text(text)
+
+
+def chunk_pages(pages: Iterable[str], chunk_size=800, overlap=100) -> list[str]:
+    """
+    Chunks text that arrives page by page, without joining the pages
+    first. Each page is split together with the tail carried over from the
+    previous one (the text from the start of its last chunk), so chunks
+    still span page breaks. Boundaries can differ slightly from chunk_text
+    on the joined text, but are stable for the same pages.
+    """
+    splitter = _splitter(chunk_size, overlap)
+    chunks = []
+    carry = ""
+    for page in pages:
+        buffer = carry + page
+        split = splitter.split_text(buffer)
+        if len(split) > 1:
+            chunks.extend(split[:-1])
+            carry = buffer[buffer.rfind(split[-1]):]
+        else:
+            carry = buffer
+    chunks.extend(splitter.split_text(carry))
+    return chunks
@@ -0,0 +1,135 @@
+import os
+import re
+
+from .embedding_engine import estimate_tokens
+
+# Prompt budget for retrieved context (estimated tokens)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Hits fetched by the retriever for the builder to choose from
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+# MMR trade-off: 1.0 = relevance only, 0.0 = diversity only
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Word-shingle Jaccard above which two chunks count as the same text
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+# The chunker overlaps neighbours by up to 100 characters
+MIN_OVERLAP = 20
+MAX_OVERLAP = 200
+
+_WORD = re.compile(r"\w+")
+SCORE_FIELDS = ("rerank_score", "rrf_score", "similarity", "bm25")
+
+
+def shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def overlap_length(first: str, second: str) -> int:
+    """
+    Length of the longest suffix of `first` that starts `second`, i.e. the
+    text two neighbouring chunks share. 0 when they are not neighbours.
+    """
+    longest = min(len(first), len(second), MAX_OVERLAP)
+    for size in range(longest, MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def relevance(hits: list[dict]) -> list[float]:
+    """
+    Relevance in [0, 1] from the best score field the hits carry (rerank,
+    fusion, cosine or BM25), falling back to rank order.
+    """
+    field = next((f for f in SCORE_FIELDS if all(f in h for h in hits)), None)
+    if field is None:
+        return [1 - i / len(hits) for i in range(len(hits))]
+    scores = [h[field] for h in hits]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(hits)
+    return [(s - low) / (high - low) for s in scores]
+
+
+def merge_adjacent(hits: list[dict]) -> list[dict]:
+    """
+    Joins hits from the same document whose texts overlap (neighbouring
+    chunks) into one passage, so the overlap is sent once. The merged
+    passage keeps the best rank of its parts.
+    """
+    merged: list[dict] = []
+    for hit in hits:
+        for passage in merged:
+            if passage.get("document_id") != hit.get("document_id"):
+                continue
+            text = passage["chunk_text"]
+            if size := overlap_length(text, hit["chunk_text"]):
+                passage["chunk_text"] = text + hit["chunk_text"][size:]
+            elif size := overlap_length(hit["chunk_text"], text):
+                passage["chunk_text"] = hit["chunk_text"] + text[size:]
+            else:
+                continue
+            passage["merged_chunk_ids"].append(hit.get("chunk_id"))
+            break
+        else:
+            merged.append({**hit, "merged_chunk_ids": [hit.get("chunk_id")]})
+    return merged
+
+
+def build_context(
+    hits: list[dict],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+) -> tuple[list[dict], int]:
+    """
+    Turns ranked retrieval hits into the passages sent to the LLM:
+
+    1. merge neighbouring chunks of a document (drops the chunker overlap)
+    2. drop near-duplicates (e.g. the same text in two uploaded versions)
+    3. order by maximal marginal relevance: relevance minus similarity to
+       what is already selected, so one topic can't fill the prompt
+    4. pack greedily until `token_budget` is used
+
+    Returns (passages, estimated tokens).
+    """
+    if not hits:
+        return [], 0
+
+    hits = [{**hit, "relevance": score} for hit, score in zip(hits, relevance(hits))]
+    passages = merge_adjacent(hits)
+    text_shingles = [shingles(p["chunk_text"]) for p in passages]
+
+    # Near-duplicates: keep the first (best ranked) copy
+    kept = []
+    for i in range(len(passages)):
+        if all(jaccard(text_shingles[i], text_shingles[j]) < duplicate_threshold for j in kept):
+            kept.append(i)
+
+    selected: list[int] = []
+    candidates = list(kept)
+    used = 0
+    while candidates:
+        def mmr(i):
+            redundancy = max((jaccard(text_shingles[i], text_shingles[j]) for j in selected), default=0.0)
+            return mmr_lambda * passages[i]["relevance"] - (1 - mmr_lambda) * redundancy
+
+        best = max(candidates, key=mmr)
+        candidates.remove(best)
+        tokens = estimate_tokens(passages[best]["chunk_text"])
+        if used + tokens > token_budget:
+            # Too big for what is left; a smaller passage may still fit
+            continue
+        selected.append(best)
+        used += tokens
+
+    return [passages[i] for i in selected], used
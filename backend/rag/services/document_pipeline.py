@@ -1,19 +1,129 @@
+import hashlib
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
 from sqlalchemy.orm import Session
 from auth.database import SessionLocal
 from user.models import KnowledgeDocument
-from .extractor import extract_text
-from .chunker import chunk_text
-from .embedder import embed_text
-from .vector_store import store_embeddings
+from .extractor import iter_text
+from .chunker import chunk_pages
+from .embedder import embed_text, resolve_embedding_model
+from .embedding_cache import normalize_text
+from .lexical_index import LEXICAL_INDEX_ENABLED, get_lexical_index
+from .vector_store import (
+    store_embeddings,
+    get_document_chunks,
+    update_chunk_metadata,
+    delete_chunks,
+    delete_document_embeddings,
+)
 
+# Versioning mode: re-uploads of a document only embed chunks whose content
+# changed and delete chunks that disappeared.
+INCREMENTAL_REINGEST = os.getenv("INCREMENTAL_REINGEST", "true").lower() == "true"
 
-def process_document_pipeline(doc_id: int, file_path: str):
+
+class PipelineAbandoned(Exception):
+    """
+    The worker lost its claim on the job; another worker owns the
+    document now, so this run stops without touching it further.
+    """
+
+
+def _check_claim(abandon: Optional[threading.Event]):
+    if abandon is not None and abandon.is_set():
+        raise PipelineAbandoned()
+
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(normalize_text(chunk).encode("utf-8")).hexdigest()
+
+
+def build_chunk_ids(doc_id: int, hashes: list[str]) -> list[str]:
+    """
+    Content-addressed chunk IDs: {doc_id}_{hash}_{n}, where n counts repeats
+    of the same chunk text inside the document. IDs stay stable across
+    versions no matter where a chunk moves to.
+    """
+    seen = Counter()
+    ids = []
+    for h in hashes:
+        ids.append(f"{doc_id}_{h[:32]}_{seen[h]}")
+        seen[h] += 1
+    return ids
+
+
+def sync_document_chunks(db: Session, doc: KnowledgeDocument, chunks: list[str]) -> dict:
+    """
+    Diffs `chunks` against what is stored for the document and applies the
+    difference: embed + add new chunks, delete vanished ones, and only
+    renumber (metadata update) chunks that moved.
+    """
+    doc_id, client_profile_id, model = doc.id, doc.client_profile_id, doc.embedding_model
+    hashes = [chunk_hash(c) for c in chunks]
+    ids = build_chunk_ids(doc_id, hashes)
+    existing = get_document_chunks(db, doc_id, client_profile_id, model)
+    wanted = set(ids)
+
+    new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+    vanished = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+    moved = [
+        i for i, chunk_id in enumerate(ids)
+        if chunk_id in existing and existing[chunk_id].get("chunk_index") != i
+    ]
+
+    if new_positions:
+        new_chunks = [chunks[i] for i in new_positions]
+        store_embeddings(
+            db,
+            doc_id,
+            new_chunks,
+            embed_text(new_chunks, model=model),
+            ids=[ids[i] for i in new_positions],
+            chunk_indices=new_positions,
+            chunk_hashes=[hashes[i] for i in new_positions],
+            embedding_model=model,
+        )
+
+    update_chunk_metadata(
+        db,
+        [ids[i] for i in moved],
+        [{**existing[ids[i]], "chunk_index": i} for i in moved],
+        client_profile_id,
+        model,
+    )
+    delete_chunks(db, vanished, client_profile_id, model)
+
+    if LEXICAL_INDEX_ENABLED:
+        # Unchanged chunks from before the lexical index existed are
+        # back-filled here, so a re-upload heals an old document
+        lexical_index = get_lexical_index(client_profile_id)
+        lexical_index.delete_chunks(vanished)
+        unindexed = set(lexical_index.missing(ids))
+        positions = [i for i, chunk_id in enumerate(ids) if chunk_id in unindexed]
+        lexical_index.add_chunks([ids[i] for i in positions], doc_id, [chunks[i] for i in positions])
+
+    return {
+        "added": len(new_positions),
+        "deleted": len(vanished),
+        "unchanged": len(ids) - len(new_positions),
+    }
+
+
+def process_document_pipeline(doc_id: int, file_path: str, abandon: threading.Event = None):
     """
-    Background task:
+    Ingestion job (run by rag.worker):
     Extract → Chunk → Embed → Store → Update DB
+
+    Errors are recorded on the document and re-raised so the job queue
+    can retry or fail the job. Once `abandon` is set (the worker lost its
+    claim) the run stops at the next stage with PipelineAbandoned.
     """
 
     db: Session = SessionLocal()
+    doc = None
 
     try:
         # Fetch document
@@ -22,37 +132,66 @@ def process_document_pipeline(doc_id: int, file_path: str):
             return
 
         # -------------------------
-        # 1. Extract text
-        # -------------------------
-        text = extract_text(file_path, doc.file_type)
-
-        # -------------------------
-        # 2. Chunk
+        # 1 + 2. Extract and chunk; PDF pages are chunked as the
+        # extraction pool returns them
         # -------------------------
-        chunks = chunk_text(text)
+        chunks = chunk_pages(iter_text(file_path, doc.file_type))
+        _check_claim(abandon)
         doc.chunk_count = len(chunks)
+        previous_model = doc.embedding_model
+        doc.embedding_model = resolve_embedding_model(doc.client_profile.embedding_model)
         db.commit()
 
-        # -------------------------
-        # 3. Embeddings
-        # -------------------------
-        embeddings = embed_text(chunks)
+        if previous_model and previous_model != doc.embedding_model:
+            # Tenant switched models: vectors from the old space are useless
+            delete_document_embeddings(db, doc_id, doc.client_profile_id, previous_model)
 
-        # -------------------------
-        # 4. Store embeddings in ChromaDB
-        # -------------------------
-        store_embeddings(db, doc_id, chunks, embeddings)
+        _check_claim(abandon)
+        if INCREMENTAL_REINGEST:
+            # -------------------------
+            # 3 + 4. Embed and store only what changed
+            # -------------------------
+            sync_document_chunks(db, doc, chunks)
+        else:
+            # -------------------------
+            # 3. Embeddings
+            # -------------------------
+            embeddings = embed_text(chunks, model=doc.embedding_model)
+
+            # -------------------------
+            # 4. Replace the document's chunks in the vector store
+            # -------------------------
+            delete_document_embeddings(db, doc_id, doc.client_profile_id, doc.embedding_model)
+            store_embeddings(db, doc_id, chunks, embeddings, embedding_model=doc.embedding_model)
+
+            if LEXICAL_INDEX_ENABLED:
+                lexical_index = get_lexical_index(doc.client_profile_id)
+                lexical_index.delete_document(doc_id)
+                lexical_index.add_chunks([f"{doc_id}_{i}" for i in range(len(chunks))], doc_id, chunks)
 
         # -------------------------
         # 5. Mark as processed
         # -------------------------
+        _check_claim(abandon)
         doc.processed = True
+        doc.processing_error = None
+        # New KB version: cached answers for this tenant stop matching
+        doc.client_profile.last_kb_update = datetime.utcnow()
         db.commit()
 
+    except PipelineAbandoned:
+        db.rollback()
+        raise
+
     except Exception as e:
-        doc.processing_error = str(e)
-        doc.processed = False
-        db.commit()
+        db.rollback()
+        if doc:
+            doc.processing_error = str(e)[:500]
+            doc.processed = False
+            # Some chunks may already have been replaced
+            doc.client_profile.last_kb_update = datetime.utcnow()
+            db.commit()
+        raise
 
     finally:
         db.close()
@@ -1,21 +1,153 @@
 from google import genai
+from google.genai import types
 import os
+from functools import lru_cache
+import anyio
 import dotenv
+from .embedding_cache import as_float32, embedding_cache, normalize_text
+from .embedding_engine import EmbeddingEngine
+from .local_embedder import get_local_embedder
 dotenv.load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+EMBEDDING_MODEL = "gemini-embedding-001"
+# Optional truncated output size (e.g. 1536 for the pgvector table); unset
+# keeps the model default
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Cache key: vectors of different sizes must never be mixed up
+EMBEDDING_CACHE_MODEL = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
 
-client = genai.Client(api_key=GOOGLE_API_KEY)
+# In-process ONNX models (see local_embedder.py), selectable per tenant via
+# ClientProfile.embedding_model
+LOCAL_EMBEDDING_MODELS = {m.strip() for m in os.getenv("LOCAL_EMBEDDING_MODELS", "minilm").split(",") if m.strip()}
 
-def embed_text(chunks: list[str]):
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
     """
-    Returns: list of embedding vectors using Google Gemini Embedding 001
+    Created on first use, so importing the embedder needs no API key.
     """
+    return genai.Client(api_key=GOOGLE_API_KEY)
+
+
+def _embed_batch(chunks: list[str]):
     contents = [{"text": chunk} for chunk in chunks]
 
-    response = client.models.embed_content(
-        model="gemini-embedding-001",
-        contents=contents
+    response = get_client().models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=contents,
+        config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONS) if EMBEDDING_DIMENSIONS else None,
     )
 
     return [item.values for item in response.embeddings]
+
+
+async def _aembed_batch(chunks: list[str]):
+    contents = [{"text": chunk} for chunk in chunks]
+
+    response = await get_client().aio.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=contents,
+        config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONS) if EMBEDDING_DIMENSIONS else None,
+    )
+
+    return [item.values for item in response.embeddings]
+
+
+# google.genai errors carry the HTTP status in `.code`, which the engine's
+# default retry check understands (429 and 5xx are retried).
+engine = EmbeddingEngine(_embed_batch, aembed_batch=_aembed_batch)
+
+
+def _embed_remote(chunks: list[str]):
+    return engine.embed(chunks)
+
+
+def resolve_embedding_model(model: str = None) -> str:
+    return model or EMBEDDING_MODEL
+
+
+def _embed_with(model: str, chunks: list[str]):
+    if model == EMBEDDING_MODEL:
+        return _embed_remote(chunks)
+    if model in LOCAL_EMBEDDING_MODELS:
+        return get_local_embedder(model).embed(chunks)
+    raise ValueError(f"Unknown embedding model: {model}")
+
+
+async def _aembed_with(model: str, chunks: list[str]):
+    if model == EMBEDDING_MODEL:
+        return await engine.aembed(chunks)
+    if model in LOCAL_EMBEDDING_MODELS:
+        return await get_local_embedder(model).aembed(chunks)
+    raise ValueError(f"Unknown embedding model: {model}")
+
+
+def _missing(chunks: list[str], vectors: dict) -> list[str]:
+    """
+    One text per normalized form that isn't cached: identical chunks inside
+    one call (footers, headers, whitespace variants) are embedded once.
+    """
+    unique = {}
+    for chunk in chunks:
+        if chunk not in vectors:
+            unique.setdefault(normalize_text(chunk), chunk)
+    return list(unique.values())
+
+
+def _fill(chunks: list[str], vectors: dict, missing: list[str], embeddings) -> dict:
+    """
+    Adds the fresh vectors to `vectors` for every chunk that shares a
+    normalized form with a missing text; returns {text: vector} to cache.
+    """
+    fresh = {text: as_float32(vector) for text, vector in zip(missing, embeddings)}
+    by_form = {normalize_text(text): vector for text, vector in fresh.items()}
+    for chunk in chunks:
+        if chunk not in vectors:
+            vectors[chunk] = by_form[normalize_text(chunk)]
+    return fresh
+
+
+def embed_text(chunks: list[str], model: str = None):
+    """
+    Returns: list of embedding vectors, by default using Google Gemini
+    Embedding 001. `model` selects a local ONNX model instead.
+
+    Vectors are served from the embedding cache where possible; only texts
+    that were never embedded before (after normalization) are computed.
+    """
+    model = resolve_embedding_model(model)
+
+    if embedding_cache is None:
+        return _embed_with(model, chunks)
+
+    cache_model = EMBEDDING_CACHE_MODEL if model == EMBEDDING_MODEL else model
+    vectors = embedding_cache.get_many(cache_model, chunks)
+
+    missing = _missing(chunks, vectors)
+    if missing:
+        fresh = _fill(chunks, vectors, missing, _embed_with(model, missing))
+        embedding_cache.set_many(cache_model, fresh)
+
+    return [vectors[chunk] for chunk in chunks]
+
+
+async def aembed_text(chunks: list[str], model: str = None):
+    """
+    Async embed_text for request handlers: the provider call is awaited
+    and the cache's SQLite lookups run in a worker thread, so no event
+    loop time is spent blocked.
+    """
+    model = resolve_embedding_model(model)
+
+    if embedding_cache is None:
+        return await _aembed_with(model, chunks)
+
+    cache_model = EMBEDDING_CACHE_MODEL if model == EMBEDDING_MODEL else model
+    vectors = await anyio.to_thread.run_sync(embedding_cache.get_many, cache_model, chunks)
+
+    missing = _missing(chunks, vectors)
+    if missing:
+        fresh = _fill(chunks, vectors, missing, await _aembed_with(model, missing))
+        await anyio.to_thread.run_sync(embedding_cache.set_many, cache_model, fresh)
+
+    return [vectors[chunk] for chunk in chunks]
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from core.cache import TieredCache
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "cache")
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for cache keys: NFKC + collapsed whitespace.
+    Case is kept, since it can change the embedding.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+def as_float32(vector) -> list[float]:
+    """
+    The precision vectors are cached at. Fresh vectors are rounded the same
+    way, so a text embeds to the same list whether it was a hit or a miss.
+    """
+    return np.asarray(vector, dtype=np.float32).tolist()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, normalized text hash).
+    Vectors are stored as float32 bytes.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.store = TieredCache(path, "embeddings", max_memory_items=max_memory_items)
+
+    def get_many(self, model: str, texts: list[str]) -> dict[str, list[float]]:
+        """
+        Returns {text: vector} for every text that is cached.
+        """
+        keys = {text: cache_key(model, text) for text in texts}
+        found = self.store.get_many(keys.values())
+        return {
+            text: np.frombuffer(found[key], dtype=np.float32).tolist()
+            for text, key in keys.items()
+            if key in found
+        }
+
+    def set_many(self, model: str, vectors: dict[str, list[float]]):
+        self.store.set_many({
+            cache_key(model, text): np.asarray(vector, dtype=np.float32).tobytes()
+            for text, vector in vectors.items()
+        })
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
@@ -0,0 +1,187 @@
+import asyncio
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+import anyio
+
+# Gemini's batchEmbedContents accepts at most 100 inputs per request
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "100"))
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "20000"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class RateLimitError(Exception):
+    """
+    Raised by an embed_batch function when the provider throttles us.
+    `retry_after` (seconds) is honoured when the provider sends one.
+    """
+
+    def __init__(self, message: str = "Rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token). Good enough for
+    keeping batches under a provider budget without loading a tokenizer.
+    """
+    return max(1, math.ceil(len(text) / 4))
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, RateLimitError):
+        return True
+    status = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS_CODES
+
+
+class EmbeddingEngine:
+    """
+    Splits texts into provider-sized batches (by count and token budget),
+    embeds a bounded number of batches concurrently, retries throttled or
+    transient failures with jittered exponential backoff, and returns the
+    vectors in input order.
+
+    `embed_batch` takes a list of texts and returns one vector per text.
+    `aembed_batch` is its async counterpart, used by `aembed`; without one,
+    `aembed` runs `embed` in a worker thread.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+        max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        retryable: Callable[[Exception], bool] = is_retryable,
+        aembed_batch: Callable[[list[str]], Awaitable[list[list[float]]]] = None,
+    ):
+        self.embed_batch = embed_batch
+        self.aembed_batch = aembed_batch
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def make_batches(self, texts: list[str]) -> list[list[int]]:
+        """
+        Groups text indices into batches. A single text over the token
+        budget still gets a batch of its own; the provider decides.
+        """
+        batches: list[list[int]] = []
+        current: list[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (
+                len(current) >= self.max_batch_size
+                or current_tokens + tokens > self.max_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after:
+            return min(self.max_delay, retry_after)
+        # "Full jitter": spreads retries from many workers apart
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _embed_with_retry(self, batch: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = self.embed_batch(batch)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.retryable(e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+                continue
+
+            self._check(vectors, batch)
+            return vectors
+
+    async def _aembed_with_retry(self, batch: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = await self.aembed_batch(batch)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.retryable(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+                continue
+
+            self._check(vectors, batch)
+            return vectors
+
+    @staticmethod
+    def _check(vectors: list, batch: list[str]):
+        if len(vectors) != len(batch):
+            raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} inputs")
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        results: list[Optional[list[float]]] = [None] * len(texts)
+
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            outputs = [self._embed_with_retry([texts[i] for i in b]) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                outputs = list(pool.map(
+                    lambda b: self._embed_with_retry([texts[i] for i in b]),
+                    batches,
+                ))
+
+        for indices, vectors in zip(batches, outputs):
+            for i, vector in zip(indices, vectors):
+                results[i] = vector
+
+        return results
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        if self.aembed_batch is None:
+            return await anyio.to_thread.run_sync(self.embed, texts)
+
+        batches = self.make_batches(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(indices: list[int]) -> list[list[float]]:
+            async with semaphore:
+                return await self._aembed_with_retry([texts[i] for i in indices])
+
+        outputs = await asyncio.gather(*(run(b) for b in batches))
+
+        results: list[Optional[list[float]]] = [None] * len(texts)
+        for indices, vectors in zip(batches, outputs):
+            for i, vector in zip(indices, vectors):
+                results[i] = vector
+        return results
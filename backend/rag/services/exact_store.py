@@ -0,0 +1,219 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from core.metrics import metrics
+from .quantized_store import QuantizedSegment
+from .vector_store import VectorStore, collection_for_tenant, create_vector_store
+
+EXACT_INDEX_DIR = os.getenv(
+    "EXACT_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "vectors", "exact"),
+)
+# Tenants above this many chunks are moved to the ANN backend
+EXACT_INDEX_MAX_CHUNKS = int(os.getenv("EXACT_INDEX_MAX_CHUNKS", "5000"))
+# Vectors kept warm across tenants; least recently queried tenants go first
+EXACT_INDEX_CACHE_MB = float(os.getenv("EXACT_INDEX_CACHE_MB", "512"))
+# Backend that promoted tenants (and tenants with data from before) live in
+EXACT_INDEX_ANN_BACKEND = os.getenv("EXACT_INDEX_ANN_BACKEND", "chroma")
+
+
+class ExactVectorStore(VectorStore):
+    """
+    Exact search for small tenants, ANN for large ones.
+
+    Each tenant starts with its own segment of unit float32 vectors,
+    memory-mapped from disk (QuantizedSegment in "none" mode): a query is
+    one matrix-vector product plus argpartition, with exact results and no
+    tenant filter. Loaded tenants are kept in LRU order and the least
+    recently used are unloaded once EXACT_INDEX_CACHE_MB is exceeded.
+
+    When a tenant grows past `max_chunks` its chunks are copied into the
+    ANN backend, a marker file is written and the segment is removed; from
+    then on every operation for the tenant goes to the ANN backend.
+    Tenants that already had chunks there when this backend was switched
+    on are marked the same way on their first write.
+    """
+
+    def __init__(self, path: str = EXACT_INDEX_DIR, ann: VectorStore = None,
+                 max_chunks: int = EXACT_INDEX_MAX_CHUNKS, cache_mb: float = EXACT_INDEX_CACHE_MB):
+        self.path = path
+        self.ann = ann or create_vector_store(EXACT_INDEX_ANN_BACKEND)
+        self.max_chunks = max_chunks
+        self.cache_bytes = cache_mb * 2**20
+        self._segments: "OrderedDict[str, QuantizedSegment]" = OrderedDict()
+        self._promoted: set[str] = set()
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.ann.open()
+        return self
+
+    def close(self):
+        with self._lock:
+            self._segments.clear()
+        self.ann.close()
+
+    def supports_model(self, embedding_model=None):
+        # Large tenants end up in the ANN backend
+        return self.ann.supports_model(embedding_model)
+
+    # -------------------------
+    # Tenant placement
+    # -------------------------
+    @staticmethod
+    def _name(client_profile_id: int, embedding_model: str = None) -> str:
+        return collection_for_tenant(client_profile_id, sharding="tenant", embedding_model=embedding_model)
+
+    def _marker(self, name: str) -> str:
+        return os.path.join(self.path, "promoted", name)
+
+    def _is_promoted(self, name: str) -> bool:
+        # Promotion is one-way, so a positive answer can be cached
+        if name in self._promoted:
+            return True
+        if os.path.exists(self._marker(name)):
+            self._promoted.add(name)
+            return True
+        return False
+
+    def _mark_promoted(self, name: str):
+        os.makedirs(os.path.dirname(self._marker(name)), exist_ok=True)
+        open(self._marker(name), "w").close()
+        self._promoted.add(name)
+
+    def _segment(self, client_profile_id: int, embedding_model: str = None) -> Optional[QuantizedSegment]:
+        """
+        The tenant's exact segment, or None when the tenant lives in the
+        ANN backend (or has no chunks anywhere yet).
+        """
+        if client_profile_id is None:
+            return None
+        name = self._name(client_profile_id, embedding_model)
+        if self._is_promoted(name):
+            return None
+
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is not None:
+                self._segments.move_to_end(name)
+                return segment
+            path = os.path.join(self.path, name)
+            if not os.path.exists(path):
+                return None
+            segment = self._segments[name] = QuantizedSegment(path, "none")
+        return segment
+
+    def _write_segment(self, db, client_profile_id: int, embedding_model: str = None) -> Optional[QuantizedSegment]:
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is not None or client_profile_id is None:
+            return segment
+
+        name = self._name(client_profile_id, embedding_model)
+        if self._is_promoted(name):
+            return None
+        # First write through this backend: existing ANN tenants stay there
+        if self.ann.count(db, client_profile_id, embedding_model, limit=1):
+            self._mark_promoted(name)
+            return None
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is None:
+                segment = self._segments[name] = QuantizedSegment(os.path.join(self.path, name), "none")
+        return segment
+
+    def _evict(self):
+        with self._lock:
+            loaded = sum(segment.loaded_bytes() for segment in self._segments.values())
+            while loaded > self.cache_bytes and len(self._segments) > 1:
+                _, segment = self._segments.popitem(last=False)
+                loaded -= segment.loaded_bytes()
+                segment.unload()
+                metrics.incr("exact_store.evictions")
+
+    def _promote(self, db, client_profile_id: int, embedding_model: str, segment: QuantizedSegment):
+        name = self._name(client_profile_id, embedding_model)
+        with metrics.timer("exact_store.promote"):
+            for ids, embeddings, documents, metadatas in segment.export():
+                self.ann.add_chunks(db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model)
+            # Marker only once the ANN copy is complete
+            self._mark_promoted(name)
+            with self._lock:
+                self._segments.pop(name, None)
+            shutil.rmtree(segment.path, ignore_errors=True)
+        metrics.incr("exact_store.promotions")
+
+    # -------------------------
+    # VectorStore interface
+    # -------------------------
+    def add_chunks(self, db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model=None):
+        segment = self._write_segment(db, client_profile_id, embedding_model)
+        if segment is None:
+            self.ann.add_chunks(db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model)
+            return
+
+        segment.add(ids, embeddings, documents, metadatas)
+        if self._is_promoted(self._name(client_profile_id, embedding_model)):
+            # Another process promoted the tenant while we were writing
+            self.ann.add_chunks(db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model)
+        elif segment.count() > self.max_chunks:
+            self._promote(db, client_profile_id, embedding_model, segment)
+
+    def search(self, db, query_embedding, limit, client_profile_id=None, embedding_model=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            return self.ann.search(db, query_embedding, limit, client_profile_id, embedding_model)
+
+        with metrics.timer("vector_store.query"):
+            hits = segment.search(query_embedding, limit)
+        self._evict()
+        return hits
+
+    def count(self, db, client_profile_id=None, embedding_model=None, limit=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            return self.ann.count(db, client_profile_id, embedding_model, limit)
+        total = segment.count()
+        return min(total, limit) if limit is not None else total
+
+    def get_document_chunks(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            return self.ann.get_document_chunks(db, doc_id, client_profile_id, embedding_model)
+        return segment.document_chunks(doc_id)
+
+    def update_chunk_metadata(self, db, ids, metadatas, client_profile_id=None, embedding_model=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            self.ann.update_chunk_metadata(db, ids, metadatas, client_profile_id, embedding_model)
+        else:
+            segment.update_metadata(ids, metadatas)
+
+    def delete_chunks(self, db, ids, client_profile_id=None, embedding_model=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            self.ann.delete_chunks(db, ids, client_profile_id, embedding_model)
+        else:
+            segment.delete(ids)
+
+    def delete_document(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        segment = self._segment(client_profile_id, embedding_model)
+        if segment is None:
+            self.ann.delete_document(db, doc_id, client_profile_id, embedding_model)
+        else:
+            segment.delete_document(doc_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = list(self._segments.values())
+        return {
+            "backend": "exact",
+            "tenants_open": len(segments),
+            "tenants_loaded": sum(1 for segment in segments if segment.loaded_bytes()),
+            "loaded_bytes": sum(segment.loaded_bytes() for segment in segments),
+            "cache_bytes": int(self.cache_bytes),
+            "tenants_promoted": len(self._promoted),
+            "ann": self.ann.stats(),
+        }
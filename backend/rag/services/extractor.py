@@ -1,17 +1,127 @@
+import atexit
+import os
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator
+
 import fitz 
 import docx
 
-def extract_text_from_pdf(file_path: str) -> str:
-    text = ""
+# Page-range extraction tuning. Small PDFs are read inline; the process pool
+# only pays off once there are several batches to spread across cores.
+PDF_PAGES_PER_BATCH = int(os.getenv("PDF_PAGES_PER_BATCH", "16"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+
+_pool: ProcessPoolExecutor = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    One pool per process, started on the first large PDF: spawning
+    interpreters and importing fitz costs more than extracting a batch.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" keeps MuPDF state and the web server's threads out of the children
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """
+    A child died (OOM, a crash in MuPDF): the next PDF starts a fresh pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> list[tuple[int, str]]:
+    """
+    Worker: opens the PDF itself (fitz documents can't cross process
+    boundaries) and returns [(page_number, text), ...] for pages [start, stop).
+    """
+    with fitz.open(file_path) as pdf:
+        return [(n + 1, pdf[n].get_text()) for n in range(start, stop)]
+
+
+def iter_pdf_pages(
+    file_path: str,
+    pages_per_batch: int = PDF_PAGES_PER_BATCH,
+    max_workers: int = PDF_EXTRACT_WORKERS,
+) -> Iterator[tuple[int, str]]:
+    """
+    Yields (page_number, text) for every page, in order. Page numbers are 1-based.
+
+    Page batches are fanned out to the shared process pool; at most two
+    batches per worker are in flight per file so memory stays bounded on
+    very large files, and batches still queued are cancelled if the caller
+    stops reading.
+    """
     try:
         with fitz.open(file_path) as pdf:
-            for page in pdf:
-                text += page.get_text()
-        return text
+            page_count = pdf.page_count
+
+        batch = max(1, pages_per_batch)
+        ranges = [(start, min(start + batch, page_count)) for start in range(0, page_count, batch)]
+
+        if max_workers <= 1 or len(ranges) <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            for start, stop in ranges:
+                yield from _extract_pdf_page_range(file_path, start, stop)
+            return
+
+        workers = min(max_workers, len(ranges))
+        pool = _get_pool()
+        pending = deque()
+        remaining = iter(ranges)
+        try:
+            for start, stop in remaining:
+                pending.append(pool.submit(_extract_pdf_page_range, file_path, start, stop))
+                if len(pending) >= workers * 2:
+                    break
+
+            while pending:
+                pages = pending.popleft().result()
+                next_range = next(remaining, None)
+                if next_range:
+                    pending.append(pool.submit(_extract_pdf_page_range, file_path, *next_range))
+                yield from pages
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
     except Exception as e:
         raise Exception(f"PDF extraction failed: {str(e)}")
 
 
+def extract_text_from_pdf(file_path: str) -> str:
+    return "".join(iter_text(file_path, "application/pdf"))
+
+
 def extract_text_from_docx(file_path: str) -> str:
     try:
         doc = docx.Document(file_path)
@@ -28,6 +138,18 @@ def extract_text_from_txt(file_path: str) -> str:
         raise Exception(f"TXT extraction failed: {str(e)}")
 
 
+def iter_text(file_path: str, file_type: str) -> Iterator[str]:
+    """
+    Text of the file in reading order: one piece per page for PDFs (as the
+    pages come back from the pool), the whole text otherwise.
+    """
+    if file_type == "application/pdf":
+        for _, text in iter_pdf_pages(file_path):
+            yield text
+    else:
+        yield extract_text(file_path, file_type)
+
+
 def extract_text(file_path: str, file_type: str) -> str:
     """
     Auto-select extraction based on MIME type.
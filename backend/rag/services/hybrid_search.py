@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import anyio
+from sqlalchemy.orm import Session
+
+from core.metrics import metrics
+from .embedder import aembed_text, embed_text
+from .lexical_index import LEXICAL_INDEX_ENABLED, get_lexical_index, identifier_ratio, identifiers
+from .vector_store import asearch_embeddings, search_embeddings
+
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# RRF constant; 60 is the value from the original paper
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Queries where at least this share of the terms are identifiers skip the
+# embedding call when a top lexical hit contains one of those identifiers
+LEXICAL_FASTPATH_RATIO = float(os.getenv("LEXICAL_FASTPATH_RATIO", "0.5"))
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int = HYBRID_RRF_K, limit: int = None) -> list[dict]:
+    """
+    Merges ranked hit lists by sum(1 / (k + rank)), keyed by chunk_id.
+    Only ranks matter, so BM25 scores and cosine similarities never have to
+    be put on the same scale. Fields from every list are kept on the hit.
+    """
+    fused: dict[str, dict] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["chunk_id"], {"rrf_score": 0.0})
+            entry.update(hit)
+            entry["rrf_score"] += 1 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda hit: hit["rrf_score"], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+
+def lexical_fastpath(query: str, lexical_hits: list[dict], limit: int) -> bool:
+    """
+    Whether the lexical hits can be served alone. Besides the identifier
+    ratio, one of the top hits must contain one of the query's identifiers:
+    hits that only matched its other words ("status of ORD-1" finding
+    "order status") are no better than a vector search.
+    """
+    wanted = identifiers(query)
+    return bool(wanted) and any(wanted & identifiers(hit["chunk_text"]) for hit in lexical_hits[:limit])
+
+
+def hybrid_search(
+    db: Session,
+    query: str,
+    client_profile_id: int,
+    limit: int = 5,
+    embedding_model: str = None,
+) -> tuple[list[dict], str]:
+    """
+    Returns (hits, mode), mode being "lexical", "hybrid" or "vector".
+    """
+    lexical_hits = []
+    if LEXICAL_INDEX_ENABLED and client_profile_id:
+        lexical_hits = get_lexical_index(client_profile_id).search(query, limit=HYBRID_CANDIDATES)
+
+        if identifier_ratio(query) >= LEXICAL_FASTPATH_RATIO and lexical_fastpath(query, lexical_hits, limit):
+            metrics.incr("retrieval.mode.lexical")
+            return lexical_hits[:limit], "lexical"
+
+    query_embedding = embed_text([query], model=embedding_model)[0]
+    vector_hits = search_embeddings(
+        db,
+        query_embedding,
+        limit=HYBRID_CANDIDATES if lexical_hits else limit,
+        client_profile_id=client_profile_id,
+        embedding_model=embedding_model,
+    )
+
+    if not lexical_hits:
+        metrics.incr("retrieval.mode.vector")
+        return vector_hits, "vector"
+
+    metrics.incr("retrieval.mode.hybrid")
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], limit=limit), "hybrid"
+
+
+async def ahybrid_search(
+    db: Session,
+    query: str,
+    client_profile_id: int,
+    limit: int = 5,
+    embedding_model: str = None,
+) -> tuple[list[dict], str]:
+    """
+    Async hybrid_search. The BM25 lookup and the query embedding run
+    concurrently, except for identifier queries, where the lexical result
+    decides whether the embedding is needed at all.
+    """
+    use_lexical = LEXICAL_INDEX_ENABLED and bool(client_profile_id)
+
+    async def lexical():
+        if not use_lexical:
+            return []
+        index = get_lexical_index(client_profile_id)
+        return await anyio.to_thread.run_sync(index.search, query, HYBRID_CANDIDATES)
+
+    if use_lexical and identifier_ratio(query) >= LEXICAL_FASTPATH_RATIO:
+        lexical_hits = await lexical()
+        if lexical_fastpath(query, lexical_hits, limit):
+            metrics.incr("retrieval.mode.lexical")
+            return lexical_hits[:limit], "lexical"
+        query_embedding = (await aembed_text([query], model=embedding_model))[0]
+    else:
+        lexical_hits, embeddings = await asyncio.gather(lexical(), aembed_text([query], model=embedding_model))
+        query_embedding = embeddings[0]
+
+    vector_hits = await asearch_embeddings(
+        db,
+        query_embedding,
+        limit=HYBRID_CANDIDATES if lexical_hits else limit,
+        client_profile_id=client_profile_id,
+        embedding_model=embedding_model,
+    )
+
+    if not lexical_hits:
+        metrics.incr("retrieval.mode.vector")
+        return vector_hits, "vector"
+
+    metrics.incr("retrieval.mode.hybrid")
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], limit=limit), "hybrid"
@@ -0,0 +1,254 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func, case, or_, and_, update, exists
+from sqlalchemy.orm import Session, aliased
+
+from rag.models import IngestionJob, IngestionJobStatus
+from user.models import KnowledgeDocument
+
+
+def enqueue_job(db: Session, doc: KnowledgeDocument, file_path: str, max_attempts: int = 3) -> IngestionJob:
+    """
+    Persists a pipeline job for `doc`. Committed immediately so it survives
+    an API restart and becomes visible to workers.
+
+    Older jobs for the same document that haven't started yet are
+    superseded; only the newest upload needs processing. One that is
+    already running is left to finish: claim_job holds the new job back
+    until then, so two versions are never synced at the same time.
+    """
+    db.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.document_id == doc.id,
+            IngestionJob.status == IngestionJobStatus.pending.value,
+        )
+        .values(
+            status=IngestionJobStatus.failed.value,
+            finished_at=datetime.utcnow(),
+            last_error="Superseded by a newer upload",
+        )
+    )
+    job = IngestionJob(
+        document_id=doc.id,
+        client_profile_id=doc.client_profile_id,
+        file_path=file_path,
+        max_attempts=max_attempts,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def requeue_documents(db: Session, client_profile_id: int) -> int:
+    """
+    Queues every document of the tenant for ingestion again from its
+    latest upload, e.g. after the tenant switched embedding models.
+    Returns the number of jobs queued.
+    """
+    latest = (
+        select(IngestionJob.document_id, func.max(IngestionJob.id).label("job_id"))
+        .where(IngestionJob.client_profile_id == client_profile_id)
+        .group_by(IngestionJob.document_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(KnowledgeDocument, IngestionJob.file_path)
+        .join(latest, latest.c.document_id == KnowledgeDocument.id)
+        .join(IngestionJob, IngestionJob.id == latest.c.job_id)
+    ).all()
+    for doc, file_path in rows:
+        enqueue_job(db, doc, file_path)
+    return len(rows)
+
+
+def _superseded():
+    newer = aliased(IngestionJob)
+    return exists().where(newer.document_id == IngestionJob.document_id, newer.id > IngestionJob.id)
+
+
+def _claimable(visibility_timeout: int):
+    """
+    Pending jobs, plus running jobs whose worker stopped heartbeating
+    for longer than the visibility timeout (crashed or partitioned) and
+    that no newer upload replaced. Jobs whose document another worker is
+    still processing wait for it.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=visibility_timeout)
+    busy = aliased(IngestionJob)
+    return and_(
+        IngestionJob.attempts < IngestionJob.max_attempts,
+        or_(
+            IngestionJob.status == IngestionJobStatus.pending.value,
+            and_(
+                IngestionJob.status == IngestionJobStatus.running.value,
+                IngestionJob.heartbeat_at < stale_before,
+                ~_superseded(),
+            ),
+        ),
+        ~exists().where(
+            busy.document_id == IngestionJob.document_id,
+            busy.id != IngestionJob.id,
+            busy.status == IngestionJobStatus.running.value,
+            busy.heartbeat_at >= stale_before,
+        ),
+    )
+
+
+def claim_job(db: Session, worker_id: str, visibility_timeout: int) -> Optional[IngestionJob]:
+    """
+    Atomically claims the next job, or returns None.
+
+    Fairness: tenants are served round-robin. Candidates are ordered by how
+    many jobs their tenant already has running, then by when that tenant was
+    last served, then by age, so one tenant's bulk upload of 500 files is
+    interleaved with everyone else's work instead of blocking it.
+    SKIP LOCKED lets any number of workers claim concurrently without
+    waiting on each other's row locks.
+    """
+    tenant_load = (
+        select(
+            IngestionJob.client_profile_id.label("client_profile_id"),
+            func.sum(
+                case((IngestionJob.status == IngestionJobStatus.running.value, 1), else_=0)
+            ).label("running"),
+            func.max(IngestionJob.started_at).label("last_started"),
+        )
+        .group_by(IngestionJob.client_profile_id)
+        .subquery()
+    )
+
+    stmt = (
+        select(IngestionJob)
+        .join(tenant_load, tenant_load.c.client_profile_id == IngestionJob.client_profile_id)
+        .where(_claimable(visibility_timeout))
+        .order_by(
+            tenant_load.c.running,
+            tenant_load.c.last_started.asc().nulls_first(),
+            IngestionJob.created_at,
+            IngestionJob.id,
+        )
+        .limit(1)
+        .with_for_update(skip_locked=True, of=IngestionJob)
+    )
+
+    job = db.execute(stmt).scalars().first()
+    if not job:
+        db.rollback()
+        return None
+
+    now = datetime.utcnow()
+    job.status = IngestionJobStatus.running.value
+    job.attempts += 1
+    job.worker_id = worker_id
+    job.started_at = now
+    job.heartbeat_at = now
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def heartbeat(db: Session, job_id: int, worker_id: str) -> bool:
+    """
+    Extends the claim. Returns False if the job was reclaimed by another
+    worker in the meantime.
+    """
+    result = db.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.id == job_id,
+            IngestionJob.worker_id == worker_id,
+            IngestionJob.status == IngestionJobStatus.running.value,
+        )
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _owned(job: IngestionJob, worker_id: str):
+    return and_(
+        IngestionJob.id == job.id,
+        IngestionJob.worker_id == worker_id,
+        IngestionJob.status == IngestionJobStatus.running.value,
+    )
+
+
+def complete_job(db: Session, job: IngestionJob, worker_id: str) -> bool:
+    """
+    Marks the job done. Returns False (and changes nothing) if the claim
+    was lost: the job was reaped or reclaimed by another worker.
+    """
+    result = db.execute(
+        update(IngestionJob)
+        .where(_owned(job, worker_id))
+        .values(status=IngestionJobStatus.done.value, finished_at=datetime.utcnow(), last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def fail_job(db: Session, job: IngestionJob, worker_id: str, error: str) -> bool:
+    """
+    Puts the job back in the queue, or marks it failed once it has used
+    all of its attempts. Returns False (and changes nothing) if the claim
+    was lost, so a stale worker can't requeue a job someone else runs.
+    """
+    if job.attempts >= job.max_attempts:
+        values = {"status": IngestionJobStatus.failed.value, "finished_at": datetime.utcnow()}
+    else:
+        values = {"status": IngestionJobStatus.pending.value, "worker_id": None}
+    result = db.execute(
+        update(IngestionJob)
+        .where(_owned(job, worker_id))
+        .values(last_error=error[:500], **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def stale_uploads(db: Session, job: IngestionJob) -> list[str]:
+    """
+    Upload files of the document's earlier jobs that no queued or running
+    job still needs, once `job` (the newer upload) is done.
+    """
+    earlier = db.execute(
+        select(IngestionJob.file_path, IngestionJob.status)
+        .where(IngestionJob.document_id == job.document_id, IngestionJob.id != job.id)
+    ).all()
+    active = {job.file_path} | {
+        path for path, status in earlier
+        if status in (IngestionJobStatus.pending.value, IngestionJobStatus.running.value)
+    }
+    return sorted({path for path, _ in earlier} - active)
+
+
+def reap_stale_jobs(db: Session, visibility_timeout: int) -> int:
+    """
+    Marks running jobs that timed out on their final attempt, or that a
+    newer upload replaced, as failed; they can never be claimed again
+    otherwise.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=visibility_timeout)
+    timed_out = and_(
+        IngestionJob.status == IngestionJobStatus.running.value,
+        IngestionJob.heartbeat_at < stale_before,
+    )
+    reaped = 0
+    for condition, error in (
+        (IngestionJob.attempts >= IngestionJob.max_attempts, "Visibility timeout exceeded"),
+        (_superseded(), "Superseded by a newer upload"),
+    ):
+        result = db.execute(
+            update(IngestionJob)
+            .where(timed_out, condition)
+            .values(status=IngestionJobStatus.failed.value, finished_at=datetime.utcnow(), last_error=error)
+            .execution_options(synchronize_session=False)
+        )
+        reaped += result.rowcount
+    db.commit()
+    return reaped
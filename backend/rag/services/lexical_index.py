@@ -0,0 +1,258 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+from core.metrics import metrics
+
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "lexical"),
+)
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words joined by - _ . / # stay one token ("ORD-10293", "v2.1", "SKU_88")
+_TOKEN = re.compile(r"[^\W_]+(?:[-_./#][^\W_]+)*")
+_SEPARATORS = re.compile(r"[-_./#]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my "
+    "no not of on or our so than that the their then there these this to was we what when "
+    "where which who why will with you your".split()
+)
+
+
+def is_identifier(token: str) -> bool:
+    """
+    SKUs, order numbers, policy codes: anything with a digit in it that is
+    longer than a plain small number.
+    """
+    return len(token) >= 3 and any(ch.isdigit() for ch in token)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cased word tokens without stopwords. Compound identifiers are
+    indexed whole and by their parts, so "ORD-10293" also matches "10293".
+    """
+    tokens = []
+    for match in _TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _SEPARATORS.search(token):
+            tokens.extend(part for part in _SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def identifier_ratio(query: str) -> float:
+    tokens = [m.group() for m in _TOKEN.finditer(query.lower()) if m.group() not in STOPWORDS]
+    if not tokens:
+        return 0.0
+    return sum(1 for t in tokens if is_identifier(t)) / len(tokens)
+
+
+def identifiers(text: str) -> set[str]:
+    """
+    The identifier tokens of `text`, as tokenize() indexes them.
+    """
+    return {token for token in tokenize(text) if is_identifier(token)}
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index for one tenant, stored in its own SQLite file.
+
+    postings(term, chunk_id, tf) is the inverted index; chunks keeps each
+    chunk's length and text so hits can be returned without a vector store
+    round trip. Document count and total length are kept in `stats`, so
+    adding or deleting chunks is incremental.
+    """
+
+    def __init__(self, path: str, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " document_id INTEGER NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " chunk_text TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, chunk_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS ix_postings_chunk_id ON postings (chunk_id);"
+            "CREATE TABLE IF NOT EXISTS stats ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " chunk_count INTEGER NOT NULL,"
+            " total_length INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO stats (id, chunk_count, total_length) VALUES (1, 0, 0);"
+        )
+
+    # -------------------------
+    # SQLite (one connection per thread)
+    # -------------------------
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def add_chunks(self, ids: list[str], document_id: int, texts: list[str]):
+        """
+        Indexes (or re-indexes) chunks. Existing chunk IDs are replaced.
+        """
+        if not ids:
+            return
+        with self._write_lock, metrics.timer("lexical_index.add"):
+            conn = self._connection()
+            with conn:
+                self._delete(conn, ids)
+                rows, postings, total = [], [], 0
+                for chunk_id, chunk_text in zip(ids, texts):
+                    tokens = tokenize(chunk_text)
+                    total += len(tokens)
+                    rows.append((chunk_id, document_id, len(tokens), chunk_text))
+                    postings.extend((term, chunk_id, tf) for term, tf in Counter(tokens).items())
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+                conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+                conn.execute(
+                    "UPDATE stats SET chunk_count = chunk_count + ?, total_length = total_length + ?",
+                    (len(rows), total),
+                )
+
+    def delete_chunks(self, ids: list[str]):
+        if not ids:
+            return
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, ids)
+
+    def delete_document(self, document_id: int):
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                ids = [r[0] for r in conn.execute("SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,))]
+                self._delete(conn, ids)
+
+    def _delete(self, conn: sqlite3.Connection, ids: list[str]):
+        # Caller holds the write lock and an open transaction
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            count, length = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE chunk_id IN ({placeholders})", part
+            ).fetchone()
+            if not count:
+                continue
+            conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", part)
+            conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", part)
+            conn.execute(
+                "UPDATE stats SET chunk_count = chunk_count - ?, total_length = total_length - ?",
+                (count, length),
+            )
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def missing(self, ids: list[str]) -> list[str]:
+        """
+        IDs that are not indexed yet (chunks stored before the index existed).
+        """
+        conn = self._connection()
+        present = set()
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            present.update(r[0] for r in conn.execute(f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({placeholders})", part))
+        return [chunk_id for chunk_id in ids if chunk_id not in present]
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with metrics.timer("lexical_index.search"):
+            conn = self._connection()
+            chunk_count, total_length = conn.execute("SELECT chunk_count, total_length FROM stats").fetchone()
+            if not chunk_count:
+                return []
+            avg_length = total_length / chunk_count
+
+            placeholders = ",".join("?" * len(terms))
+            rows = conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term IN ({placeholders})",
+                terms,
+            ).fetchall()
+
+            df = Counter(term for term, _, _, _ in rows)
+            scores: dict[str, float] = {}
+            for term, chunk_id, tf, length in rows:
+                idf = math.log(1 + (chunk_count - df[term] + 0.5) / (df[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            if not top:
+                return []
+
+            placeholders = ",".join("?" * len(top))
+            details = {
+                chunk_id: (document_id, chunk_text)
+                for chunk_id, document_id, chunk_text in conn.execute(
+                    f"SELECT chunk_id, document_id, chunk_text FROM chunks WHERE chunk_id IN ({placeholders})",
+                    [chunk_id for chunk_id, _ in top],
+                )
+            }
+
+        return [
+            {
+                "chunk_id": chunk_id,
+                "document_id": details[chunk_id][0],
+                "chunk_text": details[chunk_id][1],
+                "bm25": score,
+            }
+            for chunk_id, score in top
+        ]
+
+    def stats(self) -> dict:
+        chunk_count, total_length = self._connection().execute("SELECT chunk_count, total_length FROM stats").fetchone()
+        return {"chunks": chunk_count, "avg_length": round(total_length / chunk_count, 2) if chunk_count else 0.0}
+
+
+_indexes: dict[int, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(client_profile_id: int) -> LexicalIndex:
+    index = _indexes.get(client_profile_id)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(client_profile_id)
+            if index is None:
+                path = os.path.join(LEXICAL_INDEX_DIR, f"tenant_{client_profile_id}.sqlite3")
+                index = _indexes[client_profile_id] = LexicalIndex(path)
+    return index
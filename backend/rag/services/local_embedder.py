@@ -0,0 +1,209 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import anyio
+
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "models")
+
+LOCAL_EMBED_MAX_BATCH = int(os.getenv("LOCAL_EMBED_MAX_BATCH", "32"))
+LOCAL_EMBED_MAX_WAIT_MS = float(os.getenv("LOCAL_EMBED_MAX_WAIT_MS", "4"))
+LOCAL_EMBED_WORKERS = int(os.getenv("LOCAL_EMBED_WORKERS", "2"))
+LOCAL_EMBED_INTRA_OP_THREADS = int(os.getenv("LOCAL_EMBED_INTRA_OP_THREADS", "0"))  # 0 = onnxruntime default
+LOCAL_EMBED_MAX_LENGTH = int(os.getenv("LOCAL_EMBED_MAX_LENGTH", "256"))
+
+
+class OnnxEmbeddingModel:
+    """
+    Sentence-embedding model run in-process with ONNX Runtime.
+
+    `model_dir` holds `model.onnx` and a Hugging Face `tokenizer.json`
+    (e.g. an exported all-MiniLM-L6-v2). The graph takes input_ids and
+    attention_mask (token_type_ids if declared) and returns either token
+    embeddings [batch, seq, dim], which are mean-pooled over the mask, or
+    sentence embeddings [batch, dim]. Output vectors are L2-normalized.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = LOCAL_EMBED_MAX_LENGTH,
+                 intra_op_threads: int = LOCAL_EMBED_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, feeds)[0]
+        if output.ndim == 3:
+            mask = attention_mask[..., None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class MicroBatcher:
+    """
+    Dynamic batching for concurrent single-text requests.
+
+    Callers get a Future back. A collector thread waits up to `max_wait_ms`
+    after the first request for more to arrive (or until `max_batch_size`),
+    then runs the whole batch as one `batch_fn` call on a small thread
+    pool. Under load, N concurrent widget queries cost one matrix op
+    instead of N.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = LOCAL_EMBED_MAX_BATCH,
+                 max_wait_ms: float = LOCAL_EMBED_MAX_WAIT_MS, workers: int = LOCAL_EMBED_WORKERS):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed-batch")
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        # Counters are bumped from the pool threads
+        self._stats_lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+        self._collector.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self.pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        live = [(text, f) for text, f in batch if f.set_running_or_notify_cancel()]
+        if not live:
+            return
+        texts = [text for text, _ in live]
+        futures = [f for _, f in live]
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(texts)
+        try:
+            vectors = self.batch_fn(texts)
+        except Exception as e:
+            for f in futures:
+                f.set_exception(e)
+            return
+        for f, vector in zip(futures, vectors):
+            f.set_result(vector)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._collector.join()
+        self.pool.shutdown(wait=True)
+
+
+class LocalEmbedder:
+    """
+    Local embedding backend: single texts (query embeddings) go through the
+    micro-batcher, lists (document chunks) are embedded directly in
+    fixed-size batches.
+    """
+
+    def __init__(self, model_dir: str, **batcher_options):
+        self.model = OnnxEmbeddingModel(model_dir)
+        self.batcher = MicroBatcher(self.model.embed, **batcher_options)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if len(texts) == 1:
+            return [self.batcher.submit(texts[0]).result().tolist()]
+
+        size = self.batcher.max_batch_size
+        vectors = []
+        for i in range(0, len(texts), size):
+            vectors.extend(self.model.embed(texts[i:i + size]).tolist())
+        return vectors
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        if len(texts) == 1:
+            # Waits on the batcher's future without holding a thread
+            return [(await asyncio.wrap_future(self.batcher.submit(texts[0]))).tolist()]
+        return await anyio.to_thread.run_sync(self.embed, texts)
+
+    def close(self):
+        self.batcher.close()
+
+
+def model_dir_for(name: str) -> str:
+    """
+    LOCAL_EMBEDDING_MODEL_<NAME> overrides the default storage/models/<name>.
+    """
+    return os.getenv(f"LOCAL_EMBEDDING_MODEL_{name.upper().replace('-', '_')}", os.path.join(MODELS_DIR, name))
+
+
+MODEL_FILES = ("model.onnx", "tokenizer.json")
+
+
+def missing_model_files(name: str) -> list[str]:
+    """
+    The files OnnxEmbeddingModel needs that are not in the model's directory.
+    """
+    model_dir = model_dir_for(name)
+    return [f for f in MODEL_FILES if not os.path.isfile(os.path.join(model_dir, f))]
+
+
+_embedders: dict[str, LocalEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_local_embedder(name: str) -> LocalEmbedder:
+    embedder = _embedders.get(name)
+    if embedder is None:
+        with _embedders_lock:
+            embedder = _embedders.get(name)
+            if embedder is None:
+                embedder = _embedders[name] = LocalEmbedder(model_dir_for(name))
+    return embedder
+
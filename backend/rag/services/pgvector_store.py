@@ -0,0 +1,224 @@
+import io
+import os
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from auth.database import SessionLocal
+from core.metrics import metrics
+from .embedder import EMBEDDING_MODEL
+from .vector_store import VectorStore
+
+# Must match the vector(N) column and the embedder's EMBEDDING_DIMENSIONS
+PGVECTOR_DIMENSIONS = int(os.getenv("PGVECTOR_DIMENSIONS", "1536"))
+# "hnsw" or "ivfflat"; ensure_index drops the other one
+PGVECTOR_INDEX = os.getenv("PGVECTOR_INDEX", "hnsw")
+PGVECTOR_HNSW_EF_SEARCH = int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "100"))
+PGVECTOR_IVFFLAT_LISTS = int(os.getenv("PGVECTOR_IVFFLAT_LISTS", "100"))
+PGVECTOR_IVFFLAT_PROBES = int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "10"))
+# pgvector >= 0.8: keep scanning the index until LIMIT rows pass the tenant
+# filter ("relaxed_order" / "strict_order"); empty leaves the server default
+PGVECTOR_ITERATIVE_SCAN = os.getenv("PGVECTOR_ITERATIVE_SCAN", "")
+
+TABLE = "document_embeddings"
+COPY_COLUMNS = "chunk_id, document_id, client_profile_id, chunk_index, chunk_hash, chunk_text, embedding"
+
+
+def vector_literal(vector: list[float]) -> str:
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+def _copy_escape(value) -> str:
+    """
+    Escapes one field for COPY ... FORMAT text.
+    """
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class PgVectorStore(VectorStore):
+    """
+    VectorStore on the pgvector `document_embeddings` table.
+
+    Everything goes through the caller's session: inserts and deletes join
+    the caller's transaction, so dropping a knowledge document and its
+    vectors is one commit (and document_id cascades on delete). API replicas
+    stay stateless, since the only shared state is Postgres.
+
+    The table has one fixed-size vector column and no model column, so
+    only the default embedding model is supported: writes and searches
+    for another model raise ValueError; reads and deletes find nothing.
+    """
+
+    def supports_model(self, embedding_model=None):
+        return embedding_model in (None, EMBEDDING_MODEL)
+
+    def _require_model(self, embedding_model):
+        if not self.supports_model(embedding_model):
+            raise ValueError(f"pgvector only stores {EMBEDDING_MODEL} vectors, not {embedding_model}")
+
+    def open(self):
+        db = SessionLocal()
+        try:
+            self.ensure_index(db)
+            db.commit()
+        finally:
+            db.close()
+        return self
+
+    def ensure_index(self, db: Session):
+        """
+        Creates the configured ANN index if it isn't there yet and drops the
+        other kind, so only one index is maintained on writes and the
+        search-time knob (ef_search / probes) applies to the index the
+        planner uses. The migration creates HNSW; IVFFlat should be built
+        after data is loaded.
+        """
+        indexes = {
+            "hnsw": (
+                f"ix_{TABLE}_embedding_hnsw",
+                "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+            ),
+            "ivfflat": (
+                f"ix_{TABLE}_embedding_ivfflat",
+                f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {PGVECTOR_IVFFLAT_LISTS})",
+            ),
+        }
+        wanted = "ivfflat" if PGVECTOR_INDEX == "ivfflat" else "hnsw"
+        for kind, (name, _) in indexes.items():
+            if kind != wanted:
+                db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        name, using = indexes[wanted]
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} {using}"))
+
+    def add_chunks(self, db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model=None):
+        """
+        Bulk load with COPY into a temp table, then upsert by chunk_id.
+        """
+        self._require_model(embedding_model)
+        buffer = io.StringIO()
+        for chunk_id, vector, chunk_text, meta in zip(ids, embeddings, documents, metadatas):
+            if len(vector) != PGVECTOR_DIMENSIONS:
+                raise ValueError(f"Embedding has {len(vector)} dimensions, table expects {PGVECTOR_DIMENSIONS}")
+            row = [
+                chunk_id,
+                meta["document_id"],
+                client_profile_id,
+                meta.get("chunk_index"),
+                meta.get("chunk_hash"),
+                chunk_text,
+                vector_literal(vector),
+            ]
+            buffer.write("\t".join(_copy_escape(v) for v in row) + "\n")
+        buffer.seek(0)
+
+        with metrics.timer("vector_store.upsert"):
+            db.execute(text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {TABLE}_load "
+                f"(LIKE {TABLE} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            ))
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY {TABLE}_load ({COPY_COLUMNS}) FROM STDIN WITH (FORMAT text)", buffer)
+            finally:
+                cursor.close()
+            db.execute(text(
+                f"INSERT INTO {TABLE} ({COPY_COLUMNS}) "
+                f"SELECT {COPY_COLUMNS} FROM {TABLE}_load "
+                f"ON CONFLICT (chunk_id) DO UPDATE SET "
+                f"chunk_index = EXCLUDED.chunk_index, chunk_hash = EXCLUDED.chunk_hash, "
+                f"chunk_text = EXCLUDED.chunk_text, embedding = EXCLUDED.embedding"
+            ))
+            db.execute(text(f"TRUNCATE {TABLE}_load"))
+
+    def search(self, db, query_embedding, limit, client_profile_id=None, embedding_model=None):
+        self._require_model(embedding_model)
+        tenant_filter = "WHERE client_profile_id = :client_profile_id" if client_profile_id else ""
+
+        with metrics.timer("vector_store.query"):
+            # SET LOCAL only lasts for this transaction
+            if PGVECTOR_INDEX == "ivfflat":
+                db.execute(text(f"SET LOCAL ivfflat.probes = {PGVECTOR_IVFFLAT_PROBES}"))
+            else:
+                db.execute(text(f"SET LOCAL hnsw.ef_search = {PGVECTOR_HNSW_EF_SEARCH}"))
+                if PGVECTOR_ITERATIVE_SCAN:
+                    db.execute(text(f"SET LOCAL hnsw.iterative_scan = {PGVECTOR_ITERATIVE_SCAN}"))
+
+            rows = db.execute(
+                text(
+                    f"SELECT chunk_id, document_id, chunk_text, embedding <=> CAST(:query AS vector) AS distance "
+                    f"FROM {TABLE} {tenant_filter} "
+                    f"ORDER BY embedding <=> CAST(:query AS vector) LIMIT :limit"
+                ),
+                {"query": vector_literal(query_embedding), "limit": limit, "client_profile_id": client_profile_id},
+            ).all()
+
+        return [
+            {
+                "chunk_id": row.chunk_id,
+                "document_id": row.document_id,
+                "chunk_text": row.chunk_text,
+                # Cosine distance is used (0 to 2). Similarity = 1 - distance.
+                "similarity": 1 - row.distance,
+            }
+            for row in rows
+        ]
+
+    def count(self, db, client_profile_id=None, embedding_model=None, limit=None):
+        if not self.supports_model(embedding_model):
+            return 0
+        tenant_filter = "WHERE client_profile_id = :client_profile_id" if client_profile_id else ""
+        rows = f"SELECT 1 FROM {TABLE} {tenant_filter}" + (" LIMIT :limit" if limit is not None else "")
+        return db.execute(
+            text(f"SELECT count(*) FROM ({rows}) AS counted"), {"client_profile_id": client_profile_id, "limit": limit}
+        ).scalar()
+
+    def get_document_chunks(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        if not self.supports_model(embedding_model):
+            return {}
+        with metrics.timer("vector_store.get"):
+            rows = db.execute(
+                text(
+                    f"SELECT chunk_id, document_id, chunk_index, client_profile_id, chunk_hash "
+                    f"FROM {TABLE} WHERE document_id = :doc_id"
+                ),
+                {"doc_id": doc_id},
+            ).all()
+        return {
+            row.chunk_id: {
+                "document_id": row.document_id,
+                "chunk_index": row.chunk_index,
+                "client_profile_id": row.client_profile_id,
+                "chunk_hash": row.chunk_hash,
+            }
+            for row in rows
+        }
+
+    def update_chunk_metadata(self, db, ids, metadatas, client_profile_id=None, embedding_model=None):
+        if not self.supports_model(embedding_model):
+            return
+        # chunk_index is the only mutable metadata
+        with metrics.timer("vector_store.update"):
+            db.execute(
+                text(f"UPDATE {TABLE} SET chunk_index = :chunk_index WHERE chunk_id = :chunk_id"),
+                [{"chunk_id": i, "chunk_index": m.get("chunk_index")} for i, m in zip(ids, metadatas)],
+            )
+
+    def delete_chunks(self, db, ids, client_profile_id=None, embedding_model=None):
+        if not self.supports_model(embedding_model):
+            return
+        with metrics.timer("vector_store.delete"):
+            db.execute(text(f"DELETE FROM {TABLE} WHERE chunk_id = ANY(:ids)"), {"ids": list(ids)})
+
+    def delete_document(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        if not self.supports_model(embedding_model):
+            return
+        with metrics.timer("vector_store.delete"):
+            db.execute(text(f"DELETE FROM {TABLE} WHERE document_id = :doc_id"), {"doc_id": doc_id})
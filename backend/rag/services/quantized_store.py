@@ -0,0 +1,641 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+
+from core.metrics import metrics
+from .vector_store import VectorStore, collection_for_tenant, needs_tenant_filter
+
+QUANTIZED_STORE_DIR = os.getenv(
+    "QUANTIZED_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "vectors"),
+)
+# "int8" (4x smaller than float32), "binary" (32x smaller) or "none" (exact
+# search on the float vectors); fixed per segment when it is created
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+# Candidates rescored with the float vectors per requested hit
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "8"))
+# Rows scanned per block, bounds the temporary float copy of int8 codes
+QUANTIZED_SCAN_BLOCK = int(os.getenv("QUANTIZED_SCAN_BLOCK", "4096"))
+# Rewrite a segment's files once this share of its rows is deleted
+QUANTIZED_COMPACT_RATIO = float(os.getenv("QUANTIZED_COMPACT_RATIO", "0.5"))
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def quantize(vectors: np.ndarray, mode: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (codes, scales) for unit vectors.
+
+    int8: symmetric per-vector scale, v ~= codes * scale.
+    binary: one sign bit per dimension, packed 8 to a byte; scales are
+    unused (1.0).
+    none: no codes, search runs on the float vectors.
+    """
+    if mode == "int8":
+        scales = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if mode == "binary":
+        return np.packbits(vectors > 0, axis=1), np.ones(len(vectors), dtype=np.float32)
+    if mode == "none":
+        return np.zeros((len(vectors), 0), dtype=np.int8), np.ones(len(vectors), dtype=np.float32)
+    raise ValueError(f"Unknown VECTOR_QUANTIZATION mode: {mode}")
+
+
+def approximate_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray, mode: str,
+                       block: int = QUANTIZED_SCAN_BLOCK) -> np.ndarray:
+    """
+    Similarity estimates for every row. int8 is scored asymmetrically
+    (float query against int8 codes); binary by Hamming distance, mapped so
+    that higher is better.
+    """
+    scores = np.empty(len(codes), dtype=np.float32)
+    if mode == "binary":
+        query_bits = np.packbits(query > 0)
+        bits = len(query)
+        for start in range(0, len(codes), block):
+            part = codes[start:start + block]
+            hamming = _POPCOUNT[np.bitwise_xor(part, query_bits)].sum(axis=1, dtype=np.int32)
+            scores[start:start + block] = (bits - 2 * hamming) / bits
+        return scores
+
+    for start in range(0, len(codes), block):
+        part = codes[start:start + block].astype(np.float32)
+        scores[start:start + block] = (part @ query) * scales[start:start + block]
+    return scores
+
+
+class QuantizedSegment:
+    """
+    One collection's chunks in quantized form.
+
+    Files (in `path`):
+        chunks.sqlite3          chunk rows: id, metadata, text, row number
+        vectors.<gen>.f32       unit float32 vectors, memory-mapped, only
+                                the rescored candidates are paged in
+        codes.<gen>.bin         int8 codes or packed sign bits, held in RAM
+        scales.<gen>.f32        per-row int8 scale
+
+    Rows are append-only: replacing a chunk appends a new row and deletes
+    the old one from chunks.sqlite3, which makes it dead. Once dead rows
+    pass `compact_ratio` the files are rewritten under a new generation.
+    Writers serialize on a SQLite write transaction, so the API and the
+    ingestion workers can share a segment; readers reload their in-memory
+    copy when the `version` counter in the meta table moves.
+    """
+
+    def __init__(self, path: str, quantization: str = VECTOR_QUANTIZATION,
+                 rescore_factor: int = QUANTIZED_RESCORE_FACTOR, compact_ratio: float = QUANTIZED_COMPACT_RATIO):
+        self.path = path
+        self.rescore_factor = rescore_factor
+        self.compact_ratio = compact_ratio
+        self._local = threading.local()
+        self._state: Optional[dict] = None
+        self._state_lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " row INTEGER NOT NULL,"
+            " document_id INTEGER,"
+            " chunk_index INTEGER,"
+            " client_profile_id INTEGER,"
+            " chunk_hash TEXT,"
+            " chunk_text TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_chunks_row ON chunks (row);"
+            "CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);"
+        )
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('quantization', ?)", (quantization,))
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+        self.quantization = self._meta(conn, "quantization")
+        self._remove_stale_files()
+
+    # -------------------------
+    # SQLite (one connection per thread)
+    # -------------------------
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "chunks.sqlite3"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, key: str):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _files(self, generation: int) -> dict[str, str]:
+        return {
+            name: os.path.join(self.path, f"{name}.{generation}.{ext}")
+            for name, ext in (("vectors", "f32"), ("codes", "bin"), ("scales", "f32"))
+        }
+
+    def _code_width(self, dim: int) -> int:
+        return {"int8": dim, "binary": (dim + 7) // 8}.get(self.quantization, 0)
+
+    # -------------------------
+    # In-memory state
+    # -------------------------
+    def _load(self) -> dict:
+        """
+        Current in-memory view, reloaded when another writer (or this one)
+        changed the segment. "rows" is 0 while the segment is empty.
+        """
+        conn = self._connection()
+        version = self._meta(conn, "version")
+        state = self._state
+        if state is not None and state["version"] == version:
+            return state
+
+        with self._state_lock:
+            state = self._state
+            if state is not None and state["version"] == version:
+                return state
+            with metrics.timer("quantized_store.load"):
+                state = self._state = self._read_state(conn)
+        return state
+
+    def _read_state(self, conn: sqlite3.Connection) -> dict:
+        for _ in range(3):
+            try:
+                return self._read_committed_state(conn)
+            except FileNotFoundError:
+                # A compaction committed and removed the files between
+                # reading the generation and opening them: read it again
+                continue
+        return self._read_committed_state(conn)
+
+    def _read_committed_state(self, conn: sqlite3.Connection) -> dict:
+        conn.execute("BEGIN")
+        try:
+            version = self._meta(conn, "version")
+            generation = self._meta(conn, "generation")
+            dim = self._meta(conn, "dim")
+            rows = conn.execute("SELECT row, client_profile_id FROM chunks").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        if dim is None or not rows:
+            return {"version": version, "generation": generation, "rows": 0}
+
+        files = self._files(generation)
+        width = self._code_width(dim)
+        # An in-flight writer may have appended past the committed rows
+        count = self._file_rows(files, dim)
+        live = np.zeros(count, dtype=bool)
+        tenants = np.full(count, -1, dtype=np.int64)
+        for row, client_profile_id in rows:
+            if row < count:
+                live[row] = True
+                tenants[row] = client_profile_id if client_profile_id is not None else -1
+
+        return {
+            "version": version,
+            "generation": generation,
+            "rows": count,
+            "dim": dim,
+            "live": live,
+            "tenants": tenants,
+            "codes": np.fromfile(files["codes"], dtype=np.uint8 if self.quantization == "binary" else np.int8,
+                                 count=count * width).reshape(count, width) if width else None,
+            "scales": np.fromfile(files["scales"], dtype=np.float32, count=count),
+            "vectors": np.memmap(files["vectors"], dtype=np.float32, mode="r", shape=(count, dim)),
+        }
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def add(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        if not ids:
+            return
+        vectors = normalize(embeddings)
+        codes, scales = quantize(vectors, self.quantization)
+
+        conn = self._connection()
+        with metrics.timer("quantized_store.add"):
+            # The write transaction is the cross-process lock on the files
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._meta(conn, "dim")
+                if dim is None:
+                    dim = vectors.shape[1]
+                    conn.execute("INSERT INTO meta VALUES ('dim', ?)", (dim,))
+                elif dim != vectors.shape[1]:
+                    raise ValueError(f"Segment {self.path} stores {dim}-d vectors, got {vectors.shape[1]}-d")
+
+                files = self._files(self._meta(conn, "generation"))
+                first_row = self._file_rows(files, dim)
+                # Drop the tail of a write that never committed
+                self._truncate(files, first_row, dim)
+                for name, array in (("vectors", vectors), ("codes", codes), ("scales", scales)):
+                    with open(files[name], "ab") as f:
+                        f.write(np.ascontiguousarray(array).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            chunk_id, first_row + i, meta.get("document_id"), meta.get("chunk_index"),
+                            meta.get("client_profile_id"), meta.get("chunk_hash"), text,
+                        )
+                        for i, (chunk_id, text, meta) in enumerate(zip(ids, documents, metadatas))
+                    ],
+                )
+                self._bump_version(conn)
+                stale = self._maybe_compact(conn, dim)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._remove_files(stale)
+
+    def _file_rows(self, files: dict[str, str], dim: int) -> int:
+        if not os.path.exists(files["vectors"]):
+            return 0
+        width = self._code_width(dim)
+        return min(
+            os.path.getsize(files["vectors"]) // (dim * 4),
+            os.path.getsize(files["codes"]) // width if width else float("inf"),
+            os.path.getsize(files["scales"]) // 4,
+        )
+
+    def _truncate(self, files: dict[str, str], rows: int, dim: int):
+        sizes = {"vectors": rows * dim * 4, "codes": rows * self._code_width(dim), "scales": rows * 4}
+        for name, size in sizes.items():
+            if os.path.exists(files[name]) and os.path.getsize(files[name]) > size:
+                os.truncate(files[name], size)
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def _delete_where(self, clause: str, params: list):
+        conn = self._connection()
+        stale = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute(f"DELETE FROM chunks WHERE {clause}", params).rowcount
+            if deleted:
+                self._bump_version(conn)
+                dim = self._meta(conn, "dim")
+                if dim is not None:
+                    stale = self._maybe_compact(conn, dim)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._remove_files(stale)
+
+    def delete(self, ids: list[str]):
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            self._delete_where(f"chunk_id IN ({','.join('?' * len(part))})", part)
+
+    def delete_document(self, document_id: int):
+        self._delete_where("document_id = ?", [document_id])
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE chunks SET document_id = ?, chunk_index = ?, client_profile_id = ?, chunk_hash = ? "
+                "WHERE chunk_id = ?",
+                [
+                    (meta.get("document_id"), meta.get("chunk_index"), meta.get("client_profile_id"),
+                     meta.get("chunk_hash"), chunk_id)
+                    for chunk_id, meta in zip(ids, metadatas)
+                ],
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _maybe_compact(self, conn: sqlite3.Connection, dim: int) -> list[str]:
+        """
+        Rewrites the files without dead rows. Runs inside the caller's
+        write transaction; the new generation becomes visible on commit.
+        Returns the old generation's files, which the caller removes only
+        after the commit: until then they are still the committed state.
+        Readers still mapping them keep them until they reload (unlinked
+        files stay readable on POSIX).
+        """
+        generation = self._meta(conn, "generation")
+        files = self._files(generation)
+        if not os.path.exists(files["vectors"]):
+            return []
+        total = self._file_rows(files, dim)
+        live_rows = [r[0] for r in conn.execute("SELECT row FROM chunks ORDER BY row")]
+        if total < 1000 or len(live_rows) > total * (1 - self.compact_ratio):
+            return []
+
+        with metrics.timer("quantized_store.compact"):
+            width = self._code_width(dim)
+            old = {
+                "vectors": np.memmap(files["vectors"], dtype=np.float32, mode="r", shape=(total, dim)),
+                "codes": np.memmap(files["codes"], dtype=np.uint8, mode="r", shape=(total, width)) if width else None,
+                "scales": np.memmap(files["scales"], dtype=np.float32, mode="r", shape=(total,)),
+            }
+            new_files = self._files(generation + 1)
+            open(new_files["codes"], "wb").close()
+            keep = np.asarray(live_rows, dtype=np.int64)
+            for name, array in old.items():
+                if array is None:
+                    continue
+                with open(new_files[name], "wb") as f:
+                    f.write(np.ascontiguousarray(array[keep]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS renumber (old INTEGER PRIMARY KEY, new INTEGER)")
+            conn.execute("DELETE FROM renumber")
+            conn.executemany("INSERT INTO renumber VALUES (?, ?)", [(row, i) for i, row in enumerate(live_rows)])
+            conn.execute("UPDATE chunks SET row = (SELECT new FROM renumber WHERE old = chunks.row)")
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation + 1,))
+        metrics.incr("quantized_store.compactions")
+        return [path for path in files.values() if os.path.exists(path)]
+
+    @staticmethod
+    def _remove_files(paths: list[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_stale_files(self):
+        """
+        Removes data files of any generation but the current one: left by
+        a crash between a compaction's commit and its cleanup, or by a
+        compaction that rolled back. Holds the write lock, so no writer
+        is producing a new generation meanwhile.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = set(self._files(self._meta(conn, "generation")).values())
+            stale = [
+                os.path.join(self.path, name)
+                for name in os.listdir(self.path)
+                if name.split(".")[0] in ("vectors", "codes", "scales")
+                and os.path.join(self.path, name) not in current
+            ]
+            self._remove_files(stale)
+        finally:
+            conn.execute("COMMIT")
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def search(self, query_embedding: list[float], limit: int, client_profile_id: int = None) -> list[dict]:
+        for _ in range(2):
+            state = self._load()
+            if not state["rows"]:
+                return []
+            hits = self._search(state, query_embedding, limit, client_profile_id)
+            if hits is not None:
+                return hits
+            # Compacted between loading and fetching: reload once
+        return []
+
+    def _search(self, state: dict, query_embedding, limit: int, client_profile_id: int = None) -> Optional[list[dict]]:
+        query = normalize(query_embedding)[0]
+        if len(query) != state["dim"]:
+            raise ValueError(f"Query has {len(query)} dimensions, segment {self.path} stores {state['dim']}")
+
+        mask = state["live"]
+        if client_profile_id is not None:
+            mask = mask & (state["tenants"] == client_profile_id)
+        matching = int(mask.sum())
+        if not matching or limit <= 0:
+            return []
+
+        exact_scan = self.quantization == "none"
+        with metrics.timer("quantized_store.scan"):
+            if exact_scan:
+                # One matrix-vector product over the memory-mapped vectors
+                scores = np.asarray(state["vectors"]).dot(query)
+            else:
+                scores = approximate_scores(state["codes"], state["scales"], query, self.quantization)
+            if matching < len(scores):
+                scores[~mask] = -np.inf
+            count = min(matching, limit if exact_scan else limit * self.rescore_factor)
+            candidates = np.argpartition(-scores, count - 1)[:count] if count < len(scores) else np.arange(len(scores))
+            candidates = np.sort(candidates[np.isfinite(scores[candidates])])
+
+        with metrics.timer("quantized_store.rescore"):
+            exact = scores[candidates] if exact_scan else np.asarray(state["vectors"][candidates]) @ query
+            order = np.argsort(-exact)[:limit]
+            rows = [int(candidates[i]) for i in order]
+            similarity = {int(candidates[i]): float(exact[i]) for i in order}
+
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            if self._meta(conn, "generation") != state["generation"]:
+                return None
+            placeholders = ",".join("?" * len(rows))
+            found = {
+                row: (chunk_id, document_id, chunk_text)
+                for row, chunk_id, document_id, chunk_text in conn.execute(
+                    f"SELECT row, chunk_id, document_id, chunk_text FROM chunks WHERE row IN ({placeholders})", rows
+                )
+            }
+        finally:
+            conn.execute("COMMIT")
+
+        return [
+            {
+                "chunk_id": found[row][0],
+                "document_id": found[row][1],
+                "chunk_text": found[row][2],
+                "similarity": similarity[row],
+            }
+            for row in rows
+            if row in found
+        ]
+
+    def count(self, client_profile_id: int = None) -> int:
+        state = self._load()
+        if not state["rows"]:
+            return 0
+        if client_profile_id is None:
+            return int(state["live"].sum())
+        return int((state["live"] & (state["tenants"] == client_profile_id)).sum())
+
+    def export(self, batch_size: int = 1000):
+        """
+        Yields (ids, embeddings, documents, metadatas) batches of the live
+        chunks, in add() form.
+        """
+        state = self._load()
+        if not state["rows"]:
+            return
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT row, chunk_id, document_id, chunk_index, client_profile_id, chunk_hash, chunk_text "
+            "FROM chunks ORDER BY row"
+        ).fetchall()
+        for start in range(0, len(rows), batch_size):
+            part = [r for r in rows[start:start + batch_size] if r[0] < state["rows"]]
+            metadatas = []
+            for _, _, document_id, chunk_index, client_profile_id, chunk_hash, _ in part:
+                meta = {"document_id": document_id, "chunk_index": chunk_index, "client_profile_id": client_profile_id}
+                if chunk_hash is not None:
+                    meta["chunk_hash"] = chunk_hash
+                metadatas.append(meta)
+            yield (
+                [r[1] for r in part],
+                np.asarray(state["vectors"][[r[0] for r in part]]).tolist(),
+                [r[6] for r in part],
+                metadatas,
+            )
+
+    def loaded_bytes(self) -> int:
+        """
+        Memory the loaded segment keeps warm: its in-RAM arrays, plus the
+        float matrix when every search scans all of it (exact mode).
+        """
+        state = self._state
+        if not state or not state["rows"]:
+            return 0
+        size = sum(state[name].nbytes for name in ("codes", "scales", "live", "tenants") if state[name] is not None)
+        return size + (state["vectors"].nbytes if self.quantization == "none" else 0)
+
+    def unload(self):
+        self._state = None
+
+    def document_chunks(self, document_id: int) -> dict[str, dict]:
+        rows = self._connection().execute(
+            "SELECT chunk_id, document_id, chunk_index, client_profile_id, chunk_hash FROM chunks WHERE document_id = ?",
+            (document_id,),
+        )
+        chunks = {}
+        for chunk_id, doc_id, chunk_index, client_profile_id, chunk_hash in rows:
+            meta = {"document_id": doc_id, "chunk_index": chunk_index, "client_profile_id": client_profile_id}
+            if chunk_hash is not None:
+                meta["chunk_hash"] = chunk_hash
+            chunks[chunk_id] = meta
+        return chunks
+
+    def stats(self) -> dict:
+        """
+        Resident memory of the loaded segment next to what the same live
+        vectors take as float32 (the Chroma / in-RAM baseline).
+        """
+        state = self._state
+        if not state or not state["rows"]:
+            return {"quantization": self.quantization, "rows": 0, "live": 0, "ram_bytes": 0, "float32_bytes": 0}
+        live = int(state["live"].sum())
+        ram = sum(state[name].nbytes for name in ("codes", "scales", "live", "tenants") if state[name] is not None)
+        return {
+            "quantization": self.quantization,
+            "rows": state["rows"],
+            "live": live,
+            "ram_bytes": ram,
+            "float32_bytes": live * state["dim"] * 4,
+        }
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    VectorStore on local quantized segments, one per collection name from
+    `collection_for_tenant` (so VECTOR_SHARDING applies as with Chroma).
+    Search scans the compact codes in RAM and rescores the best
+    `limit * QUANTIZED_RESCORE_FACTOR` candidates against the float
+    vectors on disk.
+    """
+
+    def __init__(self, path: str = QUANTIZED_STORE_DIR, quantization: str = VECTOR_QUANTIZATION):
+        self.path = path
+        self.quantization = quantization
+        self._segments: dict[str, QuantizedSegment] = {}
+        self._lock = threading.Lock()
+
+    def segment(self, name: str, create: bool = True) -> Optional[QuantizedSegment]:
+        segment = self._segments.get(name)
+        if segment is None:
+            path = os.path.join(self.path, name)
+            if not create and not os.path.exists(path):
+                return None
+            with self._lock:
+                segment = self._segments.get(name)
+                if segment is None:
+                    segment = self._segments[name] = QuantizedSegment(path, self.quantization)
+        return segment
+
+    def _tenant_segment(self, client_profile_id, embedding_model, create: bool = True):
+        return self.segment(collection_for_tenant(client_profile_id, embedding_model=embedding_model), create)
+
+    def close(self):
+        with self._lock:
+            self._segments.clear()
+
+    def add_chunks(self, db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model=None):
+        self._tenant_segment(client_profile_id, embedding_model).add(ids, embeddings, documents, metadatas)
+
+    def search(self, db, query_embedding, limit, client_profile_id=None, embedding_model=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        if segment is None:
+            return []
+        tenant = client_profile_id if client_profile_id and needs_tenant_filter() else None
+        with metrics.timer("vector_store.query"):
+            return segment.search(query_embedding, limit, tenant)
+
+    def count(self, db, client_profile_id=None, embedding_model=None, limit=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        if segment is None:
+            return 0
+        total = segment.count(client_profile_id if client_profile_id and needs_tenant_filter() else None)
+        return min(total, limit) if limit is not None else total
+
+    def get_document_chunks(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        return segment.document_chunks(doc_id) if segment else {}
+
+    def update_chunk_metadata(self, db, ids, metadatas, client_profile_id=None, embedding_model=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        if segment:
+            segment.update_metadata(ids, metadatas)
+
+    def delete_chunks(self, db, ids, client_profile_id=None, embedding_model=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        if segment:
+            segment.delete(ids)
+
+    def delete_document(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        segment = self._tenant_segment(client_profile_id, embedding_model, create=False)
+        if segment:
+            segment.delete_document(doc_id)
+
+    def stats(self) -> dict:
+        segments = [segment.stats() for segment in list(self._segments.values())]
+        ram = sum(s["ram_bytes"] for s in segments)
+        baseline = sum(s["float32_bytes"] for s in segments)
+        return {
+            "backend": "quantized",
+            "quantization": self.quantization,
+            "segments_loaded": sum(1 for s in segments if s["rows"]),
+            "live_chunks": sum(s["live"] for s in segments),
+            "ram_bytes": ram,
+            "float32_bytes": baseline,
+            "memory_saving": round(1 - ram / baseline, 4) if baseline else 0.0,
+        }
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from core.metrics import metrics
+from .local_embedder import LOCAL_EMBED_INTRA_OP_THREADS, MODELS_DIR
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL_DIR = os.getenv("RERANK_MODEL_DIR", os.path.join(MODELS_DIR, "ms-marco-MiniLM-L-6-v2"))
+# Hits fetched for the cross-encoder to choose from, and how many it keeps
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+# Most time re-ranking may take; fewer candidates are scored to stay under it
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))
+# Time that must be left for answer generation after re-ranking
+RERANK_RESERVE_SECONDS = float(os.getenv("RERANK_RESERVE_SECONDS", "3"))
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder (e.g. an exported ms-marco-MiniLM-L-6-v2) run in-process
+    with ONNX Runtime. `model_dir` holds `model.onnx` and `tokenizer.json`.
+    Query and passage are encoded as one pair; the output is a relevance
+    logit per pair ([batch, 1], or [batch, 2] for two-class heads).
+    """
+
+    def __init__(self, model_dir: str, max_length: int = RERANK_MAX_LENGTH,
+                 intra_op_threads: int = LOCAL_EMBED_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        logits = self.session.run(None, feeds)[0]
+        return (logits[:, -1] if logits.ndim == 2 else logits).astype(np.float32)
+
+
+class Reranker:
+    """
+    Re-orders retrieval hits by cross-encoder score and keeps the top k.
+
+    The cost of a query-passage pair is tracked as a moving average, so
+    the number of candidates scored can be cut to fit `budget_ms` (and the
+    request's remaining time) before any inference runs. Hits that would
+    not fit are skipped, not half-scored.
+    """
+
+    def __init__(self, model, batch_size: int = RERANK_BATCH_SIZE, budget_ms: float = RERANK_BUDGET_MS,
+                 reserve_seconds: float = RERANK_RESERVE_SECONDS):
+        self.model = model
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self.reserve = reserve_seconds
+        # Seconds per pair; starts pessimistic until the first batch is timed
+        self.pair_seconds = 0.005
+        self._lock = threading.Lock()
+
+    def affordable(self, time_left: Optional[float] = None) -> int:
+        """
+        How many candidates can be scored within the budget and, with a
+        deadline, without eating into the generation reserve.
+        """
+        budget = self.budget
+        if time_left is not None:
+            budget = min(budget, time_left - self.reserve)
+        if budget <= 0:
+            return 0
+        return int(budget / self.pair_seconds)
+
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        scores = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            start = time.perf_counter()
+            scores.append(self.model.score(query, batch))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.pair_seconds = 0.8 * self.pair_seconds + 0.2 * elapsed / len(batch)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+    def rerank(self, query: str, hits: list[dict], top_k: int = RERANK_TOP_K,
+               time_left: Optional[float] = None) -> Optional[list[dict]]:
+        """
+        Top `top_k` hits with a `rerank_score`, or None when there is no
+        time to score even `top_k` candidates (the caller keeps the
+        retrieval order).
+        """
+        count = min(len(hits), self.affordable(time_left))
+        if count < min(top_k, len(hits)) or not hits:
+            metrics.incr("rerank.skipped")
+            return None
+
+        # Retrieval order decides which candidates make the cut
+        candidates = hits[:count]
+        with metrics.timer("rerank.score"):
+            scores = self.score(query, [hit["chunk_text"] for hit in candidates])
+        metrics.incr("rerank.pairs", len(candidates))
+
+        order = np.argsort(-scores)[:top_k]
+        return [{**candidates[i], "rerank_score": float(scores[i])} for i in order]
+
+
+def reranker_available() -> bool:
+    return RERANK_ENABLED and os.path.exists(os.path.join(RERANK_MODEL_DIR, "model.onnx"))
+
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker(OnnxCrossEncoder(RERANK_MODEL_DIR))
+    return _reranker
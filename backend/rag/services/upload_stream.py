@@ -0,0 +1,222 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+import anyio
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+
+from user.models import KnowledgeDocument
+from .job_queue import enqueue_job
+
+# Bytes written to disk per write call
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+MB = 1024 * 1024
+PLAN_UPLOAD_LIMITS = {
+    "basic": int(os.getenv("UPLOAD_LIMIT_BASIC", str(10 * MB))),
+    "pro": int(os.getenv("UPLOAD_LIMIT_PRO", str(50 * MB))),
+}
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def upload_limit_for_plan(plan: str) -> int:
+    return PLAN_UPLOAD_LIMITS.get(plan or "basic", PLAN_UPLOAD_LIMITS["basic"])
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StreamedUpload:
+    file_path: str
+    file_name: str
+    content_type: str
+    size: int
+    sha256: str
+
+
+async def stream_upload(request: Request, upload_dir: str, max_bytes: int, field_name: str = "file") -> StreamedUpload:
+    """
+    Streams the `field_name` part of a multipart request body straight to
+    disk, without spooling the whole request first. The SHA-256 and byte
+    count are computed on the fly, and the upload is rejected with 413 as
+    soon as it crosses `max_bytes`.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError(400, "Expected a multipart/form-data upload")
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadError(413, f"File exceeds the {max_bytes / MB:g} MB limit for your plan")
+
+    hasher = hashlib.sha256()
+    pending = bytearray()
+    state = {
+        "headers": {},
+        "field": b"",
+        "value": b"",
+        "in_file": False,
+        "found": False,
+        "file_name": None,
+        "content_type": None,
+        "size": 0,
+    }
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition"))
+        if state["found"] or disposition.get(b"name") != field_name.encode() or b"filename" not in disposition:
+            return
+        state["in_file"] = True
+        state["found"] = True
+        state["file_name"] = os.path.basename(disposition[b"filename"].decode("utf-8", "replace"))
+        part_type = state["headers"].get(b"content-type")
+        state["content_type"] = part_type.decode("latin-1") if part_type else None
+
+    def on_part_data(data, start, end):
+        if not state["in_file"]:
+            return
+        piece = data[start:end]
+        state["size"] += len(piece)
+        if state["size"] > max_bytes:
+            raise UploadError(413, f"File exceeds the {max_bytes / MB:g} MB limit for your plan")
+        hasher.update(piece)
+        pending.extend(piece)
+
+    def on_part_end():
+        state["in_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    # Filesystem calls go to a worker thread like the writes themselves
+    await anyio.to_thread.run_sync(lambda: os.makedirs(upload_dir, exist_ok=True))
+    tmp_path = os.path.join(upload_dir, f"{uuid.uuid4()}.part")
+
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                while len(pending) >= UPLOAD_CHUNK_SIZE:
+                    await out.write(bytes(pending[:UPLOAD_CHUNK_SIZE]))
+                    del pending[:UPLOAD_CHUNK_SIZE]
+            parser.finalize()
+            if pending:
+                await out.write(bytes(pending))
+
+        if not state["found"]:
+            raise UploadError(400, f"No '{field_name}' file in upload")
+        if state["size"] == 0:
+            raise UploadError(400, "Uploaded file is empty")
+
+        file_ext = os.path.splitext(state["file_name"])[1]
+        file_path = os.path.join(upload_dir, f"{uuid.uuid4()}{file_ext}")
+        await anyio.to_thread.run_sync(os.replace, tmp_path, file_path)
+
+    except BaseException:
+        # Also runs when the client disconnects and the request is cancelled
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(remove_upload, tmp_path)
+        raise
+
+    return StreamedUpload(
+        file_path=file_path,
+        file_name=state["file_name"],
+        content_type=state["content_type"],
+        size=state["size"],
+        sha256=hasher.hexdigest(),
+    )
+
+
+def remove_upload(file_path: str):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def register_upload(db: Session, client_profile_id: int, upload: StreamedUpload) -> dict:
+    """
+    Creates (or versions) the KnowledgeDocument for a stored upload and
+    queues it for ingestion. Content already in the tenant's knowledge
+    base is not processed again.
+    """
+    duplicate = (
+        db.query(KnowledgeDocument)
+        .filter_by(client_profile_id=client_profile_id, content_hash=upload.sha256)
+        .filter(KnowledgeDocument.processing_error.is_(None))
+        .first()
+    )
+    if duplicate:
+        remove_upload(upload.file_path)
+        return {
+            "message": "File already uploaded",
+            "document_id": duplicate.id,
+            "version": duplicate.version,
+            "duplicate": True,
+        }
+
+    # Re-uploads of the same file become a new version of the existing
+    # document, so the pipeline can re-embed only the chunks that changed
+    kb_doc = (
+        db.query(KnowledgeDocument)
+        .filter_by(client_profile_id=client_profile_id, file_name=upload.file_name)
+        .order_by(KnowledgeDocument.id.desc())
+        .first()
+    )
+    if kb_doc:
+        kb_doc.version = (kb_doc.version or 1) + 1
+        kb_doc.file_type = upload.content_type
+        kb_doc.file_size = upload.size
+        kb_doc.content_hash = upload.sha256
+        kb_doc.processed = False
+        kb_doc.processing_error = None
+    else:
+        kb_doc = KnowledgeDocument(
+            client_profile_id=client_profile_id,
+            file_name=upload.file_name,
+            file_type=upload.content_type,
+            file_size=upload.size,
+            content_hash=upload.sha256,
+        )
+        db.add(kb_doc)
+    db.commit()
+    db.refresh(kb_doc)
+
+    # Queue for the ingestion workers (python -m rag.worker)
+    job = enqueue_job(db, kb_doc, upload.file_path)
+
+    return {
+        "message": "File uploaded successfully",
+        "document_id": kb_doc.id,
+        "version": kb_doc.version,
+        "job_id": job.id,
+        "duplicate": False,
+    }
@@ -1,25 +1,401 @@
+import hashlib
 import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import Optional
+import anyio
 import chromadb
 from sqlalchemy.orm import Session
 from user.models import KnowledgeDocument
+from core.metrics import metrics
+from .embedder import EMBEDDING_MODEL, LOCAL_EMBEDDING_MODELS
+from .local_embedder import missing_model_files, model_dir_for
+
+# Which VectorStore implementation the app uses: "chroma", "pgvector" or
+# "quantized" (int8 / binary codes with float rescoring, see quantized_store)
+# or "exact" (per-tenant exact search, promoted to an ANN backend when large,
+# see exact_store)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
 
 # Path to store ChromaDB data
 CHROMA_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "chroma_db")
 
+COLLECTION_NAME = "document_embeddings"
+
+# Sharding mode (Chroma backend):
+#   global - every tenant in COLLECTION_NAME, filtered by client_profile_id
+#   tenant - one collection per client_profile_id
+#   bucket - tenants hashed into VECTOR_SHARD_BUCKETS collections
+# Existing data is moved out of the global collection with
+# `python -m rag.migrate_shards`.
+VECTOR_SHARDING = os.getenv("VECTOR_SHARDING", "global")
+VECTOR_SHARD_BUCKETS = int(os.getenv("VECTOR_SHARD_BUCKETS", "64"))
+# Worker threads that async request handlers may occupy with vector searches
+VECTOR_SEARCH_THREADS = int(os.getenv("VECTOR_SEARCH_THREADS", "16"))
+
+
+def collection_for_tenant(client_profile_id: int = None, sharding: str = None, embedding_model: str = None) -> str:
+    """
+    Collection holding a tenant's chunks. Vectors from a non-default
+    embedding model (other dimensions, other space) live in their own
+    `document_embeddings_<model>` family of collections.
+    """
+    sharding = sharding or VECTOR_SHARDING
+    base = COLLECTION_NAME
+    if embedding_model and embedding_model != EMBEDDING_MODEL:
+        base = f"{COLLECTION_NAME}_{re.sub(r'[^a-zA-Z0-9]', '_', embedding_model)}"
+
+    if client_profile_id is None or sharding == "global":
+        return base
+    if sharding == "tenant":
+        return f"{base}_t{client_profile_id}"
+    if sharding == "bucket":
+        digest = hashlib.md5(str(client_profile_id).encode()).hexdigest()
+        return f"{base}_b{int(digest, 16) % VECTOR_SHARD_BUCKETS}"
+    raise ValueError(f"Unknown VECTOR_SHARDING mode: {sharding}")
+
+
+def needs_tenant_filter() -> bool:
+    """
+    Per-tenant collections hold a single tenant, so the metadata filter
+    (and its cost) can be skipped.
+    """
+    return VECTOR_SHARDING != "tenant"
+
+
+class VectorStore(ABC):
+    """
+    Storage for chunk embeddings, scoped by tenant (client_profile_id).
+
+    Chunk metadata always carries document_id, chunk_index and
+    client_profile_id (plus chunk_hash for incremental re-ingestion).
+    Search hits are dicts with document_id, chunk_text and similarity.
+
+    `db` is the caller's session. Backends that live in Postgres write
+    through it, so their changes commit or roll back together with the
+    caller's knowledge_documents changes. `embedding_model` keeps vectors
+    of different models apart (None means the default Gemini model).
+    """
+
+    def open(self):
+        return self
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+    def supports_model(self, embedding_model: str = None) -> bool:
+        """Whether vectors of `embedding_model` can be stored here."""
+        return True
+
+    @abstractmethod
+    def count(self, db: Session, client_profile_id: int = None, embedding_model: str = None,
+              limit: int = None) -> int:
+        """
+        Number of stored chunks, for one tenant when client_profile_id is
+        given. With `limit` counting may stop there (1 is enough to tell
+        whether a tenant has any chunks).
+        """
+
+    @abstractmethod
+    def add_chunks(self, db: Session, client_profile_id: int, ids: list[str], embeddings: list[list[float]],
+                   documents: list[str], metadatas: list[dict], embedding_model: str = None):
+        """Insert or replace chunks by id."""
+
+    @abstractmethod
+    def search(self, db: Session, query_embedding: list[float], limit: int, client_profile_id: int = None,
+               embedding_model: str = None) -> list[dict]:
+        """Nearest chunks by cosine similarity, best first."""
+
+    @abstractmethod
+    def get_document_chunks(self, db: Session, doc_id: int, client_profile_id: int = None,
+                            embedding_model: str = None) -> dict[str, dict]:
+        """{chunk_id: metadata} for every stored chunk of a document."""
+
+    @abstractmethod
+    def update_chunk_metadata(self, db: Session, ids: list[str], metadatas: list[dict], client_profile_id: int = None,
+                              embedding_model: str = None):
+        """Metadata-only update; vectors are left untouched."""
+
+    @abstractmethod
+    def delete_chunks(self, db: Session, ids: list[str], client_profile_id: int = None, embedding_model: str = None):
+        """Delete chunks by id."""
+
+    @abstractmethod
+    def delete_document(self, db: Session, doc_id: int, client_profile_id: int = None, embedding_model: str = None):
+        """Delete every chunk of a document."""
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Process-wide handle on the Chroma database.
+
+    The PersistentClient is opened once (at app/worker startup, or lazily on
+    first use) and collection handles are cached, so a query costs one
+    collection.query call instead of a client construction. Writes are
+    serialized; reads run concurrently. Every operation is timed into
+    `metrics` as vector_store.<op>.
+    """
+
+    def __init__(self, path: str = CHROMA_DB_PATH):
+        self.path = path
+        self._client = None
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def open(self):
+        with self._lock:
+            self._open_client()
+        return self
+
+    def _open_client(self):
+        # Caller holds self._lock
+        if self._client is None:
+            with metrics.timer("vector_store.open"):
+                # Ensure the directory exists
+                os.makedirs(self.path, exist_ok=True)
+                self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            self._collections.clear()
+        close = getattr(client, "close", None)
+        if close:
+            close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None
+
+    def collection(self, name: str = COLLECTION_NAME, create: bool = True):
+        """
+        Cached collection handle. With create=False a missing collection
+        returns None, so reads for an unknown shard don't create one.
+        """
+        handle = self._collections.get(name)
+        if handle is not None:
+            return handle
+
+        # The client is opened and used under the lock, so a concurrent
+        # close() (lifespan shutdown) can't swap it out mid-lookup
+        with self._lock:
+            handle = self._collections.get(name)
+            if handle is None:
+                client = self._open_client()
+                if create:
+                    # Using cosine distance (hnsw:space = "cosine")
+                    handle = client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+                else:
+                    try:
+                        handle = client.get_collection(name=name)
+                    except Exception:
+                        return None
+                self._collections[name] = handle
+        return handle
+
+    def drop_collection(self, name: str):
+        with self._write_lock, self._lock:
+            self._open_client().delete_collection(name)
+            self._collections.pop(name, None)
+
+    def list_collections(self) -> list[str]:
+        with self._lock:
+            client = self._open_client()
+        return [c if isinstance(c, str) else c.name for c in client.list_collections()]
+
+    # -------------------------
+    # Raw collection operations
+    # -------------------------
+    def upsert(self, ids, embeddings, documents, metadatas, collection: str = COLLECTION_NAME):
+        with metrics.timer("vector_store.upsert"), self._write_lock:
+            self.collection(collection).upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embedding: list[float], limit: int, where: dict = None, collection: str = COLLECTION_NAME):
+        with metrics.timer("vector_store.query"):
+            handle = self.collection(collection, create=False)
+            if handle is None:
+                return None
+            return handle.query(
+                query_embeddings=[query_embedding],
+                n_results=limit,
+                where=where,
+            )
+
+    def get(self, where: dict, include: list[str], collection: str = COLLECTION_NAME, limit: int = None, offset: int = None):
+        with metrics.timer("vector_store.get"):
+            handle = self.collection(collection, create=False)
+            if handle is None:
+                return {"ids": [], "metadatas": [], "documents": [], "embeddings": []}
+            return handle.get(where=where, include=include, limit=limit, offset=offset)
+
+    def update(self, ids: list[str], metadatas: list[dict], collection: str = COLLECTION_NAME):
+        with metrics.timer("vector_store.update"), self._write_lock:
+            self.collection(collection).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: list[str] = None, where: dict = None, collection: str = COLLECTION_NAME):
+        with metrics.timer("vector_store.delete"), self._write_lock:
+            handle = self.collection(collection, create=False)
+            if handle is not None:
+                handle.delete(ids=ids, where=where)
+
+    # -------------------------
+    # VectorStore interface
+    # -------------------------
+    def add_chunks(self, db, client_profile_id, ids, embeddings, documents, metadatas, embedding_model=None):
+        # upsert, so a retried ingestion job doesn't trip over its own earlier chunks
+        collection = collection_for_tenant(client_profile_id, embedding_model=embedding_model)
+        self.upsert(ids, embeddings, documents, metadatas, collection=collection)
+
+    def search(self, db, query_embedding, limit, client_profile_id=None, embedding_model=None):
+        collection = collection_for_tenant(client_profile_id, embedding_model=embedding_model)
+
+        where_filter = {}
+        if client_profile_id and needs_tenant_filter():
+            where_filter["client_profile_id"] = client_profile_id
+
+        results = self.query(
+            query_embedding,
+            limit,
+            where=where_filter if where_filter else None,
+            collection=collection,
+        )
+
+        # Chroma returns a dict with lists of lists (one list per query vector)
+        # results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0]
+
+        if not results or not results['ids'] or not results['ids'][0]:
+            return []
+
+        hits = []
+        num_hits = len(results['ids'][0])
+
+        for i in range(num_hits):
+            meta = results['metadatas'][0][i]
+            doc_text = results['documents'][0][i]
+            distance = results['distances'][0][i]
+
+            # Cosine distance is used (0 to 2). Similarity = 1 - distance.
+            similarity = 1 - distance
+
+            hits.append({
+                "chunk_id": results['ids'][0][i],
+                "document_id": meta["document_id"],
+                "chunk_text": doc_text,
+                "similarity": similarity
+            })
+
+        return hits
+
+    def count(self, db, client_profile_id=None, embedding_model=None, limit=None):
+        handle = self.collection(collection_for_tenant(client_profile_id, embedding_model=embedding_model), create=False)
+        if handle is None:
+            return 0
+        if client_profile_id and needs_tenant_filter():
+            # Chroma has no filtered count: this fetches the matching ids,
+            # so a full count is O(tenant size); `limit` caps it
+            return len(handle.get(where={"client_profile_id": client_profile_id}, include=[], limit=limit)["ids"])
+        total = handle.count()
+        return min(total, limit) if limit is not None else total
+
+    def get_document_chunks(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        result = self.get(
+            where={"document_id": doc_id},
+            include=["metadatas"],
+            collection=collection_for_tenant(client_profile_id, embedding_model=embedding_model),
+        )
+        return dict(zip(result["ids"], result["metadatas"]))
+
+    def update_chunk_metadata(self, db, ids, metadatas, client_profile_id=None, embedding_model=None):
+        collection = collection_for_tenant(client_profile_id, embedding_model=embedding_model)
+        self.update(ids=ids, metadatas=metadatas, collection=collection)
+
+    def delete_chunks(self, db, ids, client_profile_id=None, embedding_model=None):
+        self.delete(ids=ids, collection=collection_for_tenant(client_profile_id, embedding_model=embedding_model))
+
+    def delete_document(self, db, doc_id, client_profile_id=None, embedding_model=None):
+        collection = collection_for_tenant(client_profile_id, embedding_model=embedding_model)
+        self.delete(where={"document_id": doc_id}, collection=collection)
+
+
+def check_embedding_model(embedding_model: Optional[str]):
+    """
+    Raises ValueError unless `embedding_model` (None: the default) is a
+    known model whose vectors the configured backend can store and, for a
+    local model, whose files are installed on this host.
+    """
+    if embedding_model is None or embedding_model == EMBEDDING_MODEL:
+        return
+    if embedding_model not in LOCAL_EMBEDDING_MODELS:
+        raise ValueError(f"Unknown embedding model: {embedding_model}")
+    if not vector_store.supports_model(embedding_model):
+        raise ValueError(f"Embedding model {embedding_model} is not supported by the {VECTOR_STORE_BACKEND} backend")
+    missing = missing_model_files(embedding_model)
+    if missing:
+        raise ValueError(
+            f"Embedding model {embedding_model} is not installed on this server "
+            f"(missing {', '.join(missing)} in {model_dir_for(embedding_model)})"
+        )
+
+
+def create_vector_store(backend: str = VECTOR_STORE_BACKEND) -> VectorStore:
+    if backend == "chroma":
+        return chroma_store
+    if backend == "pgvector":
+        from .pgvector_store import PgVectorStore
+        return PgVectorStore()
+    if backend == "quantized":
+        from .quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore()
+    if backend == "exact":
+        from .exact_store import ExactVectorStore
+        return ExactVectorStore()
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+
+
+# single shared instances; the configured one is opened/closed by the app
+# lifespan and rag.worker
+chroma_store = ChromaVectorStore()
+vector_store = create_vector_store()
+
+
 def get_chroma_client():
-    # Ensure the directory exists
-    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
-    return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    with chroma_store._lock:
+        return chroma_store._open_client()
+
 
 def get_collection():
-    client = get_chroma_client()
-    # Using cosine distance (hnsw:space = "cosine")
-    return client.get_or_create_collection(name="document_embeddings", metadata={"hnsw:space": "cosine"})
+    return chroma_store.collection()
 
-def store_embeddings(db: Session, doc_id: int, chunks: list[str], embeddings: list[list[float]]):
+
+def store_embeddings(
+    db: Session,
+    doc_id: int,
+    chunks: list[str],
+    embeddings: list[list[float]],
+    ids: list[str] = None,
+    chunk_indices: list[int] = None,
+    chunk_hashes: list[str] = None,
+    embedding_model: str = None,
+):
     """
-    Stores chunks + embeddings to ChromaDB.
+    Stores chunks + embeddings in the configured vector store.
+
+    `ids`, `chunk_indices` and `chunk_hashes` are set by incremental
+    re-ingestion; by default chunks are numbered {doc_id}_{chunk_index}.
     """
+    if not chunks:
+        return
+
     # Fetch document to get client_profile_id for metadata filtering
     doc = db.query(KnowledgeDocument).filter_by(id=doc_id).first()
     if not doc:
@@ -30,66 +406,77 @@ def store_embeddings(db: Session, doc_id: int, chunks: list[str], embeddings: li
         return
 
     client_profile_id = doc.client_profile_id
-    
-    collection = get_collection()
+
+    if chunk_indices is None:
+        chunk_indices = list(range(len(chunks)))
     
     # Generate unique IDs for chunks: {doc_id}_{chunk_index}
-    ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
+    if ids is None:
+        ids = [f"{doc_id}_{i}" for i in chunk_indices]
     
     metadatas = [
         {
             "document_id": doc_id, 
-            "chunk_index": i, 
+            "chunk_index": chunk_index, 
             "client_profile_id": client_profile_id
         } 
-        for i in range(len(chunks))
+        for chunk_index in chunk_indices
     ]
-    
-    collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        documents=chunks,
-        metadatas=metadatas
-    )
+    if chunk_hashes is not None:
+        for meta, chunk_hash in zip(metadatas, chunk_hashes):
+            meta["chunk_hash"] = chunk_hash
+
+    vector_store.add_chunks(db, client_profile_id, ids, embeddings, chunks, metadatas, embedding_model)
+
+
+def get_document_chunks(db: Session, doc_id: int, client_profile_id: int = None,
+                        embedding_model: str = None) -> dict[str, dict]:
+    """
+    Returns {chunk_id: metadata} for every stored chunk of a document.
+    """
+    return vector_store.get_document_chunks(db, doc_id, client_profile_id, embedding_model)
 
-def search_embeddings(db: Session, query_embedding: list[float], limit: int = 5, client_profile_id: int = None):
+
+def update_chunk_metadata(db: Session, ids: list[str], metadatas: list[dict], client_profile_id: int = None,
+                          embedding_model: str = None):
+    """
+    Metadata-only update; the stored vectors are left untouched.
+    """
+    if ids:
+        vector_store.update_chunk_metadata(db, ids, metadatas, client_profile_id, embedding_model)
+
+
+def delete_chunks(db: Session, ids: list[str], client_profile_id: int = None, embedding_model: str = None):
+    if ids:
+        vector_store.delete_chunks(db, ids, client_profile_id, embedding_model)
+
+
+def delete_document_embeddings(db: Session, doc_id: int, client_profile_id: int = None, embedding_model: str = None):
+    vector_store.delete_document(db, doc_id, client_profile_id, embedding_model)
+
+
+def search_embeddings(db: Session, query_embedding: list[float], limit: int = 5, client_profile_id: int = None,
+                      embedding_model: str = None):
     """
     Search for similar chunks using cosine similarity.
     """
-    collection = get_collection()
-    
-    where_filter = {}
-    if client_profile_id:
-        where_filter["client_profile_id"] = client_profile_id
-        
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=limit,
-        where=where_filter if where_filter else None
-    )
-    
-    # Chroma returns a dict with lists of lists (one list per query vector)
-    # results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0]
-    
-    if not results or not results['ids'] or not results['ids'][0]:
-        return []
-        
-    hits = []
-    num_hits = len(results['ids'][0])
-    
-    for i in range(num_hits):
-        meta = results['metadatas'][0][i]
-        doc_text = results['documents'][0][i]
-        distance = results['distances'][0][i]
-        
-        # Cosine distance is used (0 to 2). Similarity = 1 - distance.
-        similarity = 1 - distance
-        
-        hits.append({
-            "document_id": meta["document_id"],
-            "chunk_text": doc_text,
-            "similarity": similarity
-        })
-        
-    return hits
+    return vector_store.search(db, query_embedding, limit, client_profile_id, embedding_model)
 
+
+_search_limiter = None
+
+
+async def asearch_embeddings(db: Session, query_embedding: list[float], limit: int = 5,
+                             client_profile_id: int = None, embedding_model: str = None):
+    """
+    search_embeddings for async handlers. Both backends are blocking
+    clients, so the search runs in a worker thread; a dedicated limiter
+    keeps searches from taking every thread of the shared pool.
+    """
+    global _search_limiter
+    if _search_limiter is None:
+        _search_limiter = anyio.CapacityLimiter(VECTOR_SEARCH_THREADS)
+    return await anyio.to_thread.run_sync(
+        partial(search_embeddings, db, query_embedding, limit, client_profile_id, embedding_model),
+        limiter=_search_limiter,
+    )
@@ -0,0 +1,164 @@
+"""
+Standalone ingestion worker.
+
+    python -m rag.worker --concurrency 4
+
+Runs the document pipeline for jobs in the `ingestion_jobs` table. Start as
+many worker processes as needed; they coordinate through the database only.
+
+Workers on more than one host need VECTOR_STORE_BACKEND=pgvector and
+LEXICAL_INDEX_ENABLED=false: Chroma's persistent client and the per-tenant
+SQLite lexical indexes live on the local disk and are not safe to share
+between hosts. Every host must also see the same storage/uploads directory.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+
+from auth.database import SessionLocal
+import tms.models  # noqa: F401  registers Ticket for the ClientProfile.tickets relationship
+from rag.services.job_queue import claim_job, heartbeat, complete_job, fail_job, reap_stale_jobs, stale_uploads
+from rag.services.document_pipeline import PipelineAbandoned, process_document_pipeline
+from rag.services.lexical_index import LEXICAL_INDEX_ENABLED
+from rag.services.vector_store import VECTOR_STORE_BACKEND, vector_store
+
+logger = logging.getLogger("rag.worker")
+
+INGEST_WORKER_CONCURRENCY = int(os.getenv("INGEST_WORKER_CONCURRENCY", "2"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+INGEST_VISIBILITY_TIMEOUT = int(os.getenv("INGEST_VISIBILITY_TIMEOUT", "300"))
+
+
+class IngestionWorker:
+    def __init__(
+        self,
+        concurrency: int = INGEST_WORKER_CONCURRENCY,
+        poll_interval: float = INGEST_POLL_INTERVAL,
+        visibility_timeout: int = INGEST_VISIBILITY_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        # Heartbeat well inside the timeout so one slow beat doesn't lose the claim
+        self.heartbeat_interval = max(1.0, visibility_timeout / 3)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+
+    def _heartbeat_loop(self, job_id: int, slot_id: str, done: threading.Event, lost: threading.Event):
+        db = SessionLocal()
+        try:
+            while not done.wait(self.heartbeat_interval):
+                if not heartbeat(db, job_id, slot_id):
+                    logger.warning("Lost claim on job %s, abandoning it", job_id)
+                    lost.set()
+                    return
+        except Exception:
+            logger.exception("Heartbeat failed for job %s", job_id)
+        finally:
+            db.close()
+
+    def _run_one(self, db, slot_id: str) -> bool:
+        job = claim_job(db, slot_id, self.visibility_timeout)
+        if not job:
+            return False
+
+        logger.info("Job %s claimed (document %s, attempt %s)", job.id, job.document_id, job.attempts)
+        done, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=self._heartbeat_loop, args=(job.id, slot_id, done, lost), daemon=True)
+        beat.start()
+
+        try:
+            process_document_pipeline(job.document_id, job.file_path, abandon=lost)
+        except PipelineAbandoned:
+            done.set()
+            logger.warning("Job %s abandoned after its claim was lost", job.id)
+        except Exception as e:
+            done.set()
+            if fail_job(db, job, slot_id, str(e)):
+                logger.warning("Job %s failed: %s", job.id, e)
+            else:
+                logger.warning("Job %s failed after its claim was lost: %s", job.id, e)
+        else:
+            done.set()
+            if complete_job(db, job, slot_id):
+                logger.info("Job %s done", job.id)
+                self._remove_stale_uploads(db, job)
+            else:
+                logger.warning("Job %s finished after its claim was lost; result left to the new owner", job.id)
+        finally:
+            beat.join()
+        return True
+
+    @staticmethod
+    def _remove_stale_uploads(db, job):
+        # Earlier versions of the document are no longer needed on disk
+        for path in stale_uploads(db, job):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.exception("Could not remove old upload %s", path)
+
+    def _slot_loop(self, slot: int):
+        slot_id = f"{self.worker_id}/{slot}"
+        db = SessionLocal()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if slot == 0:
+                        reap_stale_jobs(db, self.visibility_timeout)
+                    if not self._run_one(db, slot_id):
+                        self.stop_event.wait(self.poll_interval)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Worker slot %s error", slot_id)
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            db.close()
+
+    def run(self):
+        logger.info("Ingestion worker %s starting with %s slots", self.worker_id, self.concurrency)
+        if VECTOR_STORE_BACKEND != "pgvector" or LEXICAL_INDEX_ENABLED:
+            logger.warning(
+                "Vector store %r%s is host-local: run workers on this host only",
+                VECTOR_STORE_BACKEND, " and the lexical index" if LEXICAL_INDEX_ENABLED else "",
+            )
+        vector_store.open()
+        threads = [
+            threading.Thread(target=self._slot_loop, args=(slot,), name=f"ingest-{slot}")
+            for slot in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        vector_store.close()
+        logger.info("Ingestion worker %s stopped", self.worker_id)
+
+    def stop(self, *_):
+        # Finish in-flight jobs, claim nothing new
+        self.stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EasyServe document ingestion worker")
+    parser.add_argument("--concurrency", type=int, default=INGEST_WORKER_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=INGEST_POLL_INTERVAL)
+    parser.add_argument("--visibility-timeout", type=int, default=INGEST_VISIBILITY_TIMEOUT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    worker = IngestionWorker(args.concurrency, args.poll_interval, args.visibility_timeout)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/tests/test_answer_cache.py
+import time
+from datetime import datetime
+
+import pytest
+
+from rag.services.answer_cache import AnswerCache, kb_version, normalize_query
+
+RESPONSE = {"answer": "Refunds take 14 days.", "retrieved_docs": [{"chunk_text": "Refunds take 14 days."}]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(str(tmp_path / "answers.sqlite3"), similarity=0.95)
+
+
+def test_normalize_query():
+    assert normalize_query("  What's your REFUND   policy?? ") == "what's your refund policy"
+
+
+def test_exact_hit_ignores_case_spacing_and_punctuation(cache):
+    cache.set(1, "v1", "What is your refund policy?", RESPONSE)
+
+    start = time.perf_counter()
+    hit = cache.get(1, "v1", "what is your refund  policy")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    assert hit == RESPONSE
+    assert elapsed_ms < 10
+
+
+def test_entries_are_per_tenant_and_per_kb_version(cache):
+    cache.set(1, "v1", "refund policy", RESPONSE)
+
+    assert cache.get(2, "v1", "refund policy") is None
+    assert cache.get(1, "v2", "refund policy") is None
+
+
+def test_kb_version_changes_with_last_kb_update():
+    assert kb_version(None) == "0"
+    assert kb_version(datetime(2026, 1, 1)) != kb_version(datetime(2026, 1, 2))
+
+
+def test_semantic_lookup_uses_similarity_threshold(cache):
+    cache.set(1, "v1", "how long do refunds take", RESPONSE, query_embedding=[1.0, 0.0, 0.0])
+
+    assert cache.get_similar(1, "v1", [0.99, 0.05, 0.0]) == RESPONSE
+    assert cache.get_similar(1, "v1", [0.5, 0.5, 0.5]) is None
+    # Stale KB version or other tenant: no semantic match either
+    assert cache.get_similar(1, "v2", [1.0, 0.0, 0.0]) is None
+    assert cache.get_similar(2, "v1", [1.0, 0.0, 0.0]) is None
+
+
+def test_new_kb_version_drops_old_semantic_entries(cache):
+    cache.set(1, "v1", "refunds", RESPONSE, query_embedding=[1.0, 0.0])
+    cache.set(1, "v2", "shipping", RESPONSE, query_embedding=[0.0, 1.0])
+
+    assert cache.stats()["semantic_items"] == 1
+
+
+def test_ttl_expiry(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=0.05)
+    cache.set(1, "v1", "refunds", RESPONSE)
+    time.sleep(0.1)
+
+    assert cache.get(1, "v1", "refunds") is None
+
+
+def disk_keys(cache) -> list[str]:
+    return [key for key, in cache.store._connection().execute("SELECT key FROM answers ORDER BY key")]
+
+
+def test_new_kb_version_deletes_old_rows_from_disk(cache):
+    cache.set(1, "2026-01-01T00:00:00", "refunds", RESPONSE)
+    cache.set(12, "2026-01-01T00:00:00", "refunds", RESPONSE)
+    cache.set(1, "2026-01-02T00:00:00", "shipping", RESPONSE)
+
+    assert disk_keys(cache) == sorted([
+        AnswerCache.key(1, "2026-01-02T00:00:00", "shipping"),
+        AnswerCache.key(12, "2026-01-01T00:00:00", "refunds"),
+    ])
+
+    # A late write for the old version never deletes the newer rows
+    cache.set(1, "2026-01-01T00:00:00", "late", RESPONSE)
+    assert cache.get(1, "2026-01-02T00:00:00", "shipping") == RESPONSE
+
+
+def test_disk_tier_is_capped(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_rows=3)
+    cache.store.maintain_every = 2
+    for n in range(6):
+        cache.set(1, "v1", f"question {n}", RESPONSE)
+
+    assert len(disk_keys(cache)) <= 3
+    assert cache.get(1, "v1", "question 5") == RESPONSE
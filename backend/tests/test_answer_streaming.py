@@ -0,0 +1,109 @@
+# backend/tests/test_answer_streaming.py
+import asyncio
+import time
+
+import pytest
+
+import agents.retrieval.nodes.generate_answer as generate_node
+import agents.retrieval.nodes.retrieve as retrieve_node
+from agents.registry import graph_registry
+
+
+class FakeStreamingLLM:
+    def __init__(self, tokens, delay=0.05):
+        self.tokens = tokens
+        self.delay = delay
+        self.produced = 0
+        self.closed = False
+
+    def stream(self, prompt, system_prompt=None, **kwargs):
+        try:
+            for token in self.tokens:
+                time.sleep(self.delay)
+                self.produced += 1
+                yield token
+        finally:
+            self.closed = True
+
+    async def astream(self, prompt, system_prompt=None, **kwargs):
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield token
+        finally:
+            self.closed = True
+
+    async def ainvoke(self, prompt, system_prompt=None, **kwargs):
+        return type("LLMResponse", (), {"content": "".join(self.tokens)})
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    llm = FakeStreamingLLM(["Refunds ", "take ", "14 ", "days."])
+    monkeypatch.setattr(generate_node, "llm", llm)
+    hits = [{"chunk_id": "1_0", "document_id": 1, "chunk_text": "Refunds take 14 days."}]
+
+    async def ahybrid_search(db, query, client_profile_id, limit, embedding_model):
+        return hits, "hybrid"
+
+    monkeypatch.setattr(retrieve_node, "hybrid_search", lambda *args, **kwargs: (hits, "hybrid"))
+    monkeypatch.setattr(retrieve_node, "ahybrid_search", ahybrid_search)
+    return llm
+
+
+def run():
+    return list(graph_registry.stream(
+        "retrieval",
+        {"query": "refunds?", "client_profile_id": 1, "embedding_model": None},
+        stream_tokens=True,
+    ))
+
+
+def test_sources_arrive_before_tokens(fake_llm):
+    events = run()
+
+    kinds = ["sources" if mode == "updates" and "build_context" in chunk else mode for mode, chunk in events]
+    assert kinds.index("sources") < kinds.index("custom")
+    tokens = [chunk["token"] for mode, chunk in events if mode == "custom"]
+    assert "".join(tokens) == "Refunds take 14 days."
+    assert events[-1][1]["generate"]["answer"] == "Refunds take 14 days."
+
+
+def test_finished_stream_closes_upstream_stream(fake_llm):
+    run()
+
+    assert fake_llm.closed
+    assert fake_llm.produced == len(fake_llm.tokens)
+
+
+# ----------------------------
+# ASYNC PATH
+# ----------------------------
+STATE = {"query": "refunds?", "client_profile_id": 1, "embedding_model": None}
+
+
+def test_ainvoke_uses_async_nodes(fake_llm):
+    result = asyncio.run(graph_registry.ainvoke("retrieval", dict(STATE)))
+
+    assert result["answer"] == "Refunds take 14 days."
+    assert result["retrieval_mode"] == "hybrid"
+
+
+def test_closing_astream_cancels_upstream_stream(fake_llm):
+    async def consume():
+        tokens = []
+        stream = graph_registry.astream("retrieval", dict(STATE), stream_tokens=True)
+        async for mode, chunk in stream:
+            if mode == "custom":
+                tokens.append(chunk["token"])
+                break
+        await stream.aclose()
+        await asyncio.sleep(fake_llm.delay * 3)
+        return tokens
+
+    tokens = asyncio.run(consume())
+
+    assert tokens == ["Refunds "]
+    assert fake_llm.closed
+    assert fake_llm.produced < len(fake_llm.tokens)
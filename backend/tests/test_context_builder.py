@@ -0,0 +1,57 @@
+# backend/tests/test_context_builder.py
+from rag.services.context_builder import build_context, merge_adjacent, overlap_length
+from rag.services.embedding_engine import estimate_tokens
+
+SHARED = "and the refund is issued to the original payment method."
+
+
+def hit(chunk_id, document_id, text, score):
+    return {"chunk_id": chunk_id, "document_id": document_id, "chunk_text": text, "rrf_score": score}
+
+
+def test_neighbouring_chunks_are_merged_once():
+    first = "Returns are accepted within 30 days " + SHARED
+    second = SHARED + " Shipping costs are not refunded."
+    assert overlap_length(first, second) == len(SHARED)
+
+    passages = merge_adjacent([hit("1_1", 1, second, 0.9), hit("1_0", 1, first, 0.8), hit("2_0", 2, second, 0.7)])
+
+    assert len(passages) == 2
+    assert passages[0]["chunk_text"] == first + " Shipping costs are not refunded."
+    assert passages[0]["merged_chunk_ids"] == ["1_1", "1_0"]
+    assert passages[1]["document_id"] == 2
+
+
+def test_near_duplicates_are_dropped():
+    text = "Orders ship within two business days from our Berlin warehouse."
+    passages, _ = build_context([hit("1_0", 1, text, 0.9), hit("2_0", 2, text + " ", 0.8)])
+
+    assert [p["chunk_id"] for p in passages] == ["1_0"]
+
+
+def test_mmr_prefers_a_new_topic_over_a_rephrasing():
+    refund = "Refunds are paid back within fourteen days of receiving the returned item."
+    similar = "Refunds are paid back within fourteen days of receiving the item you returned."
+    shipping = "Standard shipping to Germany takes three to five working days."
+    other = "Gift cards cannot be exchanged for cash."
+
+    passages, _ = build_context(
+        [hit("1_0", 1, refund, 0.9), hit("2_0", 2, similar, 0.88), hit("3_0", 3, shipping, 0.85), hit("4_0", 4, other, 0.1)],
+        mmr_lambda=0.5,
+        duplicate_threshold=1.0,
+    )
+
+    assert [p["chunk_id"] for p in passages] == ["1_0", "3_0", "2_0", "4_0"]
+
+
+def test_context_fits_the_token_budget():
+    texts = [f"Policy {i}: " + "word " * 40 * (i + 1) for i in range(5)]
+    hits = [hit(f"{i}_0", i, text, 1 - i / 10) for i, text in enumerate(texts)]
+    budget = estimate_tokens(texts[0]) + estimate_tokens(texts[2])
+
+    passages, tokens = build_context(hits, token_budget=budget, duplicate_threshold=1.0, mmr_lambda=1.0)
+
+    assert tokens <= budget
+    assert [p["chunk_id"] for p in passages][:1] == ["0_0"]
+    assert tokens == sum(estimate_tokens(p["chunk_text"]) for p in passages)
+    assert build_context([]) == ([], 0)
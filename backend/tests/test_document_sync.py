@@ -0,0 +1,87 @@
+# backend/tests/test_document_sync.py
+from types import SimpleNamespace
+
+import pytest
+
+from rag.services import document_pipeline
+from rag.services.document_pipeline import build_chunk_ids, chunk_hash, sync_document_chunks
+
+DOC = SimpleNamespace(id=7, client_profile_id=1, embedding_model="m")
+
+
+class FakeStore:
+    """
+    The vector_store helpers sync_document_chunks calls, over a dict.
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.embedded = []
+        self.deleted = []
+
+    def embed_text(self, texts, model=None):
+        self.embedded += texts
+        return [[0.0] for _ in texts]
+
+    def store_embeddings(self, db, doc_id, chunks, embeddings, ids, chunk_indices, chunk_hashes, embedding_model):
+        for chunk_id, index, text in zip(ids, chunk_indices, chunks):
+            self.chunks[chunk_id] = {"document_id": doc_id, "chunk_index": index, "text": text}
+
+    def get_document_chunks(self, db, doc_id, client_profile_id, model):
+        return {chunk_id: {k: v for k, v in meta.items() if k != "text"} for chunk_id, meta in self.chunks.items()}
+
+    def update_chunk_metadata(self, db, ids, metadatas, client_profile_id, model):
+        for chunk_id, meta in zip(ids, metadatas):
+            self.chunks[chunk_id].update(meta)
+
+    def delete_chunks(self, db, ids, client_profile_id, model):
+        self.deleted += ids
+        for chunk_id in ids:
+            del self.chunks[chunk_id]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    for name in ("embed_text", "store_embeddings", "get_document_chunks", "update_chunk_metadata", "delete_chunks"):
+        monkeypatch.setattr(document_pipeline, name, getattr(store, name))
+    monkeypatch.setattr(document_pipeline, "LEXICAL_INDEX_ENABLED", False)
+    return store
+
+
+def test_reupload_only_embeds_and_deletes_changed_chunks(store):
+    v1 = ["Intro.", "Refunds take 5 days.", "Shipping is free.", "Contact us."]
+    sync_document_chunks(None, DOC, v1)
+    store.embedded.clear()
+
+    # One chunk edited, one inserted at the top, so the rest move down
+    v2 = ["Welcome!", "Intro.", "Refunds take 10 days.", "Shipping is free.", "Contact us."]
+    result = sync_document_chunks(None, DOC, v2)
+
+    assert store.embedded == ["Welcome!", "Refunds take 10 days."]
+    assert store.deleted == build_chunk_ids(DOC.id, [chunk_hash("Refunds take 5 days.")])
+    assert result == {"added": 2, "deleted": 1, "unchanged": 3}
+    # Moved chunks were renumbered, not re-embedded
+    by_text = {meta["text"]: meta["chunk_index"] for meta in store.chunks.values()}
+    assert by_text == {text: i for i, text in enumerate(v2)}
+
+
+def test_repeated_chunks_keep_distinct_ids(store):
+    sync_document_chunks(None, DOC, ["Same.", "Same."])
+    assert len(store.chunks) == 2
+
+    # Unchanged content: nothing to embed or delete
+    store.embedded.clear()
+    assert sync_document_chunks(None, DOC, ["Same.", "Same."]) == {"added": 0, "deleted": 0, "unchanged": 2}
+    assert store.embedded == []
+
+
+def test_legacy_positional_ids_are_replaced(store):
+    # Chunks stored before content-addressed IDs: {doc_id}_{chunk_index}
+    store.chunks = {f"{DOC.id}_{i}": {"document_id": DOC.id, "chunk_index": i, "text": t}
+                    for i, t in enumerate(["A.", "B."])}
+
+    sync_document_chunks(None, DOC, ["A.", "B."])
+
+    assert sorted(store.deleted) == [f"{DOC.id}_0", f"{DOC.id}_1"]
+    assert set(store.chunks) == set(build_chunk_ids(DOC.id, [chunk_hash("A."), chunk_hash("B.")]))
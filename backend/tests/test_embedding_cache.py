@@ -0,0 +1,115 @@
+# backend/tests/test_embedding_cache.py
+import time
+
+import anyio
+import pytest
+
+from core.cache import TieredCache
+from rag.services import embedder
+from rag.services.embedding_cache import EmbeddingCache, cache_key
+
+
+def test_tiered_cache_falls_back_to_sqlite(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TieredCache(path, "items", max_memory_items=2)
+    cache.set_many({"a": b"1", "b": b"2", "c": b"3"})
+
+    # "a" was pushed out of memory but is still on disk
+    assert cache.get_many(["a", "c", "z"]) == {"a": b"1", "c": b"3"}
+    assert cache.stats() == {
+        "memory_items": 2, "memory_hits": 1, "disk_hits": 1, "hits": 2, "misses": 1, "evicted": 0,
+        "hit_rate": 0.6667,
+    }
+
+    # Another worker process sees the same file
+    assert TieredCache(path, "items").get("b") == b"2"
+
+    cache.delete("b")
+    assert cache.get("b") is None
+
+
+def test_tiered_cache_expires_entries(tmp_path, monkeypatch):
+    cache = TieredCache(str(tmp_path / "cache.sqlite3"), "items", ttl_seconds=60)
+    cache.set("a", b"1")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+    assert cache.purge_expired() == 1
+
+
+def test_tiered_cache_maintenance_bounds_the_disk_tier(tmp_path, monkeypatch):
+    cache = TieredCache(str(tmp_path / "cache.sqlite3"), "items", ttl_seconds=60, max_disk_items=2,
+                        maintain_every=3)
+    cache.set("old", b"0")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    cache.set_many({"a": b"1", "b": b"2"})
+
+    # The third write ran maintain(): "old" expired
+    rows = lambda: [key for key, in cache._connection().execute("SELECT key FROM items ORDER BY key")]
+    assert rows() == ["a", "b"]
+
+    cache.set_many({"c": b"3", "d": b"4", "e": b"5"})
+    # Over the cap: trimmed back to two rows
+    assert len(rows()) == 2
+    assert cache.stats()["evicted"] == 4
+
+
+def test_tiered_cache_delete_prefix(tmp_path):
+    cache = TieredCache(str(tmp_path / "cache.sqlite3"), "items")
+    cache.set_many({"1:v1:a": b"1", "1:v2:a": b"2", "12:v1:a": b"3"})
+
+    assert cache.delete_prefix("1:", keep="1:v2:") == 1
+    assert cache.get_many(["1:v1:a", "1:v2:a", "12:v1:a"]) == {"1:v2:a": b"2", "12:v1:a": b"3"}
+
+
+def test_embedding_cache_keys_on_model_and_normalized_text(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache.set_many("m1", {"Refund  policy\n": [0.5, 0.25]})
+
+    assert cache.get_many("m1", ["Refund policy", "refund policy"]) == {"Refund policy": [0.5, 0.25]}
+    assert cache.get_many("m2", ["Refund policy"]) == {}
+    assert cache_key("m1", " a\tb ") == cache_key("m1", "a b")
+
+
+@pytest.fixture
+def cached_embedder(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_embed(model, texts):
+        calls.append(list(texts))
+        return [[0.1, len(text) / 3] for text in texts]
+
+    async def fake_aembed(model, texts):
+        return fake_embed(model, texts)
+
+    monkeypatch.setattr(embedder, "embedding_cache", EmbeddingCache(str(tmp_path / "embeddings.sqlite3")))
+    monkeypatch.setattr(embedder, "_embed_with", fake_embed)
+    monkeypatch.setattr(embedder, "_aembed_with", fake_aembed)
+    return calls
+
+
+def test_whitespace_variants_are_embedded_once(cached_embedder):
+    vectors = embedder.embed_text(["Call us  today", "Call us today", "Open 9-5"])
+
+    assert cached_embedder == [["Call us  today", "Open 9-5"]]
+    assert vectors[0] == vectors[1]
+
+
+def test_hits_and_misses_return_the_same_vector(cached_embedder):
+    fresh = embedder.embed_text(["Open 9-5"])
+    cached = embedder.embed_text(["Open 9-5"])
+
+    assert len(cached_embedder) == 1
+    assert fresh == cached
+    # 0.1 is not a float32 value: the miss was rounded like the hit
+    assert fresh[0][0] != 0.1
+
+
+def test_async_path_shares_the_cache(cached_embedder):
+    first = anyio.run(embedder.aembed_text, ["Open 9-5", "Open  9-5"])
+    second = embedder.embed_text(["Open 9-5"])
+
+    assert cached_embedder == [["Open 9-5"]]
+    assert first == [second[0], second[0]]
@@ -0,0 +1,196 @@
+# backend/tests/test_embedding_engine.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from rag.services.embedding_engine import EmbeddingEngine, RateLimitError
+
+
+# ----------------------------
+# FAKE EMBEDDING SERVER
+# ----------------------------
+class FakeEmbeddingServer:
+    """
+    Local HTTP server that embeds each text as [len(text), position].
+    `latency` delays every response; `fail_first` answers the first N
+    requests with `fail_status`.
+    """
+
+    def __init__(self, latency=0.0, fail_first=0, fail_status=429):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests += 1
+                    failing = server.requests <= server.fail_first
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                    if failing:
+                        self.send_response(server.fail_status)
+                        self.send_header("Retry-After", "0.01")
+                        self.end_headers()
+                        return
+                    with server.lock:
+                        server.batch_sizes.append(len(body["texts"]))
+                    payload = json.dumps({
+                        "embeddings": [[float(len(t)), float(i)] for i, t in enumerate(body["texts"])]
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/embed"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def http_embed_batch(url):
+    def embed_batch(texts):
+        resp = httpx.post(url, json={"texts": texts}, timeout=5)
+        if resp.status_code == 429:
+            raise RateLimitError(retry_after=float(resp.headers.get("Retry-After", 0)))
+        resp.raise_for_status()
+        return resp.json()["embeddings"]
+    return embed_batch
+
+
+def http_aembed_batch(url):
+    async def aembed_batch(texts):
+        async with httpx.AsyncClient(timeout=5) as client:
+            resp = await client.post(url, json={"texts": texts})
+        if resp.status_code == 429:
+            raise RateLimitError(retry_after=float(resp.headers.get("Retry-After", 0)))
+        resp.raise_for_status()
+        return resp.json()["embeddings"]
+    return aembed_batch
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+# ----------------------------
+# TESTS
+# ----------------------------
+def test_batches_respect_count_and_token_budget():
+    engine = EmbeddingEngine(lambda b: b, max_batch_size=3, max_batch_tokens=10)
+    texts = ["a" * 4, "b" * 4, "c" * 4, "d" * 4, "e" * 40, "f" * 4]
+
+    batches = engine.make_batches(texts)
+
+    assert batches == [[0, 1, 2], [3], [4], [5]]
+
+
+def test_concurrent_batches_preserve_order_and_concurrency_limit():
+    texts = [f"chunk-{i}-" + "x" * (i % 7) for i in range(95)]
+
+    with FakeEmbeddingServer(latency=0.05) as server:
+        engine = EmbeddingEngine(http_embed_batch(server.url), max_batch_size=10, max_concurrency=3)
+        vectors = engine.embed(texts)
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert [v[1] for v in vectors] == [float(i % 10) for i in range(95)]
+    assert sorted(server.batch_sizes) == [5] + [10] * 9
+    assert 1 < server.max_in_flight <= 3
+
+
+def test_rate_limited_batches_are_retried():
+    with FakeEmbeddingServer(fail_first=3) as server:
+        engine = EmbeddingEngine(http_embed_batch(server.url), max_batch_size=2, max_concurrency=2, base_delay=0.01)
+        vectors = engine.embed(["one", "two", "three", "four"])
+
+    assert [v[0] for v in vectors] == [3.0, 3.0, 5.0, 4.0]
+    assert server.requests == 5
+
+
+def test_gives_up_after_max_retries():
+    with FakeEmbeddingServer(fail_first=100) as server:
+        engine = EmbeddingEngine(http_embed_batch(server.url), max_retries=2, base_delay=0.01)
+        with pytest.raises(RateLimitError):
+            engine.embed(["one"])
+
+    assert server.requests == 3
+
+
+def test_non_retryable_errors_fail_fast():
+    calls = []
+
+    def embed_batch(texts):
+        calls.append(texts)
+        raise StatusError(400)
+
+    engine = EmbeddingEngine(embed_batch, base_delay=0.01)
+    with pytest.raises(StatusError):
+        engine.embed(["bad"])
+
+    assert len(calls) == 1
+
+
+def test_server_errors_are_retried():
+    attempts = []
+
+    def embed_batch(texts):
+        attempts.append(texts)
+        if len(attempts) < 2:
+            raise StatusError(503)
+        return [[1.0] for _ in texts]
+
+    engine = EmbeddingEngine(embed_batch, base_delay=0.01)
+
+    assert engine.embed(["a", "b"]) == [[1.0], [1.0]]
+    assert len(attempts) == 2
+
+
+def test_aembed_runs_batches_concurrently_and_retries():
+    texts = [f"chunk-{i}" for i in range(30)]
+
+    with FakeEmbeddingServer(latency=0.05, fail_first=1) as server:
+        engine = EmbeddingEngine(
+            http_embed_batch(server.url),
+            aembed_batch=http_aembed_batch(server.url),
+            max_batch_size=10,
+            max_concurrency=3,
+            base_delay=0.01,
+        )
+        vectors = asyncio.run(engine.aembed(texts))
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert [v[1] for v in vectors] == [float(i % 10) for i in range(30)]
+    assert server.requests == 4
+    assert 1 < server.max_in_flight <= 3
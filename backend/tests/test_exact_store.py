@@ -0,0 +1,84 @@
+# backend/tests/test_exact_store.py
+import time
+
+import numpy as np
+
+from rag.services.exact_store import ExactVectorStore
+from rag.services.quantized_store import QuantizedVectorStore, normalize
+
+
+def random_vectors(n, dim=32, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(n, dim)))
+
+
+def add(store, tenant, vectors, document_id=1, start=0):
+    ids = [f"{document_id}_{start + i}" for i in range(len(vectors))]
+    metas = [{"document_id": document_id, "chunk_index": start + i, "client_profile_id": tenant} for i in range(len(vectors))]
+    store.add_chunks(None, tenant, ids, vectors.tolist(), ids, metas)
+    return ids
+
+
+def make_store(tmp_path, **options):
+    ann = QuantizedVectorStore(str(tmp_path / "ann"), "int8")
+    return ExactVectorStore(str(tmp_path / "exact"), ann=ann, **options), ann
+
+
+def test_small_tenant_gets_exact_results(tmp_path):
+    store, ann = make_store(tmp_path)
+    vectors = random_vectors(500)
+    ids = add(store, 7, vectors)
+
+    query = random_vectors(1, seed=3)[0]
+    hits = store.search(None, query.tolist(), 5, client_profile_id=7)
+
+    expected = [ids[i] for i in np.argsort(-(vectors @ query))[:5]]
+    assert [hit["chunk_id"] for hit in hits] == expected
+    assert ann.count(None, 7) == 0
+
+    start = time.perf_counter()
+    for _ in range(100):
+        store.search(None, query.tolist(), 5, client_profile_id=7)
+    assert (time.perf_counter() - start) / 100 < 0.005
+
+
+def test_tenant_is_promoted_above_threshold(tmp_path):
+    store, ann = make_store(tmp_path, max_chunks=100)
+    vectors = random_vectors(150)
+    ids = add(store, 7, vectors[:80])
+    assert store._segment(7) is not None
+
+    ids += add(store, 7, vectors[80:], start=80)
+
+    assert store._segment(7) is None
+    assert ann.count(None, 7) == 150
+    assert store.count(None, 7, limit=1) == 1
+    assert not (tmp_path / "exact" / "document_embeddings_t7").exists()
+    hits = store.search(None, vectors[120].tolist(), 1, client_profile_id=7)
+    assert hits[0]["chunk_id"] == ids[120]
+
+    # Later writes and deletes go to the ANN backend
+    store.delete_document(None, 1, client_profile_id=7)
+    assert ann.count(None, 7) == 0
+
+
+def test_existing_ann_tenants_stay_in_ann(tmp_path):
+    store, ann = make_store(tmp_path)
+    add(ann, 3, random_vectors(10))
+
+    add(store, 3, random_vectors(5, seed=1), document_id=2)
+
+    assert ann.count(None, 3) == 15
+    assert store._segment(3) is None
+
+
+def test_idle_tenants_are_unloaded(tmp_path):
+    vectors = random_vectors(1000, dim=64)
+    store, _ = make_store(tmp_path, cache_mb=1000 * 64 * 4 * 1.5 / 2**20)
+    for tenant in (1, 2, 3):
+        add(store, tenant, vectors)
+
+    for tenant in (1, 2, 3):
+        store.search(None, vectors[0].tolist(), 1, client_profile_id=tenant)
+
+    assert [segment.loaded_bytes() > 0 for segment in store._segments.values()] == [True]
+    assert store.search(None, vectors[0].tolist(), 1, client_profile_id=1)[0]["chunk_id"] == "1_0"
@@ -0,0 +1,72 @@
+# backend/tests/test_extractor.py
+import fitz
+import pytest
+
+from rag.services import extractor
+from rag.services.chunker import chunk_pages, chunk_text
+
+PAGE = "Page {n}. Refunds are processed within 14 days of the return being received.\n\n"
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "manual.pdf"
+    doc = fitz.open()
+    for n in range(1, 41):
+        doc.new_page().insert_text((72, 72), PAGE.format(n=n).strip())
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    monkeypatch.setattr(extractor, "PDF_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(extractor, "PDF_EXTRACT_WORKERS", 2)
+    yield
+    extractor.shutdown_pool()
+
+
+def test_pages_come_back_in_order_from_one_shared_pool(pdf, parallel):
+    pages = list(extractor.iter_pdf_pages(pdf, pages_per_batch=4, max_workers=2))
+    pool = extractor._pool
+
+    assert [n for n, _ in pages] == list(range(1, 41))
+    assert all(f"Page {n}." in text for n, text in pages)
+
+    # A second file reuses the workers instead of spawning new ones
+    list(extractor.iter_pdf_pages(pdf, pages_per_batch=4, max_workers=2))
+    assert extractor._pool is pool
+
+    extractor.shutdown_pool()
+    assert extractor._pool is None
+
+
+def test_stopping_early_leaves_the_pool_usable(pdf, parallel):
+    pages = extractor.iter_pdf_pages(pdf, pages_per_batch=2, max_workers=2)
+    assert next(pages)[0] == 1
+    pages.close()
+
+    assert len(list(extractor.iter_pdf_pages(pdf, pages_per_batch=2, max_workers=2))) == 40
+
+
+def test_small_pdfs_are_read_inline(pdf):
+    assert extractor.extract_text_from_pdf(pdf).count("Refunds are processed") == 40
+    assert extractor._pool is None
+
+
+def test_single_page_chunks_like_chunk_text():
+    text = "".join(PAGE.format(n=n) for n in range(200))
+    assert chunk_pages([text]) == chunk_text(text)
+
+
+def test_chunks_span_page_breaks():
+    pages = [PAGE.format(n=n) * 3 for n in range(50)]
+    chunks = chunk_pages(pages)
+
+    assert chunks == chunk_pages(pages)
+    assert all(len(chunk) <= 800 for chunk in chunks)
+    # Pages are much shorter than a chunk, so chunks hold several pages
+    assert len(chunks) < len(pages)
+    for n in range(50):
+        assert any(f"Page {n}." in chunk for chunk in chunks)
@@ -0,0 +1,67 @@
+# backend/tests/test_graph_registry.py
+from typing import Optional, TypedDict
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, StateGraph
+
+from agents.registry import GraphRegistry
+from agents.run_config import get_db, time_left
+from core.metrics import metrics
+
+
+class EchoState(TypedDict):
+    client_profile_id: int
+    db_seen: Optional[str]
+    time_left: Optional[float]
+
+
+def echo(state: EchoState, config: RunnableConfig):
+    return {"db_seen": get_db(config), "time_left": time_left(config)}
+
+
+def make_builder(counter):
+    def build():
+        counter.append(1)
+        graph = StateGraph(EchoState)
+        graph.add_node("echo", echo)
+        graph.set_entry_point("echo")
+        graph.add_edge("echo", END)
+        return graph.compile()
+    return build
+
+
+def test_graph_is_compiled_once():
+    compiled = []
+    registry = GraphRegistry()
+    registry.register("echo", make_builder(compiled))
+
+    registry.compile_all()
+    registry.invoke("echo", {"client_profile_id": 1}, db="session-a")
+    registry.invoke("echo", {"client_profile_id": 2}, db="session-b")
+
+    assert len(compiled) == 1
+    assert registry.stats()["echo"]["compiled"] is True
+
+
+def test_request_dependencies_come_from_run_config():
+    registry = GraphRegistry()
+    registry.register("echo", make_builder([]))
+
+    first = registry.invoke("echo", {"client_profile_id": 1}, db="session-a", timeout=5)
+    second = registry.invoke("echo", {"client_profile_id": 2}, db="session-b")
+
+    assert first["db_seen"] == "session-a"
+    assert 0 < first["time_left"] <= 5
+    assert second["db_seen"] == "session-b"
+    assert second["time_left"] is None
+
+
+def test_invoke_is_timed():
+    metrics.reset()
+    registry = GraphRegistry()
+    registry.register("echo", make_builder([]))
+
+    registry.invoke("echo", {"client_profile_id": 1}, db=None)
+
+    assert metrics.latency("graph.echo.compile")["count"] == 1
+    assert metrics.latency("graph.echo.invoke")["count"] == 1
@@ -0,0 +1,180 @@
+# backend/tests/test_job_queue.py
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import tms.models  # noqa: F401  registers Ticket for the ClientProfile.tickets relationship
+from rag.models import IngestionJob, IngestionJobStatus
+from rag.services.job_queue import (
+    claim_job,
+    complete_job,
+    enqueue_job,
+    fail_job,
+    heartbeat,
+    reap_stale_jobs,
+    requeue_documents,
+    stale_uploads,
+)
+from user.models import KnowledgeDocument
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    IngestionJob.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def enqueue(db, document_id, tenant, max_attempts=3):
+    return enqueue_job(db, SimpleNamespace(id=document_id, client_profile_id=tenant), f"/uploads/{document_id}",
+                       max_attempts=max_attempts)
+
+
+def expire_heartbeat(db, job):
+    db.query(IngestionJob).filter_by(id=job.id).update({"heartbeat_at": datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+
+
+def test_claims_round_robin_across_tenants(db):
+    # Tenant 1 bulk-uploads before tenant 2's single file
+    for document_id in range(1, 4):
+        enqueue(db, document_id, tenant=1)
+    enqueue(db, 10, tenant=2)
+
+    first = claim_job(db, "w/0", visibility_timeout=300)
+    second = claim_job(db, "w/1", visibility_timeout=300)
+
+    assert first.client_profile_id == 1
+    # Tenant 1 already has a job running: tenant 2 goes next
+    assert second.client_profile_id == 2
+    assert second.status == IngestionJobStatus.running.value
+    assert second.worker_id == "w/1"
+    assert second.attempts == 1
+
+
+def test_failed_job_is_retried_then_failed_for_good(db):
+    enqueue(db, 1, tenant=1, max_attempts=2)
+
+    job = claim_job(db, "w/0", 300)
+    assert fail_job(db, job, "w/0", "embedding API down")
+    db.refresh(job)
+    assert job.status == IngestionJobStatus.pending.value
+    assert job.worker_id is None
+
+    job = claim_job(db, "w/0", 300)
+    assert job.attempts == 2
+    assert fail_job(db, job, "w/0", "embedding API down again")
+    db.refresh(job)
+    assert job.status == IngestionJobStatus.failed.value
+    assert job.last_error == "embedding API down again"
+    assert claim_job(db, "w/0", 300) is None
+
+
+def test_stale_claim_is_reclaimed_and_the_old_worker_is_fenced_off(db):
+    enqueue(db, 1, tenant=1)
+    job = claim_job(db, "old/0", 300)
+    expire_heartbeat(db, job)
+
+    taken = claim_job(db, "new/0", 300)
+    assert taken.id == job.id
+    assert taken.attempts == 2
+
+    # The old worker can neither extend, finish nor requeue the job
+    assert not heartbeat(db, job.id, "old/0")
+    assert not complete_job(db, job, "old/0")
+    assert not fail_job(db, job, "old/0", "late failure")
+    db.refresh(taken)
+    assert taken.status == IngestionJobStatus.running.value
+    assert taken.worker_id == "new/0"
+
+    assert complete_job(db, taken, "new/0")
+    db.refresh(taken)
+    assert taken.status == IngestionJobStatus.done.value
+
+
+def test_reaper_fails_timed_out_jobs_on_their_last_attempt(db):
+    enqueue(db, 1, tenant=1, max_attempts=1)
+    enqueue(db, 2, tenant=2, max_attempts=3)
+    last_try = claim_job(db, "w/0", 300)
+    can_retry = claim_job(db, "w/1", 300)
+    expire_heartbeat(db, last_try)
+    expire_heartbeat(db, can_retry)
+
+    assert reap_stale_jobs(db, 300) == 1
+    db.refresh(last_try)
+    db.refresh(can_retry)
+    assert last_try.status == IngestionJobStatus.failed.value
+    assert last_try.last_error == "Visibility timeout exceeded"
+    # Still has attempts left: left for claim_job to pick up again
+    assert can_retry.status == IngestionJobStatus.running.value
+    assert claim_job(db, "w/2", 300).id == can_retry.id
+
+
+def test_new_version_waits_for_the_running_one(db):
+    enqueue(db, 1, tenant=1)
+    running = claim_job(db, "w/0", 300)
+
+    enqueue(db, 1, tenant=1)
+    # The document is busy: never sync two versions at once
+    assert claim_job(db, "w/1", 300) is None
+
+    assert complete_job(db, running, "w/0")
+    newer = claim_job(db, "w/1", 300)
+    assert newer.id != running.id
+    assert newer.document_id == 1
+
+
+def test_replaced_stale_job_is_reaped_not_rerun(db):
+    enqueue(db, 1, tenant=1)
+    old = claim_job(db, "w/0", 300)
+    expire_heartbeat(db, old)
+    enqueue(db, 1, tenant=1)
+
+    newer = claim_job(db, "w/1", 300)
+    assert newer.id != old.id
+    assert reap_stale_jobs(db, 300) == 1
+    db.refresh(old)
+    assert old.last_error == "Superseded by a newer upload"
+
+
+def test_stale_uploads_are_the_finished_earlier_versions(db):
+    first = enqueue(db, 1, tenant=1)
+    assert complete_job(db, claim_job(db, "w/0", 300), "w/0")
+    enqueue(db, 1, tenant=1)  # superseded before it ran
+    latest = enqueue(db, 1, tenant=1)
+    db.query(IngestionJob).filter_by(id=latest.id).update({"file_path": "/uploads/1-v3"})
+    db.commit()
+    db.refresh(latest)
+
+    job = claim_job(db, "w/0", 300)
+    assert job.id == latest.id
+    assert complete_job(db, job, "w/0")
+    assert stale_uploads(db, job) == [first.file_path]
+
+
+def test_requeue_documents_uses_each_documents_latest_upload(db):
+    KnowledgeDocument.__table__.create(db.get_bind())
+    db.add_all([
+        KnowledgeDocument(id=1, client_profile_id=1, file_name="a.pdf"),
+        KnowledgeDocument(id=2, client_profile_id=1, file_name="b.pdf"),
+        KnowledgeDocument(id=3, client_profile_id=2, file_name="c.pdf"),
+    ])
+    db.commit()
+    enqueue(db, 1, tenant=1)
+    enqueue(db, 2, tenant=1)
+    enqueue(db, 3, tenant=2)
+    latest = enqueue(db, 1, tenant=1)
+    db.query(IngestionJob).filter_by(id=latest.id).update({"file_path": "/uploads/1-v2"})
+    db.commit()
+
+    assert requeue_documents(db, client_profile_id=1) == 2
+
+    pending = db.query(IngestionJob).filter_by(status=IngestionJobStatus.pending.value).all()
+    assert sorted((job.document_id, job.file_path) for job in pending) == [
+        (1, "/uploads/1-v2"), (2, "/uploads/2"), (3, "/uploads/3"),
+    ]
@@ -0,0 +1,142 @@
+# backend/tests/test_lexical_index.py
+import pytest
+
+from rag.services.lexical_index import LexicalIndex, identifier_ratio, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "tenant_1.sqlite3"))
+    index.add_chunks(
+        ["1_a_0", "1_b_0", "1_c_0"],
+        1,
+        [
+            "Refunds are issued within 14 days of the return being received.",
+            "Order ORD-10293 ships from the Kathmandu warehouse with SKU A7-220.",
+            "Shipping times are 3-5 business days. Express shipping is available.",
+        ],
+    )
+    return index
+
+
+# ----------------------------
+# TOKENIZER
+# ----------------------------
+def test_tokenize_keeps_identifiers_whole_and_split():
+    tokens = tokenize("Where is order ORD-10293?")
+
+    assert "ord-10293" in tokens
+    assert "10293" in tokens
+    assert "is" not in tokens
+
+
+def test_identifier_ratio():
+    assert identifier_ratio("ORD-10293") == 1.0
+    assert identifier_ratio("status of ORD-10293") == 0.5
+    assert identifier_ratio("how do refunds work") == 0.0
+
+
+# ----------------------------
+# BM25
+# ----------------------------
+def test_search_ranks_exact_identifier_first(index):
+    hits = index.search("ORD-10293")
+
+    assert hits[0]["chunk_id"] == "1_b_0"
+    assert hits[0]["document_id"] == 1
+    assert "ORD-10293" in hits[0]["chunk_text"]
+
+
+def test_search_prefers_higher_term_frequency(index):
+    index.add_chunks(["2_a_0"], 2, ["Shipping to Pokhara is handled by a partner courier."])
+
+    hits = index.search("shipping")
+
+    assert [h["chunk_id"] for h in hits] == ["1_c_0", "2_a_0"]
+    assert hits[0]["bm25"] > hits[1]["bm25"] > 0
+
+
+def test_incremental_delete_and_replace(index):
+    index.delete_chunks(["1_b_0"])
+    assert index.search("ORD-10293") == []
+    assert index.stats()["chunks"] == 2
+
+    # Re-adding an existing ID replaces it instead of double counting
+    index.add_chunks(["1_a_0"], 1, ["Refunds take 30 days."])
+    assert index.stats()["chunks"] == 2
+    assert index.missing(["1_a_0", "1_b_0"]) == ["1_b_0"]
+
+    index.delete_document(1)
+    assert index.stats()["chunks"] == 0
+    assert index.search("refunds") == []
+
+
+# ----------------------------
+# FUSION
+# ----------------------------
+def test_reciprocal_rank_fusion_merges_by_chunk_id():
+    from rag.services.hybrid_search import reciprocal_rank_fusion
+
+    vector = [{"chunk_id": "x", "similarity": 0.9}, {"chunk_id": "y", "similarity": 0.8}]
+    lexical = [{"chunk_id": "y", "bm25": 7.1}, {"chunk_id": "z", "bm25": 2.0}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+    assert [h["chunk_id"] for h in fused] == ["y", "x", "z"]
+    assert fused[0]["similarity"] == 0.8 and fused[0]["bm25"] == 7.1
+    assert len(reciprocal_rank_fusion([vector, lexical], limit=2)) == 2
+
+
+@pytest.fixture
+def hybrid(index, monkeypatch):
+    from rag.services import hybrid_search as module
+
+    embedded = []
+    monkeypatch.setattr(module, "LEXICAL_INDEX_ENABLED", True)
+    monkeypatch.setattr(module, "get_lexical_index", lambda client_profile_id: index)
+    monkeypatch.setattr(module, "embed_text", lambda texts, model=None: embedded.extend(texts) or [[1.0, 0.0]])
+    monkeypatch.setattr(module, "search_embeddings", lambda db, embedding, **kwargs: [
+        {"chunk_id": "1_c_0", "document_id": 1, "chunk_text": "Shipping times", "similarity": 0.9},
+    ])
+    return module, embedded
+
+
+def test_identifier_queries_skip_the_embedding(hybrid):
+    module, embedded = hybrid
+    hits, mode = module.hybrid_search(None, "ORD-10293", 1)
+
+    assert mode == "lexical"
+    assert hits[0]["chunk_id"] == "1_b_0"
+    assert embedded == []
+
+
+def test_fastpath_needs_a_hit_on_the_identifier(hybrid):
+    module, embedded = hybrid
+    # Half the terms are identifiers, but only "shipping" and "ord" match
+    hits, mode = module.hybrid_search(None, "shipping ORD-99999", 1)
+
+    assert mode == "hybrid"
+    assert embedded == ["shipping ORD-99999"]
+
+
+def test_async_fastpath_needs_a_hit_on_the_identifier(hybrid, monkeypatch):
+    import anyio
+
+    module, _ = hybrid
+    embedded = []
+
+    async def aembed_text(texts, model=None):
+        embedded.extend(texts)
+        return [[1.0, 0.0]]
+
+    async def asearch_embeddings(db, embedding, **kwargs):
+        return []
+
+    monkeypatch.setattr(module, "aembed_text", aembed_text)
+    monkeypatch.setattr(module, "asearch_embeddings", asearch_embeddings)
+
+    _, mode = anyio.run(module.ahybrid_search, None, "ORD-10293", 1)
+    assert (mode, embedded) == ("lexical", [])
+
+    _, mode = anyio.run(module.ahybrid_search, None, "shipping ORD-99999", 1)
+    assert (mode, embedded) == ("hybrid", ["shipping ORD-99999"])
@@ -0,0 +1,113 @@
+# backend/tests/test_llm_cache.py
+import asyncio
+from types import SimpleNamespace
+
+from agents.llm import ChatProvider, GroqChatLLM, LLMCache
+
+
+class CountingCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        text = f"answer {self.calls}"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=None,
+        )
+
+
+class AsyncCountingCompletions(CountingCompletions):
+    async def create(self, **kwargs):
+        return CountingCompletions.create(self, **kwargs)
+
+
+def make_llm(tmp_path, **cache_kwargs):
+    completions, async_completions = CountingCompletions(), AsyncCountingCompletions()
+    provider = ChatProvider(
+        "fake",
+        SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        SimpleNamespace(chat=SimpleNamespace(completions=async_completions)),
+    )
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), **cache_kwargs)
+    return GroqChatLLM(provider=provider, model="m", cache=cache), completions, async_completions
+
+
+def test_identical_calls_hit_the_cache(tmp_path):
+    llm, completions, _ = make_llm(tmp_path)
+
+    first = llm.invoke("Where is my order?", system_prompt="Be brief")
+    second = llm.invoke("Where is my order?", system_prompt="Be brief")
+
+    assert first.content == second.content == "answer 1"
+    assert completions.calls == 1
+    assert llm.cache.stats()["hits"] == 1
+
+
+def test_key_covers_system_prompt_and_sampling_params(tmp_path):
+    llm, completions, _ = make_llm(tmp_path)
+
+    llm.invoke("Where is my order?", system_prompt="Be brief")
+    llm.invoke("Where is my order?", system_prompt="Be detailed")
+    llm.invoke("Where is my order?", system_prompt="Be brief", temperature=0.0)
+
+    assert completions.calls == 3
+
+
+def test_higher_temperature_bypasses_the_cache(tmp_path):
+    llm, completions, _ = make_llm(tmp_path, max_temperature=0.2)
+
+    llm.invoke("Write a tagline", temperature=0.9)
+    llm.invoke("Write a tagline", temperature=0.9)
+
+    assert completions.calls == 2
+    assert llm.cache.stats()["bypassed"] == 2
+
+
+def test_disk_tier_is_shared_and_async_path_uses_it(tmp_path):
+    llm, completions, _ = make_llm(tmp_path)
+    llm.invoke("Refund policy?")
+
+    # Another worker: fresh memory tier, same file
+    other, _, async_completions = make_llm(tmp_path)
+    response = asyncio.run(other.ainvoke("Refund policy?"))
+
+    assert response.content == "answer 1"
+    assert async_completions.calls == 0
+    assert other.cache.stats()["disk_hits"] == 1
+
+
+def test_expired_entries_are_refetched(tmp_path):
+    llm, completions, _ = make_llm(tmp_path, ttl_seconds=-1)
+
+    llm.invoke("Refund policy?")
+    llm.invoke("Refund policy?")
+
+    assert completions.calls == 2
+
+
+def completion_rows(llm) -> int:
+    return llm.cache.store._connection().execute("SELECT count(*) FROM completions").fetchone()[0]
+
+
+def test_expired_rows_are_deleted_from_disk(tmp_path):
+    llm, _, _ = make_llm(tmp_path, ttl_seconds=-1, maintain_every=3)
+
+    llm.invoke("one")
+    llm.invoke("two")
+    assert completion_rows(llm) == 2
+    # The third write runs maintenance; every row is already expired
+    llm.invoke("three")
+
+    assert completion_rows(llm) == 0
+    assert llm.cache.stats()["evicted"] == 3
+
+
+def test_disk_tier_is_capped(tmp_path):
+    llm, _, _ = make_llm(tmp_path, max_rows=2, maintain_every=1)
+
+    for prompt in ("one", "two", "three", "four"):
+        llm.invoke(prompt)
+
+    assert completion_rows(llm) == 2
@@ -0,0 +1,152 @@
+# backend/tests/test_llm_provider.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APIConnectionError, BadRequestError, RateLimitError
+
+from agents.llm import ChatProvider, CircuitBreaker, GroqChatLLM, LLMUnavailableError
+from core.metrics import metrics
+
+REQUEST = httpx.Request("POST", "https://api.example/chat/completions")
+
+
+def completion(text, prompt_tokens=10, completion_tokens=5):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+class FakeCompletions:
+    """
+    Plays back `outcomes` in order: exceptions are raised, anything else
+    is returned.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        return FakeCompletions.create(self, **kwargs)
+
+
+def fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def provider(outcomes, **kwargs):
+    completions = FakeCompletions(outcomes)
+    async_completions = FakeAsyncCompletions(outcomes)
+    kwargs.setdefault("base_delay", 0.001)
+    p = ChatProvider("fake", fake_client(completions), fake_client(async_completions), **kwargs)
+    return p, completions, async_completions
+
+
+def connection_error():
+    return APIConnectionError(request=REQUEST)
+
+
+def test_retries_transient_errors_then_succeeds():
+    metrics.reset()
+    p, completions, _ = provider([connection_error(), completion("hello")], max_retries=2)
+
+    llm = GroqChatLLM(provider=p, model="m")
+    assert llm.invoke("hi").content == "hello"
+
+    assert len(completions.calls) == 2
+    counters = metrics.snapshot()["counters"]
+    assert counters["llm.fake.m.errors"] == 1
+    assert counters["llm.fake.m.retries"] == 1
+    assert counters["llm.fake.m.prompt_tokens"] == 10
+    assert counters["llm.fake.m.completion_tokens"] == 5
+    assert metrics.latency("llm.fake.m.latency")["count"] == 1
+
+
+def test_gives_up_after_max_retries():
+    p, completions, _ = provider([connection_error()] * 3, max_retries=2)
+
+    with pytest.raises(LLMUnavailableError):
+        p.complete("m", [])
+    assert len(completions.calls) == 3
+
+
+def test_bad_request_is_not_retried_and_does_not_trip_the_circuit():
+    error = BadRequestError("bad", response=httpx.Response(400, request=REQUEST), body=None)
+    p, completions, _ = provider([error], breaker=CircuitBreaker(failure_threshold=1))
+
+    with pytest.raises(BadRequestError):
+        p.complete("m", [])
+    assert len(completions.calls) == 1
+    assert p.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_fails_fast_and_probes_after_reset():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    p, completions, _ = provider([connection_error(), connection_error(), completion("back")],
+                                 max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            p.complete("m", [])
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Refused without a request
+    with pytest.raises(LLMUnavailableError, match="circuit open"):
+        p.complete("m", [])
+    assert len(completions.calls) == 2
+
+    now[0] = 11
+    assert p.complete("m", []).choices[0].message.content == "back"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_the_circuit():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 11
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_retry_after_is_honoured_within_budget():
+    throttled = RateLimitError(
+        "slow down", response=httpx.Response(429, request=REQUEST, headers={"retry-after": "5"}), body=None
+    )
+    p, completions, _ = provider([throttled, completion("late")], max_retries=3, timeout=1)
+
+    # Waiting 5s would overrun the 1s budget, so the call gives up at once
+    with pytest.raises(LLMUnavailableError):
+        p.complete("m", [])
+    assert len(completions.calls) == 1
+
+
+def test_async_path_shares_retry_logic():
+    p, _, async_completions = provider([connection_error(), completion("async hello")], max_retries=1)
+
+    response = asyncio.run(GroqChatLLM(provider=p, model="m").ainvoke("hi"))
+
+    assert response.content == "async hello"
+    assert len(async_completions.calls) == 2
+    # Every attempt is bounded by the remaining budget
+    assert all(isinstance(call["timeout"], httpx.Timeout) for call in async_completions.calls)
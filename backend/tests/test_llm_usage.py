@@ -0,0 +1,143 @@
+# backend/tests/test_llm_usage.py
+from types import SimpleNamespace
+
+import anyio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import tms.models  # noqa: F401  registers Ticket for the ClientProfile.tickets relationship
+import user.models  # noqa: F401  client_profiles, for the llm_usage foreign key
+from agents.llm import ChatProvider, GroqChatLLM
+from agents.models import LLMUsage
+from agents.usage import TokenBucket, TokenBudgetExceeded, UsageAccountant
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_queues_then_sheds():
+    clock = Clock()
+    bucket = TokenBucket(rate=10, capacity=100, clock=clock)
+
+    assert bucket.reserve(100, max_wait=5) == 0
+    # 30 tokens short at 10/s: queued for 3s
+    assert bucket.reserve(30, max_wait=5) == pytest.approx(3)
+    # Behind that debt the next one would wait 8s: shed, nothing taken
+    assert bucket.reserve(50, max_wait=5) is None
+    # Once the debt is paid off, 50 tokens take 5s to refill
+    clock.now = 3
+    assert bucket.wait_time(50) == pytest.approx(5)
+
+
+def test_tenants_have_separate_plan_sized_buckets():
+    plans = {1: "basic", 2: "pro"}
+    accountant = UsageAccountant(limits={"basic": 600, "pro": 6000}, queue_seconds=0,
+                                 plan_lookup=plans.get, clock=Clock())
+
+    accountant.reserve(1, 600)
+    with pytest.raises(TokenBudgetExceeded) as exc:
+        accountant.reserve(1, 100)
+    assert exc.value.retry_after == pytest.approx(10)
+
+    # The noisy tenant does not touch anyone else's budget
+    assert accountant.reserve(2, 5000) == 0
+
+
+def test_settle_refunds_unused_estimate():
+    clock = Clock()
+    accountant = UsageAccountant(limits={"basic": 600}, queue_seconds=0, plan_lookup=lambda _: "basic", clock=clock)
+
+    accountant.reserve(1, 500)
+    accountant.settle(1, "m", "generate", reserved=500, prompt_tokens=80, completion_tokens=20)
+
+    assert accountant.reserve(1, 500) == 0
+
+
+def test_settle_refunds_the_reserved_bucket_without_a_plan_lookup():
+    clock = Clock()
+    plans, lookups = {1: "basic"}, []
+
+    def lookup(client_profile_id):
+        lookups.append(client_profile_id)
+        return plans[client_profile_id]
+
+    accountant = UsageAccountant(limits={"basic": 600, "pro": 6000}, queue_seconds=0, plan_seconds=1,
+                                 plan_lookup=lookup, clock=clock)
+    bucket = anyio.run(accountant.aacquire, 1, 500)
+
+    # The call outlives the plan cache and the tenant upgrades meanwhile
+    clock.now = 2
+    plans[1] = "pro"
+    accountant.settle(1, "m", "generate", reserved=500, prompt_tokens=80, completion_tokens=20, bucket=bucket)
+
+    assert lookups == [1]
+    # 100 left + 2s of refill at 10/s + 400 unused
+    assert bucket.tokens == pytest.approx(520)
+
+
+def make_llm(accountant, calls=None):
+    def create(**kwargs):
+        if calls is not None:
+            calls.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(prompt_tokens=40, completion_tokens=10),
+        )
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return GroqChatLLM(provider=ChatProvider("fake", client, None), model="m", accountant=accountant)
+
+
+def test_usage_is_aggregated_and_flushed_in_one_upsert():
+    engine = create_engine("sqlite://")
+    LLMUsage.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    accountant = UsageAccountant(plan_lookup=lambda _: "pro", session_factory=Session)
+    llm = make_llm(accountant)
+
+    for _ in range(3):
+        llm.invoke("hi", client_profile_id=7, node="analyze")
+    llm.invoke("hi", client_profile_id=7, node="respond")
+    # Untracked call: no tenant
+    llm.invoke("hi")
+
+    assert accountant.flush() == 2
+    llm.invoke("hi", client_profile_id=7, node="analyze")
+    assert accountant.flush() == 1
+
+    db = Session()
+    rows = {row.node: row for row in db.query(LLMUsage).all()}
+    assert rows["analyze"].requests == 4
+    assert rows["analyze"].prompt_tokens == 160
+    assert rows["analyze"].completion_tokens == 40
+    assert rows["respond"].requests == 1
+    assert accountant.stats()["pending_rows"] == 0
+
+
+def test_failed_flush_keeps_usage_for_the_next_one():
+    accountant = UsageAccountant(plan_lookup=lambda _: "pro", session_factory=sessionmaker(bind=create_engine("sqlite://")))
+    accountant.record(7, "m", "generate", 10, 5)
+
+    # No table: the write fails
+    with pytest.raises(Exception):
+        accountant.flush()
+    assert accountant.stats()["pending_rows"] == 1
+
+
+def test_shed_call_never_reaches_the_provider():
+    calls = []
+    accountant = UsageAccountant(limits={"basic": 600}, queue_seconds=0, plan_lookup=lambda _: "basic", clock=Clock())
+    llm = make_llm(accountant, calls)
+    accountant.reserve(1, 600)
+
+    with pytest.raises(TokenBudgetExceeded):
+        llm.invoke("hi", client_profile_id=1)
+    assert not calls
+
+    assert llm.invoke("hi", client_profile_id=2).content == "ok"
@@ -0,0 +1,144 @@
+# backend/tests/test_local_embedder.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from onnx import TensorProto, helper
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from rag.services.local_embedder import LocalEmbedder, MicroBatcher, OnnxEmbeddingModel
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "refund": 2, "policy": 3, "shipping": 4, "times": 5}
+DIM = 4
+
+
+# ----------------------------
+# TINY MODEL
+# ----------------------------
+@pytest.fixture
+def model_dir(tmp_path):
+    """
+    model.onnx: a lookup table from token id to a fixed vector, returning
+    token embeddings [batch, seq, dim] like a real sentence encoder.
+    """
+    table = np.zeros((len(VOCAB), DIM), dtype=np.float32)
+    table[2] = [1, 0, 0, 0]
+    table[3] = [0, 1, 0, 0]
+    table[4] = [0, 0, 1, 0]
+    table[5] = [0, 0, 0, 1]
+    table[1] = [1, 1, 1, 1]
+
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["token_embeddings"])],
+        "tiny-encoder",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("token_embeddings", TensorProto.FLOAT, ["batch", "seq", DIM])],
+        initializer=[helper.make_tensor("table", TensorProto.FLOAT, table.shape, table.flatten())],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(tmp_path / "model.onnx"))
+
+    tokenizer = Tokenizer(WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.save(str(tmp_path / "tokenizer.json"))
+    return str(tmp_path)
+
+
+# ----------------------------
+# MODEL
+# ----------------------------
+def test_onnx_model_mean_pools_and_normalizes(model_dir):
+    model = OnnxEmbeddingModel(model_dir)
+
+    # Padding of the shorter text must not leak into its mean
+    vectors = model.embed(["refund policy", "shipping"])
+
+    assert vectors.shape == (2, DIM)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(vectors[0], [2 ** -0.5, 2 ** -0.5, 0, 0], rtol=1e-5)
+    np.testing.assert_allclose(vectors[1], [0, 0, 1, 0], rtol=1e-5)
+
+
+# ----------------------------
+# MICRO-BATCHING
+# ----------------------------
+def test_micro_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [[len(t)] for t in texts]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=16, max_wait_ms=50, workers=1)
+    texts = [f"q{i}" * (i + 1) for i in range(12)]
+    results = [None] * len(texts)
+
+    def worker(i):
+        results[i] = batcher.submit(texts[i]).result(timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert results == [[len(t)] for t in texts]
+    assert len(calls) < len(texts)
+    assert batcher.items == len(texts)
+
+
+def test_micro_batcher_respects_max_batch_size():
+    sizes = []
+    release = threading.Event()
+
+    def batch_fn(texts):
+        sizes.append(len(texts))
+        release.wait(5)
+        return texts
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=20, workers=4)
+    futures = [batcher.submit(str(i)) for i in range(7)]
+    time.sleep(0.2)
+    release.set()
+
+    assert [f.result(timeout=5) for f in futures] == [str(i) for i in range(7)]
+    assert max(sizes) <= 3
+    batcher.close()
+
+
+def test_micro_batcher_propagates_errors():
+    def batch_fn(texts):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(batch_fn, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        batcher.submit("hello").result(timeout=5)
+    batcher.close()
+
+
+# ----------------------------
+# EMBEDDER
+# ----------------------------
+def test_local_embedder_single_and_bulk_agree(model_dir):
+    embedder = LocalEmbedder(model_dir, max_batch_size=2, max_wait_ms=1)
+    texts = ["refund policy", "shipping times", "refund", "unknown words"]
+
+    bulk = embedder.embed(texts)
+    single = [embedder.embed([t])[0] for t in texts]
+    embedder.close()
+
+    assert len(bulk) == len(texts)
+    np.testing.assert_allclose(bulk, single, rtol=1e-5)
@@ -0,0 +1,94 @@
+# backend/tests/test_quantized_store.py
+import numpy as np
+import pytest
+
+from rag.services.quantized_store import QuantizedSegment, normalize
+
+
+def random_vectors(n, dim=64, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(n, dim)))
+
+
+def add(segment, vectors, start=0, tenant=1, document_id=1):
+    ids = [f"{document_id}_{start + i}" for i in range(len(vectors))]
+    metas = [{"document_id": document_id, "chunk_index": start + i, "client_profile_id": tenant} for i in range(len(vectors))]
+    segment.add(ids, vectors.tolist(), [f"chunk {i}" for i in ids], metas)
+    return ids
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_rescored_search_matches_float_baseline(tmp_path, quantization):
+    vectors = random_vectors(2000, dim=256)
+    segment = QuantizedSegment(str(tmp_path), quantization, rescore_factor=10)
+    ids = add(segment, vectors)
+
+    # Queries land near stored chunks, as real questions do
+    queries = normalize(vectors[:20] + 0.05 * np.random.default_rng(1).normal(size=(20, 256)))
+    recall = []
+    for query in queries:
+        exact = {ids[i] for i in np.argsort(-(vectors @ query))[:10]}
+        hits = segment.search(query.tolist(), limit=10)
+        recall.append(len(exact & {h["chunk_id"] for h in hits}) / 10)
+        # Similarities come from the float vectors, not the codes
+        best = ids.index(hits[0]["chunk_id"])
+        assert hits[0]["similarity"] == pytest.approx(float(vectors[best] @ query), abs=1e-5)
+
+    # Isotropic random vectors are the worst case for sign bits
+    assert np.mean(recall) >= (0.95 if quantization == "int8" else 0.5)
+    stats = segment.stats()
+    assert stats["ram_bytes"] < stats["float32_bytes"] / (3 if quantization == "int8" else 10)
+
+
+def test_upsert_delete_and_tenant_filter(tmp_path):
+    segment = QuantizedSegment(str(tmp_path), "int8")
+    vectors = random_vectors(4)
+    add(segment, vectors[:2], tenant=1, document_id=1)
+    add(segment, vectors[2:], tenant=2, document_id=2)
+
+    assert {h["document_id"] for h in segment.search(vectors[2].tolist(), 5, client_profile_id=1)} == {1}
+
+    # Replacing a chunk makes its old row dead
+    segment.add(["1_0"], [vectors[3].tolist()], ["replaced"], [{"document_id": 1, "chunk_index": 0, "client_profile_id": 1}])
+    top = segment.search(vectors[3].tolist(), 1, client_profile_id=1)[0]
+    assert (top["chunk_id"], top["chunk_text"]) == ("1_0", "replaced")
+
+    segment.delete_document(1)
+    assert segment.search(vectors[0].tolist(), 5, client_profile_id=1) == []
+    assert set(segment.document_chunks(2)) == {"2_0", "2_1"}
+
+
+def test_compaction_keeps_live_rows(tmp_path):
+    segment = QuantizedSegment(str(tmp_path), "int8", compact_ratio=0.5)
+    vectors = random_vectors(1200)
+    ids = add(segment, vectors)
+    segment.delete(ids[:900])
+
+    assert segment._state is None or segment._load()["rows"] == 300
+    hits = segment.search(vectors[1000].tolist(), 1)
+    assert hits[0]["chunk_id"] == ids[1000]
+    assert sorted(p.name for p in tmp_path.glob("vectors.*")) == ["vectors.1.f32"]
+
+
+def test_failed_compaction_commit_keeps_the_old_generation(tmp_path, monkeypatch):
+    segment = QuantizedSegment(str(tmp_path), "int8", compact_ratio=0.5)
+    vectors = random_vectors(1200)
+    ids = add(segment, vectors)
+
+    compact = segment._maybe_compact
+
+    def compact_then_fail(conn, dim):
+        if compact(conn, dim):
+            raise RuntimeError("crash before COMMIT")
+        return []
+
+    # The rolled-back generation still points at the old files
+    monkeypatch.setattr(segment, "_maybe_compact", compact_then_fail)
+    with pytest.raises(RuntimeError):
+        segment.delete(ids[:900])
+    assert (tmp_path / "vectors.0.f32").exists()
+    assert (tmp_path / "vectors.1.f32").exists()
+
+    # The aborted generation's files are cleaned up when the segment is reopened
+    reopened = QuantizedSegment(str(tmp_path), "int8")
+    assert sorted(p.name for p in tmp_path.glob("vectors.*")) == ["vectors.0.f32"]
+    assert reopened.search(vectors[1000].tolist(), 1)[0]["chunk_id"] == ids[1000]
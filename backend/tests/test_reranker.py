@@ -0,0 +1,61 @@
+# backend/tests/test_reranker.py
+import time
+
+import numpy as np
+
+from rag.services.reranker import Reranker
+
+
+class FakeCrossEncoder:
+    """
+    Scores a pair by how many query words the passage contains.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def score(self, query, texts):
+        time.sleep(self.delay * len(texts))
+        self.pairs += len(texts)
+        words = set(query.lower().split())
+        return np.array([len(words & set(t.lower().split())) for t in texts], dtype=np.float32)
+
+
+HITS = [
+    {"chunk_id": "1_0", "chunk_text": "Our office is in Berlin"},
+    {"chunk_id": "2_0", "chunk_text": "Shipping is free over 50 euro"},
+    {"chunk_id": "3_0", "chunk_text": "refund requests take 14 days to process a refund"},
+    {"chunk_id": "4_0", "chunk_text": "a refund needs the order number"},
+]
+
+
+def test_keeps_top_k_by_cross_encoder_score():
+    reranker = Reranker(FakeCrossEncoder(), batch_size=2, budget_ms=1000)
+
+    top = reranker.rerank("how long does a refund take", HITS, top_k=2)
+
+    assert [hit["chunk_id"] for hit in top] == ["3_0", "4_0"]
+    assert top[0]["rerank_score"] > top[1]["rerank_score"]
+
+
+def test_skipped_when_deadline_leaves_no_room():
+    model = FakeCrossEncoder()
+    reranker = Reranker(model, budget_ms=1000, reserve_seconds=2)
+
+    assert reranker.rerank("refund", HITS, top_k=2, time_left=1.5) is None
+    assert model.pairs == 0
+
+
+def test_budget_limits_scored_candidates():
+    model = FakeCrossEncoder(delay=0.002)
+    reranker = Reranker(model, batch_size=4, budget_ms=1000)
+    reranker.rerank("refund", HITS, top_k=2)  # learns the per-pair cost
+
+    reranker.budget = reranker.pair_seconds * 2.5
+    model.pairs = 0
+    top = reranker.rerank("refund", HITS, top_k=2)
+
+    assert model.pairs == 2
+    # Only the first two retrieval hits made the cut
+    assert {hit["chunk_id"] for hit in top} == {"1_0", "2_0"}
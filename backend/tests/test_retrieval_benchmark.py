@@ -0,0 +1,54 @@
+# backend/tests/test_retrieval_benchmark.py
+import numpy as np
+import pytest
+
+from agents.retrieval.nodes import generate_answer
+from benchmarks.retrieval import FakeEmbedder, run_benchmark, tenant_sizes
+from rag.services import hybrid_search, lexical_index, vector_store
+
+
+@pytest.fixture
+def offline_services(monkeypatch):
+    """
+    run_benchmark(isolate=False) rewires these modules in this process;
+    setting them to themselves makes monkeypatch put them back.
+    """
+    for module, name in [
+        (vector_store, "vector_store"),
+        (lexical_index, "LEXICAL_INDEX_DIR"),
+        (lexical_index, "_indexes"),
+        (hybrid_search, "LEXICAL_INDEX_ENABLED"),
+        (hybrid_search, "embed_text"),
+        (hybrid_search, "aembed_text"),
+        (generate_answer, "llm"),
+    ]:
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(lexical_index, "_indexes", {})
+
+
+def test_fake_embedder_is_deterministic():
+    ids = np.array([[1, 2, 3], [1, 2, 4]])
+    first = FakeEmbedder(10, 16, seed=5).embed_ids(ids)
+
+    assert np.array_equal(first, FakeEmbedder(10, 16, seed=5).embed_ids(ids))
+    assert np.allclose(np.linalg.norm(first, axis=1), 1)
+    assert sum(tenant_sizes(1000, 7)) == 1000
+
+
+def test_small_run_reports_every_backend_and_mode(offline_services):
+    modes = ["vector", "lexical", "hybrid", "graph"]
+    report = run_benchmark(
+        sizes=[400], backends=["quantized-int8", "exact"], modes=modes,
+        tenants=4, queries=20, k=5, dim=32, isolate=False,
+    )
+
+    rows = {(row["backend"], row["mode"]): row for row in report["results"]}
+    assert set(rows) == {(b, m) for b in ("quantized-int8", "exact") for m in modes}
+    # Vector mode went through hybrid_search with the fake embedder
+    assert rows[("exact", "vector")]["recall@5"] == 1.0
+    assert rows[("exact", "hybrid")]["recall@5"] > 0
+    assert rows[("exact", "lexical")]["recall@5"] is None
+    assert rows[("exact", "graph")]["hit@5"] > 0
+    for row in rows.values():
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+        assert row["ingest_chunks_per_s"] > 0
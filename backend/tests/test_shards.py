@@ -0,0 +1,94 @@
+# backend/tests/test_shards.py
+import pytest
+
+from rag import migrate_shards
+from rag.services import vector_store as vector_store_module
+from rag.services.vector_store import COLLECTION_NAME, ChromaVectorStore, collection_for_tenant
+
+
+def test_global_routing_ignores_the_tenant():
+    assert collection_for_tenant(7, sharding="global") == COLLECTION_NAME
+    assert collection_for_tenant(None, sharding="tenant") == COLLECTION_NAME
+
+
+def test_tenant_routing_gives_each_tenant_a_collection():
+    assert collection_for_tenant(7, sharding="tenant") == f"{COLLECTION_NAME}_t7"
+    assert collection_for_tenant(8, sharding="tenant") == f"{COLLECTION_NAME}_t8"
+
+
+def test_bucket_routing_is_stable_and_bounded(monkeypatch):
+    monkeypatch.setattr(vector_store_module, "VECTOR_SHARD_BUCKETS", 4)
+    names = {collection_for_tenant(i, sharding="bucket") for i in range(100)}
+    assert names <= {f"{COLLECTION_NAME}_b{b}" for b in range(4)}
+    assert len(names) > 1
+    assert collection_for_tenant(42, sharding="bucket") == collection_for_tenant(42, sharding="bucket")
+
+
+def test_other_models_get_their_own_family():
+    assert collection_for_tenant(7, sharding="global", embedding_model="mini-lm") == f"{COLLECTION_NAME}_mini_lm"
+    assert collection_for_tenant(7, sharding="tenant", embedding_model="minilm") == f"{COLLECTION_NAME}_minilm_t7"
+    assert collection_for_tenant(7, sharding="tenant", embedding_model="gemini-embedding-001") == f"{COLLECTION_NAME}_t7"
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        collection_for_tenant(7, sharding="hash")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ChromaVectorStore(str(tmp_path))
+    monkeypatch.setattr(migrate_shards, "vector_store", store)
+    monkeypatch.setattr(vector_store_module, "VECTOR_SHARDING", "tenant")
+    yield store
+    store.close()
+
+
+def _seed(store, collection, tenants):
+    ids = [f"{collection}-{i}" for i in range(len(tenants))]
+    metadatas = [{"document_id": i} if t is None else {"document_id": i, "client_profile_id": t}
+                 for i, t in enumerate(tenants)]
+    store.upsert(ids, [[1.0, float(i)] for i in range(len(tenants))], [f"chunk {i}" for i in ids], metadatas,
+                 collection=collection)
+    return ids
+
+
+def test_split_copies_every_global_collection(store):
+    ids = _seed(store, COLLECTION_NAME, [1, 1, 2])
+    local_ids = _seed(store, f"{COLLECTION_NAME}_minilm", [1])
+
+    result = migrate_shards.split_global_collection(batch_size=2, delete_source=True)
+
+    assert result == {
+        "copied": 4,
+        "skipped": 0,
+        "shards": {f"{COLLECTION_NAME}_t1": 2, f"{COLLECTION_NAME}_t2": 1, f"{COLLECTION_NAME}_minilm_t1": 1},
+    }
+    assert sorted(store.collection(f"{COLLECTION_NAME}_t1").get()["ids"]) == ids[:2]
+    assert store.collection(f"{COLLECTION_NAME}_minilm_t1").get()["ids"] == local_ids
+    # Sources are gone once every shard has been verified
+    assert set(store.list_collections()) == set(result["shards"])
+
+
+def test_dry_run_writes_nothing(store):
+    _seed(store, COLLECTION_NAME, [1, 2])
+
+    result = migrate_shards.split_global_collection(dry_run=True, delete_source=True)
+
+    assert result["copied"] == 2
+    assert store.list_collections() == [COLLECTION_NAME]
+
+
+def test_source_is_kept_when_chunks_have_no_tenant(store):
+    _seed(store, COLLECTION_NAME, [1, None])
+
+    result = migrate_shards.split_global_collection(delete_source=True)
+
+    assert result["skipped"] == 1
+    assert store.collection(COLLECTION_NAME, create=False).count() == 2
+
+
+def test_global_mode_refuses_to_split(store, monkeypatch):
+    monkeypatch.setattr(vector_store_module, "VECTOR_SHARDING", "global")
+    with pytest.raises(SystemExit):
+        migrate_shards.split_global_collection()
@@ -0,0 +1,138 @@
+# backend/tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+from core.metrics import metrics
+from core.singleflight import FlightAborted, SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    metrics.reset()
+    flights = SingleFlight("test")
+    runs = []
+
+    async def answer():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": "14 days"}
+
+    async def main():
+        return await asyncio.gather(*(flights.do(("tenant", "refunds"), answer) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert len(runs) == 1
+    assert all(result == {"answer": "14 days"} for result, _ in results)
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    counters = metrics.snapshot()["counters"]
+    assert counters["test.leader"] == 1
+    assert counters["test.coalesced"] == 4
+    assert len(flights) == 0
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    flights = SingleFlight("test")
+    runs = []
+
+    async def failing():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("k", failing) for _ in range(3)), return_exceptions=True)
+        # The next call after the flight lands runs again
+        again = await asyncio.gather(flights.do("k", failing), return_exceptions=True)
+        return results + again
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(runs) == 2
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    flights = SingleFlight("test")
+
+    async def answer():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("k", answer))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("k", answer))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_shared_run_is_cancelled_when_every_caller_is():
+    flights = SingleFlight("test")
+    finished = []
+
+    async def answer():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def main():
+        callers = [asyncio.create_task(flights.do("k", answer)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    assert not finished
+    assert len(flights) == 0
+
+
+def test_followers_of_an_aborted_leader_run_it_themselves():
+    flights = SingleFlight("test")
+
+    async def main():
+        async def abandon():
+            with flights.lead("k"):
+                await asyncio.sleep(0.01)
+                raise asyncio.CancelledError
+
+        async def answer():
+            return "own answer"
+
+        leader = asyncio.create_task(abandon())
+        await asyncio.sleep(0)
+        follower = await flights.do("k", answer)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return follower
+
+    assert asyncio.run(main()) == ("own answer", False)
+
+
+def test_lead_publishes_result_to_joiners():
+    flights = SingleFlight("test")
+
+    async def main():
+        with flights.lead("k") as flight:
+            waiter = asyncio.create_task(flights.wait(flights.join("k")))
+            await asyncio.sleep(0)
+            flight.set_result("streamed answer")
+        return await waiter
+
+    assert asyncio.run(main()) == "streamed answer"
+
+
+def test_unresolved_lead_aborts():
+    flights = SingleFlight("test")
+
+    async def main():
+        with flights.lead("k") as flight:
+            pass
+        with pytest.raises(FlightAborted):
+            await flight
+
+    asyncio.run(main())
@@ -0,0 +1,224 @@
+# backend/tests/test_structured_output.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agents.llm import ChatProvider, GroqChatLLM, StructuredOutputError
+from agents.ticket.state import TicketAgentState, TicketAnalysis
+from agents.utils.json_parser import IncrementalJSONParser, JSONStreamError
+
+VALID = {
+    "subject": "Late delivery",
+    "category": "delivery",
+    "priority": "medium",
+    "needs_escalation": False,
+    "ai_confidence": 85,
+    "agent_notes": "Order shipped, tracking stalled",
+}
+
+
+class FakeStream:
+    def __init__(self, text, size=7):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+
+    async def __aiter__(self):
+        for chunk in self:
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+def completion(text):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+    )
+
+
+class FakeCompletions:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+        self.streams = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        answer = self.answers.pop(0)
+        if not kwargs.get("stream"):
+            return completion(answer)
+        stream = FakeStream(answer)
+        self.streams.append(stream)
+        return stream
+
+
+class AsyncFakeStream(FakeStream):
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        answer = self.answers.pop(0)
+        if not kwargs.get("stream"):
+            return completion(answer)
+        stream = AsyncFakeStream(answer)
+        self.streams.append(stream)
+        return stream
+
+
+def make_llm(answers):
+    completions, async_completions = FakeCompletions(answers), AsyncFakeCompletions(answers)
+    provider = ChatProvider(
+        "fake",
+        SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        SimpleNamespace(chat=SimpleNamespace(completions=async_completions)),
+    )
+    return GroqChatLLM(provider=provider, model="m"), completions, async_completions
+
+
+# ----------------------------
+# INCREMENTAL PARSER
+# ----------------------------
+def test_parser_reports_members_as_they_complete():
+    text = '{"a": "x, {y}", "b": {"c": [1, 2]}, "d": "say \\"hi\\""}'
+    parser = IncrementalJSONParser()
+
+    seen = []
+    for i in range(0, len(text), 3):
+        seen += parser.feed(text[i:i + 3])
+
+    assert seen == [("a", "x, {y}"), ("b", {"c": [1, 2]}), ("d", 'say "hi"')]
+    assert parser.result() == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ['Sure! {"a": 1}', '```json\n{"a": 1}', '{"a": 1} thanks'])
+def test_parser_rejects_text_around_the_object(text):
+    with pytest.raises(JSONStreamError):
+        IncrementalJSONParser().feed(text)
+
+
+def test_parser_rejects_incomplete_object():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b"')
+    with pytest.raises(JSONStreamError):
+        parser.result()
+
+
+# ----------------------------
+# STRUCTURED CALLS
+# ----------------------------
+def test_ticket_schema_matches_agent_state():
+    assert set(TicketAnalysis.model_fields) <= set(TicketAgentState.__annotations__)
+
+
+def test_valid_answer_is_returned_validated():
+    llm, completions, _ = make_llm([json.dumps(VALID)])
+
+    result = llm.invoke_structured("Where is my parcel?", TicketAnalysis)
+
+    assert result == TicketAnalysis(**VALID)
+    # Default "prompt" format: streamed, schema in the system prompt only
+    request = completions.calls[0]
+    assert request["stream"] is True
+    assert "response_format" not in request
+    assert "JSON schema" in request["messages"][0]["content"]
+
+
+def test_schema_violation_stops_the_stream_early_and_retries():
+    bad = json.dumps({**VALID, "category": "shoes"}) + " " * 200
+    llm, completions, _ = make_llm([bad, json.dumps(VALID)])
+
+    result = llm.invoke_structured("Where is my parcel?", TicketAnalysis)
+
+    assert result.category == "delivery"
+    first = completions.streams[0]
+    assert first.closed
+    assert first.sent < len(first.chunks)
+    # The retry shows the model its rejected answer and why
+    retry = completions.calls[1]["messages"]
+    assert retry[2]["role"] == "assistant"
+    assert "category" in retry[3]["content"]
+
+
+def test_gives_up_after_retries():
+    llm, completions, _ = make_llm(["I think this is a delivery issue."] * 2)
+
+    with pytest.raises(StructuredOutputError):
+        llm.invoke_structured("Where is my parcel?", TicketAnalysis, retries=1)
+    assert len(completions.calls) == 2
+
+
+def test_async_structured_call_retries_out_of_range_values():
+    llm, _, async_completions = make_llm([json.dumps({**VALID, "ai_confidence": 150}), json.dumps(VALID)])
+
+    result = asyncio.run(llm.ainvoke_structured("Where is my parcel?", TicketAnalysis))
+
+    assert result.ai_confidence == 85
+    assert len(async_completions.calls) == 2
+    assert all(stream.closed for stream in async_completions.streams)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_json_schema_format_is_never_streamed(use_async):
+    llm, completions, async_completions = make_llm([json.dumps({**VALID, "priority": "asap"}), json.dumps(VALID)])
+    llm.structured_format = "json_schema"
+
+    if use_async:
+        result = asyncio.run(llm.ainvoke_structured("Where is my parcel?", TicketAnalysis))
+        calls = async_completions.calls
+    else:
+        result = llm.invoke_structured("Where is my parcel?", TicketAnalysis)
+        calls = completions.calls
+
+    assert result.priority == "medium"
+    assert len(calls) == 2
+    for request in calls:
+        assert not request.get("stream")
+        assert request["response_format"]["json_schema"]["name"] == "TicketAnalysis"
+
+
+def test_provider_error_still_escalates_the_ticket(monkeypatch):
+    from agents.ticket.nodes import decision
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("400 response_format is not supported")
+
+    monkeypatch.setattr(decision.llm, "invoke_structured", fail)
+    state = decision.analyze_customer_message({"customer_message": "Where is my parcel?", "client_profile_id": 1})
+
+    assert state["needs_escalation"] is True
+    assert "not supported" in state["agent_notes"]
+
+
+def test_schema_violation_escalates_and_is_counted(monkeypatch):
+    from agents.llm import StructuredOutputError
+    from agents.ticket.nodes import decision
+    from core.metrics import metrics
+
+    def fail(*args, **kwargs):
+        raise StructuredOutputError("TicketAnalysis", 2, ValueError("priority: invalid"))
+
+    metrics.reset()
+    monkeypatch.setattr(decision.llm, "invoke_structured", fail)
+    state = decision.analyze_customer_message({"customer_message": "Where is my parcel?", "client_profile_id": 1})
+
+    assert state == {
+        "customer_message": "Where is my parcel?",
+        "client_profile_id": 1,
+        **decision.fallback_analysis("LLM output did not match the ticket schema: priority: invalid", 30),
+    }
+    assert metrics.snapshot()["counters"]["ticket.analysis.schema_fallback"] == 1
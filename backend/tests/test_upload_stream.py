@@ -0,0 +1,146 @@
+# backend/tests/test_upload_stream.py
+import hashlib
+import os
+
+import anyio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import tms.models  # noqa: F401  registers Ticket for the ClientProfile.tickets relationship
+from rag.models import IngestionJob
+from rag.services.upload_stream import StreamedUpload, UploadError, register_upload, stream_upload
+from user.models import KnowledgeDocument
+
+BOUNDARY = "testboundary"
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, content_length: bool = True, abort_after: int = None, hang_after: int = None):
+        self.body = body
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+        self.abort_after = abort_after
+        self.hang_after = hang_after
+
+    async def stream(self):
+        for n, i in enumerate(range(0, len(self.body), 1024)):
+            if n == self.abort_after:
+                raise OSError("client went away")
+            if n == self.hang_after:
+                await anyio.sleep_forever()
+            yield self.body[i:i + 1024]
+
+
+def multipart(data: bytes, file_name: str = "policy.txt", field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+        f"Content-Type: text/plain\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def upload(request, upload_dir, max_bytes=1_000_000):
+    return anyio.run(stream_upload, request, str(upload_dir), max_bytes)
+
+
+def test_streams_the_file_to_disk_with_its_hash(tmp_path):
+    data = b"Refunds take 14 days.\n" * 500
+    result = upload(FakeRequest(multipart(data)), tmp_path)
+
+    assert (result.file_name, result.content_type, result.size) == ("policy.txt", "text/plain", len(data))
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+    assert result.file_path.endswith(".txt")
+    with open(result.file_path, "rb") as f:
+        assert f.read() == data
+    assert os.listdir(tmp_path) == [os.path.basename(result.file_path)]
+
+
+def test_declared_size_over_the_limit_is_rejected_up_front(tmp_path):
+    request = FakeRequest(multipart(b"x" * 200_000), abort_after=0)
+
+    with pytest.raises(UploadError) as e:
+        upload(request, tmp_path, max_bytes=100)
+    assert e.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_streamed_size_over_the_limit_is_rejected_and_cleaned_up(tmp_path):
+    request = FakeRequest(multipart(b"x" * 200_000), content_length=False)
+
+    with pytest.raises(UploadError) as e:
+        upload(request, tmp_path, max_bytes=100_000)
+    assert e.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_aborted_upload_leaves_no_file(tmp_path):
+    with pytest.raises(OSError):
+        upload(FakeRequest(multipart(b"x" * 20_000), abort_after=5), tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancelled_upload_leaves_no_file(tmp_path):
+    async def main():
+        with anyio.move_on_after(0.2):
+            await stream_upload(FakeRequest(multipart(b"x" * 20_000), hang_after=5), str(tmp_path), 1_000_000)
+
+    anyio.run(main)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("body, detail", [
+    (multipart(b"data", field="other"), "No 'file' file in upload"),
+    (multipart(b""), "Uploaded file is empty"),
+])
+def test_bad_uploads_are_rejected(tmp_path, body, detail):
+    with pytest.raises(UploadError) as e:
+        upload(FakeRequest(body), tmp_path)
+    assert (e.value.status_code, e.value.detail) == (400, detail)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    KnowledgeDocument.__table__.create(engine)
+    IngestionJob.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def stored(tmp_path, name: str, sha256: str, file_name: str = "policy.txt") -> StreamedUpload:
+    path = tmp_path / name
+    path.write_bytes(b"data")
+    return StreamedUpload(str(path), file_name, "text/plain", 4, sha256)
+
+
+def test_duplicate_content_is_not_processed_again(db, tmp_path):
+    first = register_upload(db, 1, stored(tmp_path, "a.txt", "abc"))
+    again = register_upload(db, 1, stored(tmp_path, "b.txt", "abc", file_name="renamed.txt"))
+
+    assert first["duplicate"] is False and first["job_id"]
+    assert again == {"message": "File already uploaded", "document_id": first["document_id"], "version": 1,
+                     "duplicate": True}
+    # The second copy is dropped, and no second job is queued
+    assert not (tmp_path / "b.txt").exists()
+    assert db.query(IngestionJob).count() == 1
+
+
+def test_same_content_for_another_tenant_is_not_a_duplicate(db, tmp_path):
+    register_upload(db, 1, stored(tmp_path, "a.txt", "abc"))
+    other = register_upload(db, 2, stored(tmp_path, "b.txt", "abc"))
+
+    assert other["duplicate"] is False
+    assert (tmp_path / "b.txt").exists()
+
+
+def test_new_content_under_the_same_name_is_a_new_version(db, tmp_path):
+    first = register_upload(db, 1, stored(tmp_path, "a.txt", "abc"))
+    second = register_upload(db, 1, stored(tmp_path, "b.txt", "def"))
+
+    assert second["document_id"] == first["document_id"]
+    assert second["version"] == 2
+    assert db.query(IngestionJob).count() == 2
@@ -0,0 +1,74 @@
+# backend/tests/test_vector_store.py
+import threading
+
+import pytest
+
+from core.metrics import metrics
+from rag.services.vector_store import ChromaVectorStore
+
+
+def test_client_and_collections_are_opened_once(tmp_path):
+    store = ChromaVectorStore(str(tmp_path))
+    assert not store.is_open
+
+    handle = store.collection("docs")
+    assert store.is_open
+    assert store.collection("docs") is handle
+    # Reads never create a collection
+    assert store.collection("missing", create=False) is None
+    assert store.list_collections() == ["docs"]
+
+    store.close()
+    assert not store.is_open
+    # Reopened lazily on next use, with a fresh handle cache
+    assert store.collection("docs", create=False) is not handle
+    store.close()
+
+
+def test_close_during_lookups_never_leaves_a_missing_client(tmp_path):
+    store = ChromaVectorStore(str(tmp_path))
+    errors = []
+    stop = threading.Event()
+
+    def lookup():
+        while not stop.is_set():
+            try:
+                store.collection("docs")
+                store._collections.clear()
+            except Exception as e:  # AttributeError on a None client before the fix
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for _ in range(50):
+        store.close()
+    stop.set()
+    for t in threads:
+        t.join()
+    store.close()
+
+    assert errors == []
+
+
+def test_operations_are_timed(tmp_path):
+    metrics.reset()
+    store = ChromaVectorStore(str(tmp_path))
+    store.upsert(["a"], [[1.0, 0.0]], ["text"], [{"document_id": 1}], collection="docs")
+    store.query([1.0, 0.0], 1, collection="docs")
+    store.close()
+
+    assert metrics.latency("vector_store.upsert")["count"] == 1
+    assert metrics.latency("vector_store.query")["count"] == 1
+
+
+def test_metrics_endpoint_reports_the_shared_store():
+    try:
+        from fastapi.testclient import TestClient
+        import main
+    except Exception as e:  # main connects to Postgres at import
+        pytest.skip(f"app not importable here: {e.__class__.__name__}")
+
+    body = TestClient(main.app).get("/metrics").json()
+    assert {"counters", "vector_store", "llm", "graphs"} <= set(body)
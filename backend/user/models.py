@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from auth.database import Base
 from sqlalchemy.sql import func
@@ -73,6 +73,8 @@ class ClientProfile(Base):
     documents_uploaded_count = Column(Integer, default=0)
     last_kb_update = Column(DateTime, nullable=True)
     kb_processing_status = Column(String(20), default="idle") 
+    # None = platform default (Gemini); otherwise a local ONNX model name
+    embedding_model = Column(String(100), nullable=True)
     
     # Simple subscription
     subscription_plan = Column(String(50), default="basic") 
@@ -112,6 +114,7 @@ class KnowledgeDocument(Base):
     file_name = Column(String(255), nullable=False)
     file_type = Column(String(50), nullable=True)  
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the uploaded bytes
     
     # Processing status
     upload_date = Column(DateTime, default=func.now())
@@ -119,10 +122,17 @@ class KnowledgeDocument(Base):
     processing_error = Column(String(500), nullable=True)
     
     # RAG embeddings info
-    embedding_model = Column(String(100), default="minilm")
+    embedding_model = Column(String(100), default="gemini-embedding-001")
     chunk_count = Column(Integer, default=0)  
+
+    # Bumped on every re-upload of the same file name (incremental re-ingestion)
+    version = Column(Integer, default=1, nullable=False)
     
     client_profile = relationship("ClientProfile", back_populates="knowledge_documents")
 
+    __table_args__ = (
+        Index("ix_knowledge_documents_client_profile_id_file_name", "client_profile_id", "file_name"),
+    )
+
 
 
@@ -75,6 +75,8 @@ class ClientProfileUpdate(BaseModel):
     timezone: Optional[str] = Field(None, max_length=50)
     language: Optional[str] = Field(None, max_length=10)
     subscription_plan: Optional[str] = Field(None, max_length=50)
+    # null = platform default (Gemini); changing it re-embeds every document
+    embedding_model: Optional[str] = Field(None, max_length=100)
 
     class Config:
         from_attributes = True
@@ -114,6 +116,7 @@ class ClientProfileResponse(BaseModel):
     updated_at: datetime
     primary_usecase: Optional[str]
     business_goals: Optional[str]
+    embedding_model: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
 # Full User + Profile Response